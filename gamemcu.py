@@ -14,6 +14,11 @@ manager=gm_manager.GmManager()
 
 def plugin_loaded():
     manager.refresh_serial_port()
+    manager.prefetch_firmware()
+
+def plugin_unloaded():
+    manager.stop_port_watcher()
+    manager.flush_http_cache()
     
 class SublimeGmListener(sublime_plugin.EventListener):
     def on_selection_modified(self, view):
@@ -61,6 +66,10 @@ class GmFirmwareUpdateCommand(sublime_plugin.WindowCommand):
             state = True
         return state
 
+class GmNetTimingsCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        manager.net_timings(self.window)
+
 class GmOpenCommand(sublime_plugin.WindowCommand):
     def run(self,encoding='utf8',syntax=None):
         manager.open(self.window,syntax)
@@ -21,6 +21,7 @@ from __future__ import print_function, division
 import argparse
 import hashlib
 import inspect
+import mmap
 import os
 import serial
 import struct
@@ -28,9 +29,12 @@ import sys
 import time
 import base64
 import zlib
+import zipfile
 import shlex
+import tempfile
 
 _log = print
+_progress = None
 __version__ = "2.0.1"
 
 MAX_UINT32 = 0xffffffff
@@ -51,6 +55,38 @@ def esp_set_log(log):
         global _log
         _log = log
 
+
+def esp_set_progress(progress):
+    """ Install a callable receiving ProgressEvent objects while flashing.
+    When set, per-block progress goes to it instead of one log line per block.
+    Pass None to go back to plain log lines. """
+    global _progress
+    _progress = progress if callable(progress) else None
+
+
+class ProgressEvent(object):
+    """ Progress of a flash write, in uncompressed bytes of the image at
+    'address'. phase is 'write' while blocks are going out, 'done' once. """
+    def __init__(self, phase, address, done, total, elapsed):
+        self.phase = phase
+        self.address = address
+        self.done = done
+        self.total = total
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        """ bytes per second so far """
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """ estimated seconds left, None until a rate is known """
+        rate = self.rate
+        if rate <= 0:
+            return None
+        return (self.total - self.done) / rate
+
 def check_supported_function(func, check_func):
     """
     Decorator implementation that wraps a check around an ESPLoader
@@ -941,6 +977,8 @@ class ESP32ROM(ESPLoader):
 
     BOOTLOADER_FLASH_OFFSET = 0x1000
 
+    PARTITION_TABLE_OFFSET = 0x8000
+
     def get_chip_description(self):
         blk3 = self.read_efuse(3)
         chip_version = (blk3 >> 12) & 0xF
@@ -1014,6 +1052,8 @@ def LoadFirmwareImage(chip, filename):
         Returns a BaseFirmwareImage subclass, either ESPFirmwareImage (v1) or OTAFirmwareImage (v2).
     """
     with open(filename, 'rb') as f:
+        # the mapping outlives the file handle, segment data is sliced from it lazily
+        f = map_file(f) or f
         if chip == 'esp32':
             return ESP32FirmwareImage(f)
         else:  # Otherwise, ESP8266 so look at magic to determine the image type
@@ -1080,7 +1120,7 @@ class BaseFirmwareImage(object):
         file_offs = f.tell()
         (offset, size) = struct.unpack('<II', f.read(8))
         self.warn_if_unusual_segment(offset, size, is_irom_segment)
-        segment_data = f.read(size)
+        segment_data = read_view(f, size)
         if len(segment_data) < size:
             raise FatalError('End of file reading segment 0x%x, length %d (actual length %d)' % (offset, size, len(segment_data)))
         segment = ImageSegment(offset, segment_data, file_offs)
@@ -1378,7 +1418,7 @@ class ELFFile(object):
         # Load sections from the ELF file
         self.name = name
         with open(self.name, 'rb') as f:
-            self._read_elf_file(f)
+            self._read_elf_file(map_file(f) or f)
 
     def get_section(self, section_name):
         for s in self.sections:
@@ -1442,13 +1482,64 @@ class ELFFile(object):
 
         def read_data(offs,size):
             f.seek(offs)
-            return f.read(size)
+            return read_view(f, size)
 
         prog_sections = [ELFSection(lookup_string(n_offs), lma, read_data(offs, size)) for (n_offs, _type, lma, size, offs) in prog_sections
                          if lma != 0]
         self.sections = prog_sections
 
 
+class PartitionEntry(object):
+    """ One entry of an ESP32 partition table binary """
+    APP_TYPE = 0x00
+    DATA_TYPE = 0x01
+
+    FACTORY_SUBTYPE = 0x00
+    OTA_0_SUBTYPE = 0x10
+
+    def __init__(self, label, type, subtype, offset, size, flags):
+        self.label = label
+        self.type = type
+        self.subtype = subtype
+        self.offset = offset
+        self.size = size
+        self.flags = flags
+
+    def __repr__(self):
+        return "%s type 0x%02x subtype 0x%02x offset 0x%08x size 0x%x" % (
+            self.label, self.type, self.subtype, self.offset, self.size)
+
+
+def parse_partition_table(data):
+    """ Parse an ESP32 partition table binary (as flashed at
+    PARTITION_TABLE_OFFSET) into a list of PartitionEntry objects. """
+    ENTRY_MAGIC = b'\xaa\x50'
+    MD5_MAGIC = b'\xeb\xeb'
+    LEN_ENTRY = 32
+
+    entries = []
+    for offs in range(0, len(data) - LEN_ENTRY + 1, LEN_ENTRY):
+        magic, type, subtype, offset, size, label, flags = struct.unpack_from("<2sBBLL16sL", data, offs)
+        if magic == MD5_MAGIC or magic == b'\xff\xff':
+            break  # md5 checksum entry or end of table
+        if magic != ENTRY_MAGIC:
+            raise FatalError("Invalid partition table entry magic at offset 0x%x" % offs)
+        label = label.rstrip(b'\x00').decode('utf-8', 'replace')
+        entries.append(PartitionEntry(label, type, subtype, offset, size, flags))
+    return entries
+
+
+def find_app_partition(entries):
+    """ Return the partition the bootloader boots from when nothing has been
+    written to OTA data: factory if present, otherwise ota_0. """
+    apps = [e for e in entries if e.type == PartitionEntry.APP_TYPE]
+    for subtype in (PartitionEntry.FACTORY_SUBTYPE, PartitionEntry.OTA_0_SUBTYPE):
+        for e in apps:
+            if e.subtype == subtype:
+                return e
+    return apps[0] if apps else None
+
+
 def slip_reader(port):
     """Generator to read SLIP packets from a serial port.
     Yields one full SLIP packet at a time, raises exception on timeout or invalid data.
@@ -1458,12 +1549,15 @@ def slip_reader(port):
     """
     partial_packet = None
     in_escape = False
+    # the port reads into the same buffer every time, nothing is allocated per read
+    buf = bytearray(4096)
+    view = memoryview(buf)
     while True:
         waiting = port.inWaiting()
-        read_bytes = port.read(1 if waiting == 0 else waiting)
-        if read_bytes == b'':
+        count = port.readinto(view[:min(waiting, len(buf)) or 1])
+        if count == 0:
             raise FatalError("Timed out waiting for packet %s" % ("header" if partial_packet is None else "content"))
-        for b in read_bytes:
+        for b in view[:count]:
 
             if type(b) is int:
                 b = bytes([b])  # python 2/3 compat
@@ -1490,6 +1584,120 @@ def slip_reader(port):
                 partial_packet += b
 
 
+def map_file(f):
+    """ Return a read-only mmap of an open binary file, or None if the file
+    can't be mapped (empty file, pipe, not a real file, Python 2).
+
+    The mapping stays valid after the file itself is closed.
+    """
+    if PYTHON2:
+        return None  # memoryview() doesn't accept mmap objects on Python 2
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, ValueError, EnvironmentError):
+        return None
+
+
+def read_view(f, size):
+    """ Read up to size bytes from f. If f is a mmap, return a memoryview
+    slice of it instead of copying the data onto the heap. """
+    if isinstance(f, mmap.mmap):
+        start = f.tell()
+        data = memoryview(f)[start:start + size]
+        f.seek(start + len(data))
+        return data
+    return f.read(size)
+
+
+def read_image_data(argfile):
+    """ Return the whole content of an open image file, memory-mapped where
+    possible so it is only paged in as it is hashed/compressed/sent. """
+    mapped = map_file(argfile)
+    if mapped is None:
+        data = argfile.read()
+    else:
+        data = memoryview(mapped)
+    argfile.seek(0)
+    return data
+
+
+def _image_blocks(esp, address, args, argfile, block_size=0x10000):
+    """ Yield the image in argfile the way write_flash writes it, in blocks
+    read from the file, with the flash params of a bootloader updated and the
+    end padded to 4 bytes. Only one block is held in memory at a time. """
+    argfile.seek(0)
+    first = True
+    while True:
+        block = argfile.read(block_size)
+        # a stream may return less than asked for before its end
+        while block and len(block) < block_size:
+            more = argfile.read(block_size - len(block))
+            if not more:
+                break
+            block += more
+        if not block:
+            break
+        if first:
+            block = _update_image_flash_params(esp, address, args, block)
+            first = False
+        yield pad_to(block, 4)
+    argfile.seek(0)
+
+
+class ZipMember(object):
+    """ A member of a zip archive that write_flash can use like an image file.
+
+    The member is decompressed as it is read instead of being extracted to
+    disk first, and zipfile checks its CRC once the end is reached, so a
+    damaged archive raises BadZipfile rather than being flashed. Seeking
+    backwards restarts decompression from the beginning of the member.
+    """
+    def __init__(self, zip_path, member):
+        self._zip = zipfile.ZipFile(zip_path, 'r')
+        try:
+            self._info = self._zip.getinfo(member)
+        except KeyError:
+            self._zip.close()
+            raise FatalError('%s has no member %s' % (zip_path, member))
+        self.name = '%s:%s' % (zip_path, member)
+        self._stream = None
+        self._stream_pos = 0
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._info.file_size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size=-1):
+        if self._stream is None or self._stream_pos > self._pos:
+            if self._stream is not None:
+                self._stream.close()
+            self._stream = self._zip.open(self._info)
+            self._stream_pos = 0
+        while self._stream_pos < self._pos:
+            skipped = self._stream.read(min(self._pos - self._stream_pos, 0x10000))
+            if not skipped:
+                break
+            self._stream_pos += len(skipped)
+        data = self._stream.read(size)
+        self._stream_pos += len(data)
+        self._pos = self._stream_pos
+        return data
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        self._zip.close()
+
+
 def arg_auto_int(x):
     return int(x, 0)
 
@@ -1545,6 +1753,8 @@ def pad_to(data, alignment, pad_character=b'\xFF'):
     """ Pad to the next alignment boundary """
     pad_mod = len(data) % alignment
     if pad_mod != 0:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
         data += pad_character * (alignment - pad_mod)
     return data
 
@@ -1635,15 +1845,16 @@ def detect_flash_size(esp, args):
             _log('Auto-detected Flash size:', args.flash_size)
 
 
-def _update_image_flash_params(esp, address, args, image):
-    """ Modify the flash mode & size bytes if this looks like an executable bootloader image  """
+def image_flash_params(esp, args, image):
+    """ Return the flash mode & size bytes write_flash puts in the header of
+    this bootloader image, None if it doesn't start with an image header  """
     if len(image) < 8:
-        return image  # not long enough to be a bootloader image
+        return None  # not long enough to be a bootloader image
 
     # unpack the (potential) image header
-    magic, _, flash_mode, flash_size_freq = struct.unpack("BBBB", image[:4])
-    if address != esp.BOOTLOADER_FLASH_OFFSET or magic != esp.ESP_IMAGE_MAGIC:
-        return image  # not flashing a bootloader, so don't modify this
+    magic, _, flash_mode, flash_size_freq = struct.unpack_from("BBBB", image)
+    if magic != esp.ESP_IMAGE_MAGIC:
+        return None
 
     if args.flash_mode != 'keep':
         flash_mode = {'qio':0, 'qout':1, 'dio':2, 'dout': 3}[args.flash_mode]
@@ -1656,10 +1867,18 @@ def _update_image_flash_params(esp, address, args, image):
     if args.flash_size != 'keep':
         flash_size = esp.parse_flash_size_arg(args.flash_size)
 
-    flash_params = struct.pack(b'BB', flash_mode, flash_size + flash_freq)
-    if flash_params != image[2:4]:
+    return struct.pack(b'BB', flash_mode, flash_size + flash_freq)
+
+
+def _update_image_flash_params(esp, address, args, image):
+    """ Modify the flash mode & size bytes if this looks like an executable bootloader image  """
+    if address != esp.BOOTLOADER_FLASH_OFFSET:
+        return image  # not flashing a bootloader, so don't modify this
+    flash_params = image_flash_params(esp, args, image)
+    if flash_params is not None and flash_params != bytes(image[2:4]):
         _log('Flash params set to 0x%04x' % struct.unpack(">H", flash_params))
-        image = image[0:2] + flash_params + image[4:]
+        # join() also accepts a mapped image, only the (small) bootloader ends up copied
+        image = b''.join((image[0:2], flash_params, image[4:]))
     return image
 
 
@@ -1683,38 +1902,75 @@ def write_flash(esp, args):
     for address, argfile in args.addr_filename:
         if args.no_stub:
             _log('Erasing flash...')
-        image = pad_to(argfile.read(), 4)
-        image = _update_image_flash_params(esp, address, args, image)
-        calcmd5 = hashlib.md5(image).hexdigest()
-        uncsize = len(image)
+        # the image is streamed from argfile, a file or a ZipMember, in blocks:
+        # once to hash it, then to compress it to a temporary file or to send it
+        md5 = hashlib.md5()
+        uncsize = 0
+        for block in _image_blocks(esp, address, args, argfile):
+            md5.update(block)
+            uncsize += len(block)
+        calcmd5 = md5.hexdigest()
+        # args.flashed_md5 optionally maps address -> md5 last written to this device,
+        # regions recorded as unchanged only cost one md5 readback instead of a rewrite
+        flashed_md5 = getattr(args, 'flashed_md5', None)
+        if flashed_md5 is not None:
+            if flashed_md5.get(address) == calcmd5:
+                try:
+                    if esp.flash_md5sum(address, uncsize) == calcmd5:
+                        _log('Skipping 0x%08x, flash contents unchanged.' % address)
+                        continue
+                except NotImplementedInROMError:
+                    pass
+            flashed_md5.pop(address, None)
         if args.compress:
-            uncimage = image
-            image = zlib.compress(uncimage, 9)
-            ratio = uncsize / len(image)
-            blocks = esp.flash_defl_begin(uncsize, len(image), address)
+            # args.deflated optionally maps md5 -> file holding the image already
+            # compressed at level 9, e.g. prepared by a background prefetch
+            deflated = getattr(args, 'deflated', None) or {}
+            if calcmd5 in deflated:
+                image = open(deflated[calcmd5], 'rb')
+            else:
+                image = tempfile.TemporaryFile()
+                compressor = zlib.compressobj(9)
+                for block in _image_blocks(esp, address, args, argfile):
+                    image.write(compressor.compress(block))
+                image.write(compressor.flush())
+            image.seek(0, 2)
+            compsize = image.tell()
+            image.seek(0)
+            ratio = uncsize / compsize
+            blocks = esp.flash_defl_begin(uncsize, compsize, address)
+            image_blocks = iter(lambda: image.read(esp.FLASH_WRITE_SIZE), b'')
         else:
+            image = None
             ratio = 1.0
             blocks = esp.flash_begin(uncsize, address)
-        argfile.seek(0)  # in case we need it again
+            image_blocks = _image_blocks(esp, address, args, argfile, esp.FLASH_WRITE_SIZE)
         seq = 0
         written = 0
         t = time.time()
         esp._port.timeout = min(DEFAULT_TIMEOUT * ratio,
                                 CHIP_ERASE_TIMEOUT * 2)
-        while len(image) > 0:
-            _log('Writing at 0x%08x... (%d %%)' % (address + seq * esp.FLASH_WRITE_SIZE, 100 * (seq + 1) // blocks))
-            sys.stdout.flush()
-            block = image[0:esp.FLASH_WRITE_SIZE]
-            if args.compress:
-                esp.flash_defl_block(block, seq)
-            else:
-                # Pad the last block
-                block = block + b'\xff' * (esp.FLASH_WRITE_SIZE - len(block))
-                esp.flash_block(block, seq)
-            image = image[esp.FLASH_WRITE_SIZE:]
-            seq += 1
-            written += len(block)
+        try:
+            for block in image_blocks:
+                if _progress:
+                    _progress(ProgressEvent('write', address, uncsize * seq // blocks, uncsize, time.time() - t))
+                else:
+                    _log('Writing at 0x%08x... (%d %%)' % (address + seq * esp.FLASH_WRITE_SIZE, 100 * (seq + 1) // blocks))
+                    sys.stdout.flush()
+                if args.compress:
+                    esp.flash_defl_block(block, seq)
+                else:
+                    # Pad the last block
+                    block = b''.join((block, b'\xff' * (esp.FLASH_WRITE_SIZE - len(block))))
+                    esp.flash_block(block, seq)
+                seq += 1
+                written += len(block)
+        finally:
+            if image is not None:
+                image.close()
         t = time.time() - t
+        if _progress:
+            _progress(ProgressEvent('done', address, uncsize, uncsize, t))
         speed_msg = ""
         if args.compress:
             if t > 0.0:
@@ -1733,6 +1989,8 @@ def write_flash(esp, args):
                 raise FatalError("MD5 of file does not match data in flash!")
             else:
                 _log('Hash of data verified.')
+                if flashed_md5 is not None:
+                    flashed_md5[address] = calcmd5
         except NotImplementedInROMError:
             pass
         esp._port.timeout = DEFAULT_TIMEOUT
@@ -1867,9 +2125,7 @@ def verify_flash(esp, args):
     differences = False
 
     for address, argfile in args.addr_filename:
-        image = pad_to(argfile.read(), 4)
-        argfile.seek(0)  # rewind in case we need it again
-
+        image = pad_to(read_image_data(argfile), 4)
         image = _update_image_flash_params(esp, address, args, image)
 
         image_size = len(image)
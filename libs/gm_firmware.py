@@ -0,0 +1,359 @@
+import os
+import time
+import zlib
+import json
+import codecs
+import binascii
+import hashlib
+import zipfile
+import threading
+
+CHUNK_SIZE = 64 * 1024
+BOOTLOADER = 'bootloader.bin'
+ESP_IMAGE_MAGIC = 0xe9
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _patch_flash_params(chunk, flash_params):
+    # what esptool does to the first block of a bootloader it flashes
+    if len(chunk) < 8 or bytearray(chunk[:1])[0] != ESP_IMAGE_MAGIC:
+        return chunk
+    return b''.join((chunk[0:2], flash_params, chunk[4:]))
+
+
+def _write_json(path, data):
+    # write next to the target and rename over it, readers never see half a file
+    tmp_path = path + '.tmp'
+    with codecs.open(tmp_path, 'w', 'utf-8') as f:
+        f.write(json.dumps(data, indent=4, sort_keys=True))
+    os.replace(tmp_path, path)
+
+
+class FlashRecord(object):
+    """Remembers, per device MAC, the md5 of what was last flashed at each
+    partition offset so unchanged partitions can be skipped on update."""
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.isfile(self._path):
+            return {}
+        try:
+            with codecs.open(self._path, 'r', 'utf-8') as f:
+                return json.loads(f.read())
+        except ValueError:
+            # a damaged record only costs a full reflash
+            return {}
+
+    def digests(self, mac):
+        """Returns {address: md5} last flashed to the device"""
+        with self._lock:
+            device = self._load().get(mac, {})
+        return dict((int(addr, 0), part['md5']) for addr, part in device.items())
+
+    def update(self, mac, digests, labels):
+        """Stores the {address: md5} written to the device, labels maps
+        address to partition name for readability of the record"""
+        with self._lock:
+            record = self._load()
+            record[mac] = dict(('0x%x' % addr, {'label': labels.get(addr, ''), 'md5': md5})
+                               for addr, md5 in digests.items())
+            _write_json(self._path, record)
+
+
+class FirmwareStore(object):
+    """Content-addressed firmware cache.
+
+    Every downloaded zip is stored once under blobs/<sha256>. index.json maps
+    each version to its zip, the name, hash and CRC of each member and the
+    last time it was used, so a cached version is flashed without touching
+    the network. Members are never extracted, the flasher reads them straight
+    out of the zip, which also lets updates run from a read-only cache. Blobs
+    are immutable and the index is swapped atomically, so versions coexist
+    and a failed update never leaves half-overwritten images behind.
+    """
+
+    def __init__(self, root, max_size=64 * 1024 * 1024):
+        self._root = root
+        self._blob_dir = os.path.join(root, 'blobs')
+        self._index_path = os.path.join(root, 'index.json')
+        self._max_size = max_size
+        self._lock = threading.RLock()
+        if not os.path.isdir(self._blob_dir):
+            os.makedirs(self._blob_dir)
+
+    def _load(self):
+        if not os.path.isfile(self._index_path):
+            return {}
+        try:
+            with codecs.open(self._index_path, 'r', 'utf-8') as f:
+                return json.loads(f.read())
+        except ValueError:
+            return {}
+
+    def blob_path(self, digest):
+        return os.path.join(self._blob_dir, digest)
+
+    def _has_blob(self, digest, size):
+        path = self.blob_path(digest)
+        return os.path.isfile(path) and os.path.getsize(path) == size
+
+    def has_version(self, version):
+        """True if the zip of version is in the store"""
+        with self._lock:
+            entry = self._load().get(version)
+        if not entry:
+            return False
+        return self._has_blob(entry['zip']['sha256'], entry['zip']['size'])
+
+    def latest_version(self):
+        """Returns the most recently downloaded version that is fully
+        cached, None if there is none"""
+        with self._lock:
+            index = self._load()
+        for version in sorted(index, key=lambda v: index[v].get('added', 0), reverse=True):
+            if self.has_version(version):
+                return version
+        return None
+
+    def member_sources(self, version):
+        """Returns (zip path, {member name: name inside the zip}) of a cached
+        version and marks it as recently used, None if it is not cached"""
+        if not self.has_version(version):
+            return None
+        with self._lock:
+            index = self._load()
+            entry = index[version]
+            entry['used'] = time.time()
+            try:
+                _write_json(self._index_path, index)
+            except EnvironmentError:
+                # a read-only cache still flashes, it just can't track usage
+                pass
+        names = dict((name, m.get('path', name)) for name, m in entry['members'].items())
+        return (self.blob_path(entry['zip']['sha256']), names)
+
+    def verify(self, version):
+        """Checks the zip of a cached version, dropping it if it got
+        corrupted on disk. Returns True if it is intact.
+
+        The zip is only hashed again when its size or mtime differ from
+        the ones recorded in the index the last time it was hashed."""
+        with self._lock:
+            entry = self._load().get(version)
+        if not entry:
+            return False
+        path = self.blob_path(entry['zip']['sha256'])
+        try:
+            st = os.stat(path)
+        except EnvironmentError:
+            return False
+        if st.st_size == entry['zip']['size'] and st.st_mtime == entry['zip'].get('mtime'):
+            return True
+        if file_sha256(path) != entry['zip']['sha256']:
+            os.remove(path)
+            return False
+        with self._lock:
+            index = self._load()
+            if version in index:
+                index[version]['zip']['mtime'] = st.st_mtime
+                try:
+                    _write_json(self._index_path, index)
+                except EnvironmentError:
+                    # a read-only cache is hashed on every check
+                    pass
+        return True
+
+    def _last_flash_params(self, index):
+        # the ones the bootloader of the most recently used version was deflated with
+        for version in sorted(index, key=lambda v: index[v].get('used', 0), reverse=True):
+            d = index[version]['members'].get(BOOTLOADER, {}).get('deflated')
+            if d and d.get('flash_params'):
+                return d['flash_params']
+        return None
+
+    def precompress(self, version, flash_params=None):
+        """Deflates the members of a cached version the way write_flash
+        would, so flashing unchanged images skips the level 9 compression.
+
+        flash_params are the two bytes write_flash puts at offset 2 of the
+        bootloader header (flash mode, flash size and frequency), the
+        bootloader is hashed and deflated with them in place. Without them
+        the ones last passed in are used, a background prefetch does not
+        know the board that gets flashed."""
+        sources = self.member_sources(version)
+        if not sources:
+            return
+        zip_path, names = sources
+        with self._lock:
+            index = self._load()
+            entry = index.get(version)
+            if flash_params is None:
+                params = self._last_flash_params(index)
+            else:
+                params = binascii.hexlify(flash_params).decode('ascii')
+        deflated = {}
+        with zipfile.ZipFile(zip_path, 'r') as package_zip:
+            for name, m in entry['members'].items():
+                d = m.get('deflated')
+                if d and self._has_blob(d['sha256'], d['size']) and (
+                        name != BOOTLOADER or d.get('flash_params') == params):
+                    continue
+                # streamed in chunks, images never sit whole in memory
+                md5 = hashlib.md5()
+                compressor = zlib.compressobj(9)
+                length = 0
+                tmp_path = self.blob_path(name + '.deflated.tmp')
+                with package_zip.open(names[name]) as src, open(tmp_path, 'wb') as f:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        if name == BOOTLOADER and params and length == 0:
+                            chunk = _patch_flash_params(chunk, binascii.unhexlify(params))
+                        md5.update(chunk)
+                        length += len(chunk)
+                        f.write(compressor.compress(chunk))
+                    # write_flash pads images to 4 bytes before hashing and compressing
+                    if length % 4:
+                        padding = b'\xff' * (4 - length % 4)
+                        md5.update(padding)
+                        f.write(compressor.compress(padding))
+                    f.write(compressor.flush())
+                digest = file_sha256(tmp_path)
+                size = os.path.getsize(tmp_path)
+                self._add_blob(tmp_path, digest)
+                deflated[name] = {
+                    'md5': md5.hexdigest(),
+                    'sha256': digest,
+                    'size': size
+                }
+                if name == BOOTLOADER:
+                    deflated[name]['flash_params'] = params
+        if not deflated:
+            return
+        with self._lock:
+            index = self._load()
+            if version not in index:
+                return
+            for name, d in deflated.items():
+                index[version]['members'][name]['deflated'] = d
+            _write_json(self._index_path, index)
+
+    def deflated_paths(self, version):
+        """Returns {md5 of image: path of its deflated blob} for the
+        precompressed members of a cached version"""
+        with self._lock:
+            entry = self._load().get(version)
+        paths = {}
+        for m in (entry or {'members': {}})['members'].values():
+            d = m.get('deflated')
+            if d and self._has_blob(d['sha256'], d['size']):
+                paths[d['md5']] = self.blob_path(d['sha256'])
+        return paths
+
+    def _add_blob(self, src, digest):
+        path = self.blob_path(digest)
+        if os.path.isfile(path):
+            os.remove(src)
+        else:
+            os.replace(src, path)
+        return path
+
+    def add_zip(self, version, zip_path):
+        """Moves a downloaded firmware zip into the store and indexes its
+        members. Every member is decompressed once in memory to hash it,
+        which also checks its CRC, nothing is written out."""
+        zip_digest = file_sha256(zip_path)
+        zip_size = os.path.getsize(zip_path)
+        zip_blob = self._add_blob(zip_path, zip_digest)
+
+        members = {}
+        with zipfile.ZipFile(zip_blob, 'r') as package_zip:
+            for info in package_zip.infolist():
+                if info.filename.endswith('/'):
+                    continue
+                hasher = hashlib.sha256()
+                with package_zip.open(info) as src:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        hasher.update(chunk)
+                members[os.path.basename(info.filename)] = {
+                    'path': info.filename,
+                    'sha256': hasher.hexdigest(),
+                    'size': info.file_size,
+                    'crc': info.CRC
+                }
+
+        with self._lock:
+            index = self._load()
+            index[version] = {
+                'zip': {'sha256': zip_digest, 'size': zip_size, 'mtime': os.path.getmtime(zip_blob)},
+                'members': members,
+                'added': time.time(),
+                'used': time.time()
+            }
+            _write_json(self._index_path, index)
+        self._remove_extracted(version, members)
+        self.evict(keep=version)
+
+    def _remove_extracted(self, version, members):
+        """Deletes the <version>.zip and the members firmware updates used to
+        extract next to it, before there was a store. Only names from the
+        zip are touched, anything else in the directory is left alone."""
+        root = os.path.abspath(self._root)
+        names = [version + '.zip'] + [m['path'] for m in members.values()]
+        for name in names:
+            path = os.path.abspath(os.path.join(root, name))
+            # member paths come from the zip, never follow one out of the root
+            if not path.startswith(root + os.sep):
+                continue
+            if path.startswith(os.path.abspath(self._blob_dir) + os.sep):
+                continue
+            if path == os.path.abspath(self._index_path) or not os.path.isfile(path):
+                continue
+            try:
+                os.remove(path)
+            except EnvironmentError:
+                pass
+
+    def evict(self, keep=None):
+        """Drops least recently used versions until the blobs fit in
+        max_size, then removes blobs no remaining version refers to"""
+        with self._lock:
+            index = self._load()
+
+            def version_blobs(entry):
+                blobs = dict((m['deflated']['sha256'], m['deflated']['size'])
+                             for m in entry['members'].values() if 'deflated' in m)
+                blobs[entry['zip']['sha256']] = entry['zip']['size']
+                return blobs
+
+            def total_size():
+                blobs = {}
+                for entry in index.values():
+                    blobs.update(version_blobs(entry))
+                return sum(blobs.values())
+
+            for version in sorted(index, key=lambda v: index[v].get('used', 0)):
+                if total_size() <= self._max_size:
+                    break
+                if version != keep:
+                    del index[version]
+            _write_json(self._index_path, index)
+
+            referenced = set()
+            for entry in index.values():
+                referenced.update(version_blobs(entry))
+            for name in os.listdir(self._blob_dir):
+                if name not in referenced and not name.endswith('.tmp'):
+                    os.remove(os.path.join(self._blob_dir, name))
+
+
+def mac_key(mac):
+    return ':'.join('%02x' % b for b in mac)
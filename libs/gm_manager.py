@@ -1,29 +1,38 @@
 import sublime
 
 import os
+import time
 import json
 import codecs
-import threading
 import zipfile
+import threading
 import serial_monitor
 import gm_panel
+import gm_firmware
+import gm_ports
 
 try:
     #ST3
-    from .sys_path import gm_dir, gm_user_dir, gm_firmware_dir, gm_version_url
-    from .serial.tools.list_ports import comports
-    from .esptool import esp_set_log, ESPLoader, write_flash, detect_flash_size, flash_size_bytes
+    from .sys_path import gm_dir, gm_user_dir, gm_firmware_dir, gm_version_url, gm_setting
+    from .esptool import esp_set_log, esp_set_progress, ESPLoader, ESP32ROM, NotImplementedInROMError, write_flash, detect_flash_size, flash_size_bytes, image_flash_params
+    from .esptool import parse_partition_table, find_app_partition, ZipMember
     from .task_queue import ActionQueue
-    from .net.open_compat import open_compat, read_compat
-    from .net.download_manager import downloader
+    from .net.download_manager import downloader, pool_stats
+    from .net.downloaders.downloader_exception import DownloaderException
+    from .net import timing
+    from .net.cache import cache_stats
+    from .net.http_cache import flush_stores
 except Exception as e:
     #ST2
-    import gm_dir, gm_user_dir, gm_firmware_dir, gm_version_url
-    from serial.tools.list_ports import comports
-    from esptool import esp_set_log, ESPLoader, write_flash, detect_flash_size, flash_size_bytes
+    import gm_dir, gm_user_dir, gm_firmware_dir, gm_version_url, gm_setting
+    from esptool import esp_set_log, esp_set_progress, ESPLoader, ESP32ROM, NotImplementedInROMError, write_flash, detect_flash_size, flash_size_bytes, image_flash_params
+    from esptool import parse_partition_table, find_app_partition, ZipMember
     from task_queue import ActionQueue
-    from net.open_compat import open_compat, read_compat
-    from net.download_manager import downloader
+    from net.download_manager import downloader, pool_stats
+    from net.downloaders.downloader_exception import DownloaderException
+    from net import timing
+    from net.cache import cache_stats
+    from net.http_cache import flush_stores
 
 try:
     #PY3
@@ -37,8 +46,15 @@ class GmManager(object):
     def __init__(self):
         self.menu = None
         self.panel = None
+        self._flash_record = None
+        self._firmware_store = None
+        self._net_settings = None
+        self._firmware_lock = threading.Lock()
         self._act_queue = ActionQueue()
         self.serial_monitor = serial_monitor.SerialMonitor(self.panel_write)
+        self._network_ports = []
+        self._menu_lock = threading.Lock()
+        self.port_watcher = gm_ports.PortWatcher(self._write_port_menu)
 
     @property
     def menu_ports(self):
@@ -49,21 +65,41 @@ class GmManager(object):
         return self.menu[0]["children"][0]["children"][1]["children"]
 
     def refresh_serial_port(self):
-        self.menu_ports.clear()
-        for n, (port, desc, hwid) in enumerate(sorted(comports()), 1):
-            print('--- {:2}: {:20} {!r}\n'.format(n, port, desc))
-            self.menu_ports.append({
-                "caption": port,
-                "id": port,
-                "checkbox": True,
-                "command": "gm_serial_port",
-                "args": {
-                    "serial_port": port
-                }
-            })
-        path = os.path.join(gm_user_dir(), 'Main.sublime-menu')
-        with codecs.open(path, 'w', 'utf-8') as f:
-            f.write(json.dumps(self.menu))
+        """Rescans the ports in the background, the menu is rewritten once
+        the port watcher has them. Plugged in boards show up on their own,
+        this is only needed after changing settings."""
+        self.serial_monitor.buffer_size = gm_setting('network_buffer_size', 0)
+        # boards shared over the network, e.g. "rfc2217://raspberrypi.local:4000"
+        self._network_ports = list(gm_setting('network_ports', []))
+        self.port_watcher.refresh()
+
+    def stop_port_watcher(self):
+        self.port_watcher.stop()
+
+    def flush_http_cache(self):
+        """Writes out the access times the HTTP cache keeps in memory, so
+        its eviction order survives a reload"""
+        flush_stores()
+
+    def _write_port_menu(self, ports):
+        # called from the port watcher thread
+        ports = ports + [(url, 'network') for url in self._network_ports]
+        with self._menu_lock:
+            self.menu_ports.clear()
+            for n, (port, desc) in enumerate(ports, 1):
+                print('--- {:2}: {:20} {!r}\n'.format(n, port, desc))
+                self.menu_ports.append({
+                    "caption": port,
+                    "id": port,
+                    "checkbox": True,
+                    "command": "gm_serial_port",
+                    "args": {
+                        "serial_port": port
+                    }
+                })
+            path = os.path.join(gm_user_dir(), 'Main.sublime-menu')
+            with codecs.open(path, 'w', 'utf-8') as f:
+                f.write(json.dumps(self.menu))
 
     def panel_show(self, window, syntax):
         if not self.panel:
@@ -97,51 +133,176 @@ class GmManager(object):
         if self.serial_monitor.is_ready:
             self.serial_monitor.send(data)
 
+    @property
+    def firmware_store(self):
+        if not self._firmware_store:
+            max_size = gm_setting('firmware_cache_size', 64) * 1024 * 1024
+            self._firmware_store = gm_firmware.FirmwareStore(gm_firmware_dir(), max_size)
+        return self._firmware_store
+
+    @property
+    def net_settings(self):
+        # shared by every request so the pooled managers all carry the cache
+        if not self._net_settings:
+            self._net_settings = {
+                'http_cache': True,
+                'http_cache_length': 30 * 24 * 60 * 60,
+                'http_cache_path': os.path.join(gm_user_dir(), 'http_cache')
+            }
+        return self._net_settings
+
+    def _check_firmware_version(self, url):
+        store = self.firmware_store
+        if gm_setting('offline', False):
+            version = store.latest_version()
+            if version:
+                self.panel_writeln('offline, using firmware %s' % version)
+            else:
+                self.panel_writeln('offline and no firmware is cached')
+            return version
+        self.panel_writeln('Check firmware version ... ')
+        try:
+            with downloader(url, self.net_settings) as manager:
+                version = manager.fetch(url, 'Error checking firmware version.',
+                                        max_age=gm_setting('version_check_ttl', 3600))
+        except (DownloaderException) as e:
+            version = store.latest_version()
+            if not version:
+                raise
+            self.panel_writeln(str(e))
+            self.panel_writeln('using last known firmware %s' % version)
+            return version
+        return version.replace(b'\n',b'').decode('utf-8', 'replace')
+
+    def _download_firmware(self, url, version, connections=1, log=True):
+        firmware = version+'.zip'
+        firmware_path = os.path.join(gm_firmware_dir(), firmware)
+        firmware_url = url.replace('version', firmware)
+        if log:
+            self.panel_writeln('Start Download "%s"'%firmware_url)
+        with downloader(firmware_url, self.net_settings) as manager:
+            manager.download_to(firmware_url, firmware_path, 'Error downloading firmware.',
+                                connections=connections)
+        if log:
+            self.panel_writeln('firmware is ready\nunpack ...')
+        self.firmware_store.add_zip(version, firmware_path)
+
+    def net_summary(self, since=0):
+        """Writes a line per network request recorded since the given time
+        to the panel"""
+        for entry in timing.recent():
+            if entry['started'] >= since:
+                self.panel_writeln(timing.summary(entry))
+
+    def net_timings(self, window):
+        """Opens the recorded network requests, the connection pool and
+        cache counters as JSON in a new view"""
+        text = timing.dump_json(connection_pool=pool_stats(), memory_cache=cache_stats())
+        view = window.new_file()
+        view.set_name('GameMCU network timings.json')
+        view.set_scratch(True)
+        view.run_command('gm_insert_text', {'pos': 0, 'text': text})
+        self.net_summary()
+
     def _firmware_download_task(self, on_done=None):
         url = gm_version_url()
+        store = self.firmware_store
+        started = time.time()
         try:
-            self.panel_writeln('Check firmware version ... ')
-            with downloader(url, {}) as manager:
-                version = manager.fetch(url, 'Error submitting usage information.')
-            version = version.replace(b'\n',b'').decode('utf-8', 'replace')
-            firmware = version+'.zip'
-            firmware_path = os.path.join(gm_firmware_dir(), firmware)
-            if not os.path.isfile(firmware_path):
-                firmware_url = url.replace('version', firmware)
-                self.panel_writeln('Start Download "%s"'%firmware_url)
-                with downloader(firmware_url, {}) as manager:
-                    package_bytes = manager.fetch(firmware_url, 'Error submitting usage information.')
-                with open_compat(firmware_path, "wb") as package_file:
-                    package_file.write(package_bytes)
+            version = self._check_firmware_version(url)
+            if not version:
+                return
+            # waits for a running prefetch instead of downloading the same zip twice
+            with self._firmware_lock:
+                if store.has_version(version) and store.verify(version):
+                    self.panel_writeln('firmware %s is cached' % version)
+                else:
+                    self._download_firmware(url, version, gm_setting('download_connections', 4))
         except (Exception) as e:
             self.panel_writeln(str(e))
+            self.net_summary(started)
+            return
+        self.net_summary(started)
+        if on_done:
+            on_done(version)
+
+    def _firmware_prefetch_task(self):
+        url = gm_version_url()
+        store = self.firmware_store
+        if not self._firmware_lock.acquire(False):
             return
-        self.panel_writeln('firmware is ready\nunpack ...')
         try:
-            package_zip = zipfile.ZipFile(firmware_path, 'r')
-            package_zip.extractall(gm_firmware_dir())
-            package_zip.close()
-            if on_done:
-                on_done()
-        except (zipfile.BadZipfile):
-            self.panel_writeln(str(e))
+            with downloader(url, self.net_settings) as manager:
+                version = manager.fetch(url, 'Error checking firmware version.',
+                                        max_age=gm_setting('version_check_ttl', 3600))
+            version = version.replace(b'\n',b'').decode('utf-8', 'replace')
+            if not (store.has_version(version) and store.verify(version)):
+                # a single connection, the prefetch should not compete with the user
+                self._download_firmware(url, version, log=False)
+            store.precompress(version)
+        except (Exception) as e:
+            # nothing is lost, the update downloads on demand
+            print('gamemcu: firmware prefetch failed, %s' % e)
+        finally:
+            self._firmware_lock.release()
+
+    def prefetch_firmware(self, delay=10):
+        """Checks for new firmware on a background thread shortly after
+        start up, so an update finds it downloaded and compressed"""
+        if not gm_setting('firmware_prefetch', False) or gm_setting('offline', False):
+            return
+        timer = threading.Timer(delay, self._firmware_prefetch_task)
+        timer.daemon = True
+        timer.start()
+
+    @property
+    def flash_record(self):
+        if not self._flash_record:
+            path = os.path.join(gm_user_dir(), 'flash_record.json')
+            self._flash_record = gm_firmware.FlashRecord(path)
+        return self._flash_record
 
-    def _firmware_upload_task(self):
-        firmware = (
-            '0x1000', os.path.join(gm_firmware_dir(),'bootloader.bin'),
-            '0x10000', os.path.join(gm_firmware_dir(), 'NodeMCU.bin'),
-            '0x8000', os.path.join(gm_firmware_dir(), 'partitions_singleapp.bin')
-        )
-        args = FirmwareUploadArgs(self.serial_monitor.port,firmware)
+    def _firmware_upload_task(self, version):
+        sources = self.firmware_store.member_sources(version)
+        if not sources:
+            self.panel_writeln('firmware %s is not in the cache' % version)
+            return
+        zip_path, names = sources
+        members = {}
+        try:
+            # images are decompressed from the cached zip as they are flashed
+            for name in ('bootloader.bin', 'NodeMCU.bin', 'partitions_singleapp.bin'):
+                members[name] = ZipMember(zip_path, names[name])
+            app = find_app_partition(parse_partition_table(members['partitions_singleapp.bin'].read()))
+            app_offset = app.offset if app else 0x10000
+            labels = {
+                ESP32ROM.BOOTLOADER_FLASH_OFFSET: 'bootloader',
+                ESP32ROM.PARTITION_TABLE_OFFSET: 'partition_table',
+                app_offset: app.label if app else 'app'
+            }
+            firmware = (
+                hex(ESP32ROM.BOOTLOADER_FLASH_OFFSET), members['bootloader.bin'],
+                hex(app_offset), members['NodeMCU.bin'],
+                hex(ESP32ROM.PARTITION_TABLE_OFFSET), members['partitions_singleapp.bin']
+            )
+            args = FirmwareUploadArgs(self.serial_monitor.port,firmware)
+        except Exception as e:
+            for member in members.values():
+                member.close()
+            self.panel_writeln(str(e))
+            return
         initial_baud = min(ESPLoader.ESP_ROM_BAUD, args.baud)
         try:
             self.serial_monitor.stop(log=False)
             self.panel_writeln('Firmware Start Update ...')
             esp_set_log(self.panel_writeln)
-            esp = ESPLoader.detect_chip(args.port, initial_baud, args.before)
+            esp_set_progress(gm_panel.GmProgress())
+            port = serial_monitor.with_buffer_size(args.port, self.serial_monitor.buffer_size)
+            esp = ESPLoader.detect_chip(port, initial_baud, args.before)
             self.panel_writeln("Chip is %s" % (esp.get_chip_description()))
             esp = esp.run_stub()
-            if args.baud > initial_baud:
+            # a raw socket bridge has no way to follow a baud rate change
+            if args.baud > initial_baud and not args.port.lower().startswith('socket://'):
                 try:
                     esp.change_baud(args.baud)
                 except NotImplementedInROMError:
@@ -150,13 +311,36 @@ class GmManager(object):
                 self.panel_writeln("Configuring flash size...")
                 detect_flash_size(esp, args)
                 esp.flash_set_parameters(flash_size_bytes(args.flash_size))
-            write_flash(esp, args)
+            # the bootloader is deflated with the flash params of this board in its
+            # header, so the precompressed image matches what write_flash sends
+            bootloader = members['bootloader.bin']
+            flash_params = image_flash_params(esp, args, bootloader.read(8))
+            bootloader.seek(0)
+            if self._firmware_lock.acquire(False):
+                try:
+                    self.firmware_store.precompress(version, flash_params)
+                except (EnvironmentError, zipfile.BadZipfile) as e:
+                    # write_flash compresses what is missing itself
+                    print('gamemcu: firmware precompress failed, %s' % e)
+                finally:
+                    self._firmware_lock.release()
+            args.deflated = self.firmware_store.deflated_paths(version)
+            # only partitions whose content changed since the last update of this board get written
+            mac = gm_firmware.mac_key(esp.read_mac())
+            args.flashed_md5 = self.flash_record.digests(mac)
+            try:
+                write_flash(esp, args)
+            finally:
+                self.flash_record.update(mac, args.flashed_md5, labels)
             esp.hard_reset()
             esp._port.close()
             self.serial_monitor.start()
         except Exception as e:
             self.panel_writeln(str(e)) 
         finally:
+            # a later flash must not report to this update's panel
+            esp_set_progress(None)
+            args.close()
             self.serial_monitor.start(log=False)
 
     def firmware_update(self):
@@ -190,7 +374,9 @@ class FirmwareUploadArgs:
             except ValueError as e:
                 raise Exception('Address "%s" must be a number' % values[i])
             try:
-                argfile = open(values[i + 1], 'rb')
+                argfile = values[i + 1]
+                if not hasattr(argfile, 'read'):
+                    argfile = open(argfile, 'rb')
             except IOError as e:
                 raise Exception(e)
             except IndexError:
@@ -213,3 +399,9 @@ class FirmwareUploadArgs:
                 raise Exception(message)
             end = sector_end
         setattr(self, 'addr_filename', pairs)
+
+    def close(self):
+        # write_flash streams the images from these files a block at a time,
+        # the handles only need to stay open until flashing is done
+        for address, argfile in self.addr_filename:
+            argfile.close()
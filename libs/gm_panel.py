@@ -1,4 +1,5 @@
 import sublime
+import time
 
 class HistoryMatchList(object):
     def __init__(self, command_prefix, commands):
@@ -53,6 +54,30 @@ class MemHistory(History):
                 matching_commands.append(cmd)
         return HistoryMatchList(command_prefix, matching_commands)
 
+class GmProgress(object):
+    """Renders esptool ProgressEvents as a single status bar entry, redrawn
+    at most once per interval so flashing doesn't flood the UI thread"""
+    def __init__(self, interval=0.25):
+        self._interval = interval
+        self._last = 0
+
+    def __call__(self, event):
+        now = time.time()
+        if event.phase != 'done' and now - self._last < self._interval:
+            return
+        kbps = event.rate * 8 / 1000
+        if event.phase == 'done':
+            self._last = 0
+            text = 'GameMCU: wrote %d bytes at 0x%08x in %.1fs (%.1f kbit/s)' % (
+                event.total, event.address, event.elapsed, kbps)
+        else:
+            self._last = now
+            percent = 100 * event.done // event.total if event.total else 0
+            eta = event.eta
+            text = 'GameMCU: writing at 0x%08x %d%% %.1f kbit/s ETA %s' % (
+                event.address, percent, kbps, '%ds' % eta if eta is not None else '-')
+        sublime.set_timeout(lambda: sublime.status_message(text), 0)
+
 class GmPanel(object):
     def __init__(self,window,consumer,syntax):
         self._window=window
@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import threading
+
+from serial.tools.list_ports import comports
+
+try:
+    from serial.tools import list_ports_linux
+    import ctypes
+    import ctypes.util
+except ImportError:
+    list_ports_linux = None
+
+# /dev and sysfs are read directly instead of through comports()
+_LINUX = sys.platform.startswith('linux') and list_ports_linux is not None
+
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_EVENT = struct.Struct('iIII')
+
+# udev can add the nodes of one device in a quick burst, changes are
+# applied once it settles for this long
+SETTLE_TIME = 0.1
+
+
+def _inotify_dev():
+    """Returns an inotify fd watching entries come and go in /dev, None
+    where inotify is not available"""
+    if not _LINUX:
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+    if libc.inotify_add_watch(fd, b'/dev', mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _read_events(fd):
+    """Returns the names of the /dev entries that changed, None if the
+    kernel dropped events and everything has to be rescanned"""
+    names = set()
+    while True:
+        try:
+            data = os.read(fd, 64 * 1024)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return names
+            raise
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[pos:pos + length].rstrip(b'\0').decode('utf-8', 'replace')
+            pos += length
+            if name:
+                names.add(name)
+
+
+class PortWatcher(object):
+    """Keeps the table of serial ports up to date on a background thread.
+
+    On Linux an inotify watch on /dev reports devices as they are plugged
+    in or removed, and only those are looked up in sysfs. Elsewhere, or
+    without inotify, the ports are polled every poll_interval seconds, on
+    Linux still reading sysfs only for devices that are new. on_change is
+    called from the watcher thread with a sorted list of (device,
+    description) whenever the table changes.
+    """
+
+    def __init__(self, on_change, poll_interval=3):
+        self._on_change = on_change
+        self._poll_interval = poll_interval
+        # device path -> ListPortInfo, None for ports that are hidden
+        self._infos = {}
+        self._ports = []
+        self._lock = threading.Lock()
+        self._thread = None
+        # wakes up the watcher thread, polled with the inotify fd on Linux
+        self._wake = threading.Event()
+        self._wake_w = None
+        self._rescan = False
+        self._stopped = False
+
+    @property
+    def ports(self):
+        """The sorted list of (device, description) last reported"""
+        with self._lock:
+            return list(self._ports)
+
+    def _notify(self):
+        # the lock must be held
+        self._wake.set()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b'x')
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._wake.clear()
+            inotify_fd = _inotify_dev()
+            wake_r = None
+            if inotify_fd is not None:
+                wake_r, self._wake_w = os.pipe()
+            self._thread = threading.Thread(target=self._run, args=(inotify_fd, wake_r, self._wake_w),
+                                            name='gamemcu port watcher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stopped = True
+            self._notify()
+            self._wake_w = None
+        thread.join(2)
+
+    def refresh(self):
+        """Rescans all ports on the watcher thread, starting it if needed"""
+        with self._lock:
+            if self._thread is not None:
+                self._rescan = True
+                self._notify()
+                return
+        self.start()
+
+    def _scan_all(self):
+        """Reads every port again, the initial scan and the manual refresh"""
+        if not _LINUX:
+            return dict((info.device, info) for info in comports())
+        self._infos = {}
+        return self._scan_dev()
+
+    def _scan_dev(self):
+        """Lists /dev and looks up in sysfs only the ports not seen before"""
+        infos = {}
+        for name in os.listdir('/dev'):
+            if list_ports_linux.is_port_name(name):
+                device = os.path.join('/dev', name)
+                infos[device] = self._infos[device] if device in self._infos else self._lookup(device)
+        return infos
+
+    def _lookup(self, device):
+        info = list_ports_linux.SysFS(device)
+        # like comports(), hide non-present internal serial ports
+        return None if info.subsystem == 'platform' else info
+
+    def _apply(self, infos, force=False):
+        self._infos = infos
+        ports = sorted(info for info in infos.values() if info is not None)
+        ports = [(info.device, info.description) for info in ports]
+        with self._lock:
+            if ports == self._ports and not force:
+                return
+            self._ports = ports
+        self._on_change(list(ports))
+
+    def _wait(self, inotify_fd, wake_r):
+        """Waits for a refresh, stop or /dev change. Returns the names that
+        changed in /dev, None if everything has to be rescanned."""
+        if inotify_fd is None:
+            # low frequency fallback poll
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+            return None
+        ready, _, _ = select.select([wake_r, inotify_fd], [], [])
+        if wake_r in ready:
+            os.read(wake_r, 1024)
+            return set()
+        time.sleep(SETTLE_TIME)
+        return _read_events(inotify_fd)
+
+    def _run(self, inotify_fd, wake_r, wake_w):
+        try:
+            self._apply(self._scan_all(), force=True)
+            while True:
+                names = self._wait(inotify_fd, wake_r)
+                with self._lock:
+                    if self._stopped:
+                        break
+                    rescan, self._rescan = self._rescan, False
+                if rescan:
+                    self._apply(self._scan_all(), force=True)
+                elif names is None:
+                    if inotify_fd is None and _LINUX:
+                        self._apply(self._scan_dev())
+                    else:
+                        self._apply(self._scan_all())
+                elif names:
+                    infos = dict(self._infos)
+                    for name in names:
+                        if list_ports_linux.is_port_name(name):
+                            device = os.path.join('/dev', name)
+                            if os.path.exists(device):
+                                infos[device] = self._lookup(device)
+                            else:
+                                infos.pop(device, None)
+                    self._apply(infos)
+        except Exception as e:
+            print('gamemcu: port watcher stopped, %s' % e)
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                    self._wake_w = None
+            if inotify_fd is not None:
+                os.close(inotify_fd)
+                os.close(wake_r)
+                os.close(wake_w)
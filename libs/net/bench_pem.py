@@ -0,0 +1,124 @@
+"""
+Benchmarks loading a 200 certificate CA bundle with asn1crypto, through
+pem.unarmor(..., multiple=True) on the file contents against the single
+pass pem.unarmor_file(), with and without reading the fields trust
+evaluation needs from each Certificate: subject, key usage and validity.
+
+The bundle is built from the certificates of the system CA bundle, or of
+the PEM file given on the command line:
+
+    python libs/net/bench_pem.py [bundle.pem [libs directory]]
+
+Give the libs directory of another checkout to measure its asn1crypto
+instead, e.g. one from before unarmor_file() and the raw extension scan.
+"""
+
+import os
+import re
+import ssl
+import sys
+import shutil
+import tempfile
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# net/http would shadow the standard library package, net is imported from libs
+sys.path = [path for path in sys.path if os.path.abspath(path or '.') != HERE]
+sys.path.insert(0, sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(HERE))
+
+from net.deps.asn1crypto import pem, x509  # noqa
+
+CERT_COUNT = 200
+
+SYSTEM_BUNDLES = [
+    ssl.get_default_verify_paths().cafile,
+    '/etc/ssl/certs/ca-certificates.crt',
+    '/etc/pki/tls/certs/ca-bundle.crt',
+    '/etc/ssl/cert.pem'
+]
+
+
+def build_bundle(source, path):
+    """
+    Writes CERT_COUNT certificates taken round robin from source to path,
+    each after a comment line the way distribution bundles are laid out
+    """
+
+    with open(source, 'rb') as f:
+        blocks = re.findall(
+            b'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----\r?\n',
+            f.read(),
+            re.S
+        )
+    if not blocks:
+        raise ValueError('%s has no certificates' % source)
+    with open(path, 'wb') as f:
+        for i in range(CERT_COUNT):
+            f.write(b'# Certificate ' + str(i).encode('ascii') + b'\n')
+            f.write(blocks[i % len(blocks)])
+            f.write(b'\n')
+
+
+def load_unarmor(path):
+    with open(path, 'rb') as f:
+        return list(pem.unarmor(f.read(), multiple=True))
+
+
+def load_unarmor_file(path):
+    if not hasattr(pem, 'unarmor_file'):
+        return None
+    return list(pem.unarmor_file(path))
+
+
+def trust_fields(blocks):
+    """
+    Builds a Certificate from each block and decodes the fields trust
+    evaluation looks at
+    """
+
+    for object_type, headers, der in blocks:
+        cert = x509.Certificate.load(der)
+        cert.subject.native
+        key_usage = cert.key_usage_value
+        if key_usage is not None:
+            key_usage.native
+        cert['tbs_certificate']['validity']['not_before'].native
+        cert['tbs_certificate']['validity']['not_after'].native
+
+
+def main():
+    if len(sys.argv) > 1:
+        source = sys.argv[1]
+    else:
+        source = next((path for path in SYSTEM_BUNDLES if path and os.path.isfile(path)), None)
+        if source is None:
+            sys.exit('No system CA bundle found, pass the path of a PEM bundle')
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'bundle.pem')
+        build_bundle(source, path)
+
+        old = load_unarmor(path)
+        new = load_unarmor_file(path)
+        assert new is None or old == new, 'unarmor_file() output differs from unarmor()'
+        print('%d certificates from %s' % (len(old), source))
+
+        cases = [
+            ('unarmor(multiple=True)', lambda: load_unarmor(path)),
+            ('unarmor(multiple=True) + trust fields', lambda: trust_fields(load_unarmor(path))),
+        ]
+        if new is not None:
+            cases += [
+                ('unarmor_file()', lambda: load_unarmor_file(path)),
+                ('unarmor_file() + trust fields', lambda: trust_fields(load_unarmor_file(path))),
+            ]
+        for name, func in cases:
+            best = min(timeit.repeat(func, number=5, repeat=5)) / 5
+            print('%-40s %8.2f ms' % (name, best * 1000))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
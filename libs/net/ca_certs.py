@@ -1,9 +1,14 @@
 import os
-import time
+import re
 import sys
+import time
+import base64
+import hashlib
+import binascii
+import threading
+from collections import OrderedDict
 
 from .console_write import console_write
-from .open_compat import open_compat, read_compat
 from .deps.oscrypto import trust_list
 
 
@@ -15,10 +20,188 @@ except (ImportError):
     ca_bundle_dir = os.path.join(os.path.expanduser('~'), '.package_control')
 
 
+# Everything between the BEGIN and END lines of a PEM certificate block
+_PEM_RE = re.compile(
+    b'-----BEGIN (CERTIFICATE|TRUSTED CERTIFICATE)-----\r?\n'
+    b'([^-]*(?:-(?!---)[^-]*)*)'
+    b'-----END \\1-----'
+)
+
+# How long the system bundle location is trusted before it is looked up again
+RECHECK_INTERVAL = 60 * 60
+
+# Per merged bundle path, a dict with the "sources" it was built from, the
+# (path, mtime, size) "fingerprint" of the sources and the merged bundle and
+# when it was "checked"
+_memo = {}
+
+# Per source bundle path, a tuple of its (path, mtime, size) fingerprint and
+# the OrderedDict of {sha256 hex of DER: PEM block} read from it, so a rebuild
+# only scans the sources that changed
+_source_indexes = {}
+
+_memo_lock = threading.Lock()
+
+# Merged bundle paths being regenerated by a background thread
+_rebuilding = set()
+
+
+def _fingerprint(paths):
+    """
+    :param paths:
+        A list of filesystem paths
+
+    :return:
+        A tuple of (path, mtime, size) for each path, with None for the mtime
+        and size of a missing file
+    """
+
+    output = []
+    for path in paths:
+        try:
+            stats = os.stat(path)
+            output.append((path, stats.st_mtime, stats.st_size))
+        except (OSError):
+            output.append((path, None, None))
+    return tuple(output)
+
+
+def iter_pem_certs(path):
+    """
+    Reads the certificates out of a PEM bundle without parsing them
+
+    :param path:
+        The filesystem path to the bundle
+
+    :return:
+        A generator of (byte string PEM block, byte string DER) tuples
+    """
+
+    with open(path, 'rb') as f:
+        contents = f.read()
+    for match in _PEM_RE.finditer(contents):
+        try:
+            der = base64.b64decode(b''.join(match.group(2).split()))
+        except (binascii.Error, TypeError, ValueError):
+            continue
+        yield (match.group(0), der)
+
+
+def _source_index(path):
+    """
+    :param path:
+        The path to a PEM bundle
+
+    :return:
+        An OrderedDict of {sha256 hex of DER: PEM block} of the certificates
+        in the bundle, scanned again only if its mtime or size changed
+    """
+
+    fingerprint = _fingerprint([path])[0]
+    with _memo_lock:
+        cached = _source_indexes.get(path)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    index = OrderedDict()
+    if fingerprint[1] is not None:
+        for pem, der in iter_pem_certs(path):
+            index.setdefault(hashlib.sha256(der).hexdigest(), pem)
+    with _memo_lock:
+        _source_indexes[path] = (fingerprint, index)
+    return index
+
+
+def _build_index(paths):
+    """
+    :param paths:
+        A list of paths to PEM bundles
+
+    :return:
+        A tuple of (OrderedDict of {sha256 hex of DER: PEM block}, int number
+        of certificates dropped as duplicates of one in an earlier bundle)
+    """
+
+    index = OrderedDict()
+    duplicates = 0
+    for path in paths:
+        for fingerprint, pem in _source_index(path).items():
+            if fingerprint in index:
+                duplicates += 1
+                continue
+            index[fingerprint] = pem
+    return (index, duplicates)
+
+
+def _regenerate(sources, merged_ca_bundle_path, debug):
+    """
+    Writes the merged bundle from the sources and records it in the memo
+    """
+
+    index, duplicates = _build_index(sources)
+    tmp_path = merged_ca_bundle_path + '.tmp'
+    with open(tmp_path, 'wb') as merged:
+        for pem in index.values():
+            merged.write(pem + b'\n')
+    # Connections opened meanwhile keep using the previous bundle
+    if hasattr(os, 'replace'):
+        os.replace(tmp_path, merged_ca_bundle_path)
+    else:
+        if os.path.exists(merged_ca_bundle_path):
+            os.remove(merged_ca_bundle_path)
+        os.rename(tmp_path, merged_ca_bundle_path)
+
+    with _memo_lock:
+        _memo[merged_ca_bundle_path] = {
+            'sources': sources,
+            'fingerprint': _fingerprint(sources + [merged_ca_bundle_path]),
+            'checked': time.time()
+        }
+
+    if debug:
+        console_write(
+            u'''
+            Regenerated the merged CA bundle from the system and user CA
+            bundles, %d certificates, %d duplicates dropped
+            ''',
+            (len(index), duplicates)
+        )
+
+
+def _regenerate_in_background(sources, merged_ca_bundle_path, debug):
+    with _memo_lock:
+        if merged_ca_bundle_path in _rebuilding:
+            return
+        _rebuilding.add(merged_ca_bundle_path)
+
+    def run():
+        try:
+            _regenerate(sources, merged_ca_bundle_path, debug)
+        except (EnvironmentError) as e:
+            console_write(
+                u'''
+                Unable to regenerate the merged CA bundle - %s
+                ''',
+                e
+            )
+        finally:
+            with _memo_lock:
+                _rebuilding.discard(merged_ca_bundle_path)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+
 def get_ca_bundle_path(settings):
     """
     Return the path to the merged system and user ca bundles
 
+    The result is memoized and only looked at again once the mtime or size of
+    one of the bundles changes. A stale merged bundle is regenerated in the
+    background while the previous one keeps being used, only a missing or
+    empty one is built before returning.
+
     :param settings:
         A dict to look in for the `debug` key
 
@@ -28,38 +211,42 @@ def get_ca_bundle_path(settings):
 
     ensure_ca_bundle_dir()
 
+    merged_ca_bundle_path = os.path.join(ca_bundle_dir, 'Package Control.merged-ca-bundle')
+
+    with _memo_lock:
+        memo = _memo.get(merged_ca_bundle_path)
+    if memo and memo['checked'] > time.time() - RECHECK_INTERVAL:
+        if _fingerprint(memo['sources'] + [merged_ca_bundle_path]) == memo['fingerprint']:
+            return merged_ca_bundle_path
+
     system_ca_bundle_path = get_system_ca_bundle_path(settings)
     user_ca_bundle_path = get_user_ca_bundle_path(settings)
-    merged_ca_bundle_path = os.path.join(ca_bundle_dir, 'Package Control.merged-ca-bundle')
+    sources = [path for path in (system_ca_bundle_path, user_ca_bundle_path) if path]
+    debug = settings.get('debug')
 
     merged_missing = not os.path.exists(merged_ca_bundle_path)
     merged_empty = (not merged_missing) and os.stat(merged_ca_bundle_path).st_size == 0
 
-    regenerate = merged_missing or merged_empty
-    if system_ca_bundle_path and not merged_missing:
-        regenerate = regenerate or os.path.getmtime(system_ca_bundle_path) > os.path.getmtime(merged_ca_bundle_path)
-    if os.path.exists(user_ca_bundle_path) and not merged_missing:
-        regenerate = regenerate or os.path.getmtime(user_ca_bundle_path) > os.path.getmtime(merged_ca_bundle_path)
-
-    if regenerate:
-        with open(merged_ca_bundle_path, 'wb') as merged:
-            if system_ca_bundle_path:
-                with open_compat(system_ca_bundle_path, 'r') as system:
-                    system_certs = read_compat(system).strip()
-                    merged.write(system_certs.encode('utf-8'))
-                    if len(system_certs) > 0:
-                        merged.write(b'\n')
-            with open_compat(user_ca_bundle_path, 'r') as user:
-                user_certs = read_compat(user).strip()
-                merged.write(user_certs.encode('utf-8'))
-                if len(user_certs) > 0:
-                    merged.write(b'\n')
-        if settings.get('debug'):
-            console_write(
-                u'''
-                Regenerated the merged CA bundle from the system and user CA bundles
-                '''
-            )
+    if merged_missing or merged_empty:
+        _regenerate(sources, merged_ca_bundle_path, debug)
+        return merged_ca_bundle_path
+
+    if memo and memo['sources'] == sources:
+        # A rebuild in this process knows exactly what it was built from
+        stale = _fingerprint(sources) != memo['fingerprint'][:len(sources)]
+    else:
+        merged_mtime = os.path.getmtime(merged_ca_bundle_path)
+        stale = any(os.path.getmtime(path) > merged_mtime for path in sources if os.path.exists(path))
+
+    if stale:
+        _regenerate_in_background(sources, merged_ca_bundle_path, debug)
+    else:
+        with _memo_lock:
+            _memo[merged_ca_bundle_path] = {
+                'sources': sources,
+                'fingerprint': _fingerprint(sources + [merged_ca_bundle_path]),
+                'checked': time.time()
+            }
 
     return merged_ca_bundle_path
 
@@ -1,15 +1,206 @@
+import sys
 import time
+import heapq
+import threading
+from collections import OrderedDict
+
+
+class MemoryCache(object):
+
+    """
+    A thread-safe in-memory cache with per-entry TTLs, bounded by an entry
+    count and an approximate byte budget, evicting least recently used
+    entries first.
+
+    Expiry times are kept in a min-heap so expired entries are purged a few
+    at a time as new values are set, rather than by scanning everything.
+    get_or_set() takes a per-key lock, so when several threads miss the same
+    key only one of them computes the value.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._expiries = []
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _size_of(self, data):
+        if isinstance(data, (list, tuple, dict)):
+            return sys.getsizeof(data) + sum(sys.getsizeof(item) for item in data)
+        return sys.getsizeof(data)
+
+    def _remove(self, key):
+        data, expires, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _purge_expired(self, now, limit=None):
+        purged = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            if limit is not None and purged >= limit:
+                break
+            expires, key = heapq.heappop(self._expiries)
+            entry = self._entries.get(key)
+            # The heap keeps stale items for keys that were set again since
+            if entry and entry[1] == expires:
+                self._remove(key)
+                self.expirations += 1
+            purged += 1
+
+    def get(self, key, default=None):
+        """
+        :param key:
+            The string key
+
+        :param default:
+            The value to return if the key has not been set, or the ttl expired
+
+        :return:
+            The cached value, or default
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                self.misses += 1
+                return default
+            # Re-insert to mark the entry as most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, data, ttl=300):
+        """
+        :param key:
+            The string key
+
+        :param data:
+            The data to cache
+
+        :param ttl:
+            The integer number of second to cache the data for
+        """
+
+        if ttl is None:
+            ttl = 300
+        now = time.time()
+        expires = now + ttl
+        size = self._size_of(data)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (data, expires, size)
+            self._bytes += size
+            heapq.heappush(self._expiries, (expires, key))
+
+            self._purge_expired(now, limit=16)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                if oldest == key:
+                    break
+                self._remove(oldest)
+                self.evictions += 1
+
+            # Drop heap items of evicted or overwritten keys once they dominate
+            if len(self._expiries) > 2 * len(self._entries) + 16:
+                self._expiries = [(e[1], k) for k, e in self._entries.items()]
+                heapq.heapify(self._expiries)
+
+    def get_or_set(self, key, loader, ttl=300):
+        """
+        Returns the cached value of key, calling loader() to create and cache
+        it on a miss. Concurrent callers missing the same key wait for the
+        first one instead of all calling loader().
+
+        :param key:
+            The string key
+
+        :param loader:
+            A callable returning the value to cache
+
+        :param ttl:
+            The integer number of second to cache the data for
+
+        :return:
+            The cached or newly loaded value
+        """
+
+        marker = object()
+        value = self.get(key, marker)
+        if value is not marker:
+            return value
+
+        with self._lock:
+            key_lock, waiters = self._key_locks.get(key, (None, 0))
+            if key_lock is None:
+                key_lock = threading.Lock()
+            self._key_locks[key] = (key_lock, waiters + 1)
+
+        try:
+            with key_lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[1] > time.time():
+                        return entry[0]
+                value = loader()
+                self.set(key, value, ttl)
+                return value
+        finally:
+            with self._lock:
+                key_lock, waiters = self._key_locks[key]
+                if waiters == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (key_lock, waiters - 1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiries = []
+            self._bytes = 0
+
+    def stats(self):
+        """
+        :return:
+            A dict of the number of entries, bytes used, hits, misses,
+            evictions and expirations
+        """
+
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
 
 
 # A cache of channel and repository info to allow users to install multiple
 # packages without having to wait for the metadata to be downloaded more
 # than once. The keys are managed locally by the utilizing code.
-_channel_repository_cache = {}
+_channel_repository_cache = MemoryCache()
 
 
 def clear_cache():
-    global _channel_repository_cache
-    _channel_repository_cache = {}
+    _channel_repository_cache.clear()
+
+
+def cache_stats():
+    """
+    :return:
+        A dict of counters of the in-memory cache, for diagnostics
+    """
+
+    return _channel_repository_cache.stats()
 
 
 def get_cache(key, default=None):
@@ -26,11 +217,27 @@ def get_cache(key, default=None):
         The cached value, or default
     """
 
-    struct = _channel_repository_cache.get(key, {})
-    expires = struct.get('expires')
-    if expires and expires > time.time():
-        return struct.get('data')
-    return default
+    return _channel_repository_cache.get(key, default)
+
+
+def get_or_set_cache(key, loader, ttl=300):
+    """
+    Gets an in-memory cache value, calling loader() once to set it on a miss
+
+    :param key:
+        The string key
+
+    :param loader:
+        A callable returning the value to cache
+
+    :param ttl:
+        The integer number of second to cache the data for
+
+    :return:
+        The cached value
+    """
+
+    return _channel_repository_cache.get_or_set(key, loader, ttl)
 
 
 def merge_cache_over_settings(destination, setting, key_prefix):
@@ -82,11 +289,8 @@ def merge_cache_under_settings(destination, setting, key_prefix, list_=False):
         if existing:
             if list_:
                 # Prevent duplicate values
-                base = dict(zip(value, [None]*len(value)))
-                for val in existing:
-                    if val in base:
-                        continue
-                    value.append(val)
+                base = set(value)
+                value.extend(val for val in existing if val not in base)
             else:
                 value.update(existing)
         destination.settings[setting] = value
@@ -106,10 +310,7 @@ def set_cache(key, data, ttl=300):
         The integer number of second to cache the data for
     """
 
-    _channel_repository_cache[key] = {
-        'data': data,
-        'expires': time.time() + ttl
-    }
+    _channel_repository_cache.set(key, data, ttl)
 
 
 def set_cache_over_settings(destination, setting, key_prefix, value, ttl):
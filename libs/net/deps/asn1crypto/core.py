@@ -59,7 +59,7 @@ from . import _teletex_codec
 from ._errors import unwrap
 from ._ordereddict import OrderedDict
 from ._types import type_name, str_cls, byte_cls, int_types, chr_cls
-from .parser import _parse, _dump_header
+from .parser import _parse, _parse_offsets, _dump_header
 from .util import int_to_bytes, int_from_bytes, timezone, extended_datetime
 
 if sys.version_info <= (3,):
@@ -3139,12 +3139,13 @@ class Sequence(Asn1Value):
 
     def _lazy_child(self, index):
         """
-        Builds a child object if the child has only been parsed into a tuple so far
+        Builds a child object if the child is still a _ChildRef, located in the
+        contents but not built yet
         """
 
         child = self.children[index]
-        if child.__class__ == tuple:
-            child = self.children[index] = _build(*child)
+        if child.__class__ is _ChildRef:
+            child = self.children[index] = child.build()
         return child
 
     def __len__(self):
@@ -3177,7 +3178,8 @@ class Sequence(Asn1Value):
             self._parse_children()
 
         if not isinstance(key, int_types):
-            if key not in self._field_map:
+            index = self._field_map.get(key)
+            if index is None:
                 raise KeyError(unwrap(
                     '''
                     No field named "%s" defined for %s
@@ -3185,7 +3187,7 @@ class Sequence(Asn1Value):
                     key,
                     type_name(self)
                 ))
-            key = self._field_map[key]
+            key = index
 
         if key >= len(self.children):
             raise KeyError(unwrap(
@@ -3196,6 +3198,11 @@ class Sequence(Asn1Value):
                 type_name(self)
             ))
 
+        # Fields that were accessed before are returned as they are
+        child = self.children[key]
+        if child.__class__ is not _ChildRef:
+            return child
+
         try:
             return self._lazy_child(key)
 
@@ -3333,11 +3340,11 @@ class Sequence(Asn1Value):
             child = self.children[index]
             if child is None:
                 child_dump = b''
-            elif child.__class__ == tuple:
+            elif child.__class__ is _ChildRef:
                 if force:
                     child_dump = self._lazy_child(index).dump(force=force)
                 else:
-                    child_dump = child[3] + child[4] + child[5]
+                    child_dump = child.dump()
             else:
                 child_dump = child.dump(force=force)
             # Skip values that are the same as the default
@@ -3527,7 +3534,8 @@ class Sequence(Asn1Value):
 
         try:
             self.children = []
-            contents_length = len(self._contents)
+            contents = self._contents
+            contents_length = len(contents)
             child_pointer = 0
             field = 0
             field_len = len(self._fields)
@@ -3535,7 +3543,9 @@ class Sequence(Asn1Value):
             again = child_pointer < contents_length
             while again:
                 if parts is None:
-                    parts, child_pointer = _parse(self._contents, contents_length, pointer=child_pointer)
+                    parts_start = child_pointer
+                    parts = _parse_offsets(contents, contents_length, child_pointer)
+                    child_pointer = parts[5]
                 again = child_pointer < contents_length
 
                 if field < field_len:
@@ -3552,7 +3562,7 @@ class Sequence(Asn1Value):
                             if issubclass(field_spec, Choice):
                                 try:
                                     tester = field_spec(**field_params)
-                                    tester.validate(parts[0], parts[2], parts[4])
+                                    tester.validate(parts[0], parts[2], contents[parts[3]:parts[4]])
                                     choice_match = True
                                 except (ValueError):
                                     pass
@@ -3571,9 +3581,9 @@ class Sequence(Asn1Value):
                         spec_override = None
 
                     if spec_override:
-                        child = parts + (field_spec, field_params, value_spec)
+                        child = _ChildRef(contents, parts_start, parts, field_spec, field_params, value_spec)
                     else:
-                        child = parts + (field_spec, field_params)
+                        child = _ChildRef(contents, parts_start, parts, field_spec, field_params)
 
                 # Handle situations where an optional or defaulted field definition is incorrect
                 elif field_len > 0 and field + 1 <= field_len:
@@ -3602,10 +3612,10 @@ class Sequence(Asn1Value):
                     ))
 
                 else:
-                    child = parts
+                    child = _ChildRef(contents, parts_start, parts)
 
                 if recurse:
-                    child = _build(*child)
+                    child = child.build()
                     if isinstance(child, (Sequence, SequenceOf)):
                         child._parse_children(recurse=True)
 
@@ -3692,8 +3702,8 @@ class Sequence(Asn1Value):
             try:
                 self._native = OrderedDict()
                 for index, child in enumerate(self.children):
-                    if child.__class__ == tuple:
-                        child = _build(*child)
+                    if child.__class__ is _ChildRef:
+                        child = child.build()
                         self.children[index] = child
                     try:
                         name = self._fields[index][0]
@@ -3722,7 +3732,7 @@ class Sequence(Asn1Value):
         if self.children is not None:
             self.children = []
             for child in other.children:
-                if child.__class__ == tuple:
+                if child.__class__ is _ChildRef:
                     self.children.append(child)
                 else:
                     self.children.append(child.copy())
@@ -3869,12 +3879,13 @@ class SequenceOf(Asn1Value):
 
     def _lazy_child(self, index):
         """
-        Builds a child object if the child has only been parsed into a tuple so far
+        Builds a child object if the child is still a _ChildRef, located in the
+        contents but not built yet
         """
 
         child = self.children[index]
-        if child.__class__ == tuple:
-            child = _build(*child)
+        if child.__class__ is _ChildRef:
+            child = child.build()
             self.children[index] = child
         return child
 
@@ -4109,16 +4120,15 @@ class SequenceOf(Asn1Value):
             self.children = []
             if self._contents is None:
                 return
-            contents_length = len(self._contents)
+            contents = self._contents
+            contents_length = len(contents)
             child_pointer = 0
             while child_pointer < contents_length:
-                parts, child_pointer = _parse(self._contents, contents_length, pointer=child_pointer)
-                if self._child_spec:
-                    child = parts + (self._child_spec,)
-                else:
-                    child = parts
+                parts = _parse_offsets(contents, contents_length, child_pointer)
+                child = _ChildRef(contents, child_pointer, parts, self._child_spec)
+                child_pointer = parts[5]
                 if recurse:
-                    child = _build(*child)
+                    child = child.build()
                     if isinstance(child, (Sequence, SequenceOf)):
                         child._parse_children(recurse=True)
                 self.children.append(child)
@@ -4178,7 +4188,7 @@ class SequenceOf(Asn1Value):
         if self.children is not None:
             self.children = []
             for child in other.children:
-                if child.__class__ == tuple:
+                if child.__class__ is _ChildRef:
                     self.children.append(child)
                 else:
                     self.children.append(child.copy())
@@ -4283,11 +4293,14 @@ class Set(Sequence):
 
         try:
             child_map = {}
-            contents_length = len(self.contents)
+            contents = self.contents
+            contents_length = len(contents)
             child_pointer = 0
             seen_field = 0
             while child_pointer < contents_length:
-                parts, child_pointer = _parse(self.contents, contents_length, pointer=child_pointer)
+                parts_start = child_pointer
+                parts = _parse_offsets(contents, contents_length, child_pointer)
+                child_pointer = parts[5]
 
                 id_ = (parts[0], parts[2])
 
@@ -4312,12 +4325,12 @@ class Set(Sequence):
                     spec_override = None
 
                 if spec_override:
-                    child = parts + (field_spec, field_params, value_spec)
+                    child = _ChildRef(contents, parts_start, parts, field_spec, field_params, value_spec)
                 else:
-                    child = parts + (field_spec, field_params)
+                    child = _ChildRef(contents, parts_start, parts, field_spec, field_params)
 
                 if recurse:
-                    child = _build(*child)
+                    child = child.build()
                     if isinstance(child, (Sequence, SequenceOf)):
                         child._parse_children(recurse=True)
 
@@ -4862,6 +4875,84 @@ _UNIVERSAL_SPECS = {
 }
 
 
+class _ChildRef(object):
+    """
+    A child of a Sequence, SequenceOf or Set that has been located in the
+    contents of its parent but not built yet. Only offsets into the parent's
+    byte string are kept, the header and contents are sliced out when the
+    child is first accessed, so fields that are never used cost no copies.
+    """
+
+    __slots__ = (
+        'data',
+        'start',
+        'class_',
+        'method',
+        'tag',
+        'header_end',
+        'contents_end',
+        'end',
+        'spec',
+        'spec_params',
+        'nested_spec'
+    )
+
+    def __init__(self, data, start, offsets, spec=None, spec_params=None, nested_spec=None):
+        """
+        :param data:
+            The byte string the child was parsed from
+
+        :param start:
+            The integer offset of the child's header in data
+
+        :param offsets:
+            The tuple returned by asn1crypto.parser._parse_offsets()
+
+        :param spec:
+            The spec to build the child with, see _build()
+
+        :param spec_params:
+            A dict of params for the spec
+
+        :param nested_spec:
+            The spec for values parsed out of the child's contents
+        """
+
+        self.data = data
+        self.start = start
+        self.class_, self.method, self.tag, self.header_end, self.contents_end, self.end = offsets
+        self.spec = spec
+        self.spec_params = spec_params
+        self.nested_spec = nested_spec
+
+    def build(self):
+        """
+        :return:
+            The Asn1Value object for the child
+        """
+
+        data = self.data
+        return _build(
+            self.class_,
+            self.method,
+            self.tag,
+            data[self.start:self.header_end],
+            data[self.header_end:self.contents_end],
+            data[self.contents_end:self.end],
+            self.spec,
+            self.spec_params,
+            self.nested_spec
+        )
+
+    def dump(self):
+        """
+        :return:
+            A byte string of the child's encoding, as it was parsed
+        """
+
+        return self.data[self.start:self.end]
+
+
 def _build(class_, method, tag, header, contents, trailer, spec=None, spec_params=None, nested_spec=None):
     """
     Builds an Asn1Value object generically, or using a spec with optional params
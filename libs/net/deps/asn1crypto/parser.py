@@ -160,10 +160,49 @@ def _parse(encoded_data, data_len, pointer=0, lengths_only=False):
          - 1: An integer indicating how many bytes were consumed
     """
 
+    if lengths_only:
+        return _parse_offsets(encoded_data, data_len, pointer, lengths_only=True)
+
+    class_, method, tag, header_end, contents_end, end = _parse_offsets(encoded_data, data_len, pointer)
+    return (
+        (
+            class_,
+            method,
+            tag,
+            encoded_data[pointer:header_end],
+            encoded_data[header_end:contents_end],
+            encoded_data[contents_end:end]
+        ),
+        end
+    )
+
+
+def _parse_offsets(encoded_data, data_len, pointer=0, lengths_only=False):
+    """
+    Locates the component parts of a BER-encoded value without copying them
+
+    :param encoded_data:
+        A byte string that contains BER-encoded data
+
+    :param data_len:
+        The integer length of the encoded data
+
+    :param pointer:
+        The index in the byte string to parse from
+
+    :param lengths_only:
+        See _parse(). Internal use only.
+
+    :return:
+        A 6-element tuple of (class_, method, tag, header end, contents end,
+        end). The header is encoded_data[pointer:header end], the contents
+        run to contents end and the trailer, only used by indefinite length
+        encodings, to end.
+    """
+
     if data_len < pointer + 2:
         raise ValueError(_INSUFFICIENT_DATA_MESSAGE % (2, data_len - pointer))
 
-    start = pointer
     first_octet = ord(encoded_data[pointer]) if _PY2 else encoded_data[pointer]
     pointer += 1
 
@@ -208,38 +247,18 @@ def _parse(encoded_data, data_len, pointer=0, lengths_only=False):
             if tag == 3:
                 contents_end += 1
             while contents_end < data_len:
-                sub_header_end, contents_end = _parse(encoded_data, data_len, contents_end, lengths_only=True)
+                sub_header_end, contents_end = _parse_offsets(encoded_data, data_len, contents_end, lengths_only=True)
                 if contents_end == sub_header_end and encoded_data[contents_end - 2:contents_end] == b'\x00\x00':
                     break
             if lengths_only:
                 return (pointer, contents_end)
             if contents_end > data_len:
                 raise ValueError(_INSUFFICIENT_DATA_MESSAGE % (contents_end, data_len))
-            return (
-                (
-                    first_octet >> 6,
-                    (first_octet >> 5) & 1,
-                    tag,
-                    encoded_data[start:pointer],
-                    encoded_data[pointer:contents_end - 2],
-                    b'\x00\x00'
-                ),
-                contents_end
-            )
+            return (first_octet >> 6, (first_octet >> 5) & 1, tag, pointer, contents_end - 2, contents_end)
 
     if contents_end > data_len:
         raise ValueError(_INSUFFICIENT_DATA_MESSAGE % (contents_end, data_len))
-    return (
-        (
-            first_octet >> 6,
-            (first_octet >> 5) & 1,
-            tag,
-            encoded_data[start:pointer],
-            encoded_data[pointer:contents_end],
-            b''
-        ),
-        contents_end
-    )
+    return (first_octet >> 6, (first_octet >> 5) & 1, tag, pointer, contents_end, contents_end)
 
 
 def _dump_header(class_, method, tag, contents):
@@ -6,12 +6,15 @@ Encoding DER to PEM and decoding PEM to DER. Exports the following items:
  - armor()
  - detect()
  - unarmor()
+ - unarmor_file()
 
 """
 
 from __future__ import unicode_literals, division, absolute_import, print_function
 
 import base64
+import binascii
+import mmap
 import re
 import sys
 
@@ -220,3 +223,75 @@ def unarmor(pem_bytes, multiple=False):
         return next(generator)
 
     return generator
+
+
+# A whole PEM block, the type name and everything between the BEGIN and END
+# lines, headers included. The body is matched as runs of anything but
+# "----", which is much faster than a lazy .*? over hundreds of blocks.
+_BLOCK_RE = re.compile(
+    b'(?:---- |-----)BEGIN ([A-Z0-9 ]+)(?: ----|-----)[ \t]*\r?\n'
+    b'([^-]*(?:-(?!---)[^-]*)*)'
+    b'(?:---- |-----)END \\1'
+)
+
+
+def unarmor_file(path, types=None):
+    """
+    Convert all of the PEM-encoded blocks of a file, such as a CA bundle, into
+    DER-encoded byte strings. The file is memory-mapped and scanned once with
+    a regular expression, instead of line by line.
+
+    :param path:
+        A unicode string of the path to the file
+
+    :param types:
+        None to return every block, or a set of unicode strings of the
+        object types to return, e.g. set(["CERTIFICATE"])
+
+    :raises:
+        ValueError - when the file does not appear to contain PEM-encoded data
+
+    :return:
+        A generator of 3-element tuples in the format: (object_type, headers,
+        der_bytes), the same as unarmor(pem_bytes, multiple=True)
+    """
+
+    with open(path, 'rb') as f:
+        try:
+            contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError):
+            # An empty file can not be mapped
+            contents = b''
+
+        try:
+            found = False
+            for match in _BLOCK_RE.finditer(contents):
+                found = True
+                object_type = match.group(1).decode('ascii')
+                if types is not None and object_type not in types:
+                    continue
+
+                body = match.group(2)
+                headers = {}
+                first_line = body[0:body.find(b'\n') + 1]
+                if first_line.find(b':') != -1:
+                    header_bytes, body = re.split(b'\r?\n[ \t]*\r?\n', body, 1)
+                    for line in header_bytes.splitlines():
+                        name, value = line.decode('ascii').split(':', 1)
+                        headers[name] = value.strip()
+
+                # a2b_base64() skips the line breaks itself
+                yield (object_type, headers, binascii.a2b_base64(body))
+
+            if not found:
+                raise ValueError(unwrap(
+                    '''
+                    %s does not appear to contain PEM-encoded data - no
+                    BEGIN/END combination found
+                    ''',
+                    path
+                ))
+
+        finally:
+            if isinstance(contents, mmap.mmap):
+                contents.close()
@@ -56,8 +56,10 @@ from .core import (
     UTF8String,
     VisibleString,
     VOID,
+    load,
 )
 from .keys import PublicKeyInfo
+from .parser import _parse_offsets
 from .util import int_to_bytes, int_from_bytes, inet_ntop, inet_pton
 
 
@@ -1807,6 +1809,30 @@ class Extensions(SequenceOf):
     _child_spec = Extension
 
 
+# The native name of each extension OID seen so far, by the OID contents
+_extension_names = {}
+
+
+def _extension_name(encoded, oid_contents):
+    """
+    :param encoded:
+        A byte string of the DER-encoded extension OID
+
+    :param oid_contents:
+        A byte string of the contents of the OID, used as the memo key
+
+    :return:
+        A unicode string of the extension name, or the dotted OID if it has
+        no name
+    """
+
+    name = _extension_names.get(oid_contents)
+    if name is None:
+        name = ExtensionId.load(encoded).native
+        _extension_names[oid_contents] = name
+    return name
+
+
 class Version(Integer):
     _map = {
         0: 'v1',
@@ -1873,16 +1899,36 @@ class Certificate(Sequence):
         """
         Sets common named extensions to private attributes and creates a list
         of critical extensions
+
+        The extensions are walked as raw bytes instead of being built as
+        Extension objects, and each named value is only loaded, so nothing
+        but its header is parsed until it is used. A trust root that is only
+        asked for its key usage never decodes its other extensions.
         """
 
         self._critical_extensions = set()
 
-        for extension in self['tbs_certificate']['extensions']:
-            name = extension['extn_id'].native
+        contents = self['tbs_certificate']['extensions'].contents or b''
+        data_len = len(contents)
+        pointer = 0
+        while pointer < data_len:
+            _, _, _, start, extension_end, pointer = _parse_offsets(contents, data_len, pointer)
+
+            _, _, _, id_start, id_end, field_start = _parse_offsets(contents, extension_end, start)
+            name = _extension_name(contents[start:id_end], contents[id_start:id_end])
+
+            critical = False
+            class_, _, tag, value_start, value_end, _ = _parse_offsets(contents, extension_end, field_start)
+            if class_ == 0 and tag == 1:
+                critical = contents[value_start:value_end] != b'\x00'
+                _, _, _, value_start, value_end, _ = _parse_offsets(contents, extension_end, value_end)
+
             attribute_name = '_%s_value' % name
             if hasattr(self, attribute_name):
-                setattr(self, attribute_name, extension['extn_value'].parsed)
-            if extension['critical'].native:
+                spec = Extension._oid_specs.get(name)
+                value = contents[value_start:value_end]
+                setattr(self, attribute_name, spec.load(value) if spec else load(value))
+            if critical:
                 self._critical_extensions.add(name)
 
         self._processed_extensions = True
@@ -3,7 +3,7 @@ from __future__ import unicode_literals, division, absolute_import, print_functi
 
 import os
 
-from ...asn1crypto.pem import unarmor
+from ...asn1crypto.pem import unarmor_file
 from ...asn1crypto.x509 import TrustedCertificate, Certificate
 
 from .._errors import pretty_message
@@ -82,37 +82,36 @@ def extract_from_system(cert_callback=None):
     ca_path = system_path()
 
     output = []
-    with open(ca_path, 'rb') as f:
-        for armor_type, _, cert_bytes in unarmor(f.read(), multiple=True):
-            # Without more info, a certificate is trusted for all purposes
-            if armor_type == 'CERTIFICATE':
+    for armor_type, _, cert_bytes in unarmor_file(ca_path, set(['CERTIFICATE', 'TRUSTED CERTIFICATE'])):
+        # Without more info, a certificate is trusted for all purposes
+        if armor_type == 'CERTIFICATE':
+            if cert_callback:
+                cert_callback(Certificate.load(cert_bytes), None)
+            output.append((cert_bytes, set(), set()))
+
+        # The OpenSSL TRUSTED CERTIFICATE construct adds OIDs for trusted
+        # and rejected purposes, so we extract that info.
+        elif armor_type == 'TRUSTED CERTIFICATE':
+            cert, aux = TrustedCertificate.load(cert_bytes)
+            reject_all = False
+            trust_oids = set()
+            reject_oids = set()
+            for purpose in aux['trust']:
+                if purpose.dotted == all_purposes:
+                    trust_oids = set([purpose.dotted])
+                    break
+                trust_oids.add(purpose.dotted)
+            for purpose in aux['reject']:
+                if purpose.dotted == all_purposes:
+                    reject_all = True
+                    break
+                reject_oids.add(purpose.dotted)
+            if reject_all:
                 if cert_callback:
-                    cert_callback(Certificate.load(cert_bytes), None)
-                output.append((cert_bytes, set(), set()))
-
-            # The OpenSSL TRUSTED CERTIFICATE construct adds OIDs for trusted
-            # and rejected purposes, so we extract that info.
-            elif armor_type == 'TRUSTED CERTIFICATE':
-                cert, aux = TrustedCertificate.load(cert_bytes)
-                reject_all = False
-                trust_oids = set()
-                reject_oids = set()
-                for purpose in aux['trust']:
-                    if purpose.dotted == all_purposes:
-                        trust_oids = set([purpose.dotted])
-                        break
-                    trust_oids.add(purpose.dotted)
-                for purpose in aux['reject']:
-                    if purpose.dotted == all_purposes:
-                        reject_all = True
-                        break
-                    reject_oids.add(purpose.dotted)
-                if reject_all:
-                    if cert_callback:
-                        cert_callback(cert, 'explicitly distrusted')
-                    continue
-                if cert_callback:
-                    cert_callback(cert, None)
-                output.append((cert.dump(), trust_oids, reject_oids))
+                    cert_callback(cert, 'explicitly distrusted')
+                continue
+            if cert_callback:
+                cert_callback(cert, None)
+            output.append((cert.dump(), trust_oids, reject_oids))
 
     return output
@@ -1,6 +1,7 @@
 import re
+import time
 import socket
-from threading import Lock, Timer
+from threading import Condition, Lock, Thread, Timer
 from contextlib import contextmanager
 import sys
 
@@ -17,31 +18,66 @@ from . import __version__
 
 from .show_error import show_error
 from .console_write import console_write
-from .cache import set_cache, get_cache
+from .cache import get_cache, get_or_set_cache
 from .unicode import unicode_from_os
 from . import text
+from . import timing
 
 from .downloaders import DOWNLOADERS
 from .downloaders.urllib_downloader import UrlLibDownloader
 from .downloaders.binary_not_found_error import BinaryNotFoundError
 from .downloaders.rate_limit_exception import RateLimitException
 from .downloaders.downloader_exception import DownloaderException
+from .downloaders.file_write_exception import FileWriteException
 from .downloaders.win_downloader_exception import WinDownloaderException
+from .downloaders.resumable_downloader import ResumableDownloader
 from .http_cache import HttpCache
+from .http.validating_https_connection import tls_stats
 
 
-# A dict of domains - each points to a list of downloaders
+# A dict of domains - each points to a list of (manager, released at) tuples
+# of idle managers, the most recently released last
 _managers = {}
 
-# How many managers are currently checked out
-_in_use = 0
+# A dict of domains - each points to the number of managers checked out
+_in_use = {}
 
-# Make sure connection management doesn't run into threading issues
-_lock = Lock()
+# Guards the pool, and is waited on for a manager to be released
+_lock = Condition(Lock())
 
-# A timer used to disconnect all managers after a period of no usage
+# A timer used to disconnect managers that have been idle for too long
 _timer = None
 
+# Counters reported by pool_stats()
+_stats = {
+    'hits': 0,
+    'new': 0,
+    'reused_connections': 0,
+    'tls_handshakes_saved': 0,
+    'unhealthy': 0,
+    'idle_closed': 0,
+    'waits': 0,
+    'wait_timeouts': 0
+}
+
+# Most managers, and so connections, open to a single host at once
+MAX_PER_HOST = 4
+
+# Seconds a released connection is kept open for re-use
+IDLE_TIMEOUT = 30.0
+
+# Seconds to wait for a connection to a host that is at its limit
+WAIT_TIMEOUT = 60.0
+
+# Segmented downloads don't split content into ranges smaller than this
+MIN_SEGMENT_SIZE = 256 * 1024
+
+# Nor larger than this, so an interrupted download has little to fetch again
+MAX_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# Times a failed range is queued again before a segmented download gives up
+SEGMENT_RETRIES = 2
+
 
 @contextmanager
 def downloader(url, settings):
@@ -55,77 +91,150 @@ def downloader(url, settings):
             _release(url, manager)
 
 
-def _grab(url, settings):
-    global _managers, _lock, _in_use, _timer
+def _hostname(url):
+    parsed = urlparse(url)
+    if not parsed or not parsed.hostname:
+        raise DownloaderException(u'The URL "%s" is malformed' % url)
+    return parsed.hostname.lower()
 
-    _lock.acquire()
-    try:
-        if _timer:
-            _timer.cancel()
-            _timer = None
 
-        parsed = urlparse(url)
-        if not parsed or not parsed.hostname:
-            raise DownloaderException(u'The URL "%s" is malformed' % url)
-        hostname = parsed.hostname.lower()
-        if hostname not in _managers:
-            _managers[hostname] = []
+def _grab(url, settings):
+    """
+    Checks out a DownloadManager for the host of url, re-using an idle one
+    whose connection is still alive, opening a new one while the host is
+    below its limit, or else waiting for one to be released
+    """
 
-        if not _managers[hostname]:
-            _managers[hostname].append(DownloadManager(settings))
+    global _timer
 
-        _in_use += 1
+    hostname = _hostname(url)
+    max_per_host = settings.get('max_connections_per_host', MAX_PER_HOST)
+    deadline = time.time() + settings.get('pool_wait_timeout', WAIT_TIMEOUT)
 
-        return _managers[hostname].pop()
+    with _lock:
+        if _timer:
+            _timer.cancel()
+            _timer = None
 
-    finally:
-        _lock.release()
+        idle = _managers.setdefault(hostname, [])
+        while True:
+            while idle:
+                manager, released = idle.pop()
+                if not manager.is_healthy():
+                    _stats['unhealthy'] += 1
+                    manager.close()
+                    continue
+                _stats['hits'] += 1
+                if manager.has_connection():
+                    _stats['reused_connections'] += 1
+                    if url.lower().startswith('https:'):
+                        _stats['tls_handshakes_saved'] += 1
+                _in_use[hostname] = _in_use.get(hostname, 0) + 1
+                return manager
+
+            if _in_use.get(hostname, 0) < max_per_host:
+                _stats['new'] += 1
+                _in_use[hostname] = _in_use.get(hostname, 0) + 1
+                return DownloadManager(settings)
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                _stats['wait_timeouts'] += 1
+                raise DownloaderException(
+                    u'Timed out waiting for a free connection to %s' % hostname
+                )
+            _stats['waits'] += 1
+            _lock.wait(remaining)
+            # The pool may have been reset while waiting
+            idle = _managers.setdefault(hostname, [])
 
 
 def _release(url, manager):
-    global _managers, _lock, _in_use, _timer
+    hostname = urlparse(url).hostname.lower()
 
-    _lock.acquire()
-    try:
-        hostname = urlparse(url).hostname.lower()
+    with _lock:
+        if _in_use.get(hostname):
+            _in_use[hostname] -= 1
 
         # This means the package was reloaded between _grab and _release,
         # so the downloader is using old code and we want to discard it
         if hostname not in _managers:
+            manager.close()
             return
 
-        _managers[hostname].insert(0, manager)
+        _managers[hostname].append((manager, time.time()))
+        _lock.notify_all()
+        _schedule_idle_check()
 
-        _in_use -= 1
 
-        if _timer:
-            _timer.cancel()
-            _timer = None
+def _schedule_idle_check():
+    """
+    Starts a timer for when the longest idle manager reaches IDLE_TIMEOUT,
+    must be called with _lock held
+    """
 
-        if _in_use == 0:
-            _timer = Timer(5.0, close_all_connections)
-            _timer.start()
+    global _timer
 
-    finally:
-        _lock.release()
+    released = [r for idle in _managers.values() for m, r in idle]
+    if _timer or not released:
+        return
+    delay = max(0.0, min(released) + IDLE_TIMEOUT - time.time())
+    _timer = Timer(delay, close_idle_connections)
+    _timer.daemon = True
+    _timer.start()
+
+
+def close_idle_connections():
+    """
+    Closes the managers that have been idle for longer than IDLE_TIMEOUT,
+    leaving the rest of the pool alone
+    """
+
+    global _timer
+
+    with _lock:
+        _timer = None
+        cutoff = time.time() - IDLE_TIMEOUT
+        for hostname, idle in _managers.items():
+            keep = []
+            for manager, released in idle:
+                if released <= cutoff:
+                    _stats['idle_closed'] += 1
+                    manager.close()
+                else:
+                    keep.append((manager, released))
+            idle[:] = keep
+        _schedule_idle_check()
 
 
 def close_all_connections():
-    global _managers, _lock, _in_use, _timer
+    global _managers, _timer
 
-    _lock.acquire()
-    try:
+    with _lock:
         if _timer:
             _timer.cancel()
             _timer = None
 
         for domain, managers in _managers.items():
-            for manager in managers:
+            for manager, released in managers:
                 manager.close()
         _managers = {}
+        _lock.notify_all()
 
-    finally:
-        _lock.release()
+
+def pool_stats():
+    """
+    :return:
+        A dict with the pool counters, the number of idle and checked out
+        managers per host, and the TLS context and handshake counters
+    """
+
+    with _lock:
+        stats = dict(_stats)
+        stats['idle'] = dict((host, len(idle)) for host, idle in _managers.items() if idle)
+        stats['in_use'] = dict((host, n) for host, n in _in_use.items() if n)
+    stats['tls'] = tls_stats()
+    return stats
 
 
 def update_url(url, debug):
@@ -167,6 +276,73 @@ def update_url(url, debug):
     return url
 
 
+def _merge_ranges(ranges):
+    """
+    :param ranges:
+        A list of [start, end) int pairs
+
+    :return:
+        The sorted list of ranges with overlapping and adjacent ones joined
+    """
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _missing_ranges(done, size):
+    """
+    :param done:
+        A list of [start, end) int pairs already downloaded
+
+    :param size:
+        The int total length of the content
+
+    :return:
+        The list of [start, end) int pairs that are not in done
+    """
+
+    missing = []
+    position = 0
+    for start, end in _merge_ranges(done):
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < size:
+        missing.append((position, size))
+    return missing
+
+
+def _split_ranges(ranges, connections):
+    """
+    Splits ranges into segments of about equal length, enough to keep the
+    connections busy but between MIN_SEGMENT_SIZE and MAX_SEGMENT_SIZE
+
+    :param ranges:
+        A list of [start, end) int pairs
+
+    :param connections:
+        The maximum int number of connections to download over
+
+    :return:
+        A list of [start, end) int pairs
+    """
+
+    total = sum(end - start for start, end in ranges)
+    segment_size = -(-total // max(connections, 1))
+    segment_size = max(MIN_SEGMENT_SIZE, min(MAX_SEGMENT_SIZE, segment_size))
+    segments = []
+    for start, end in ranges:
+        count = max(1, -(-(end - start) // segment_size))
+        bounds = [start + (end - start) * i // count for i in range(count + 1)]
+        segments.extend(zip(bounds[:-1], bounds[1:]))
+    return segments
+
+
 class DownloadManager(object):
 
     def __init__(self, settings):
@@ -180,14 +356,36 @@ class DownloadManager(object):
         self.settings = settings
         if settings.get('http_cache'):
             cache_length = settings.get('http_cache_length', 604800)
-            self.settings['cache'] = HttpCache(cache_length)
+            cache_size = settings.get('http_cache_size', 32 * 1024 * 1024)
+            self.settings['cache'] = HttpCache(cache_length, settings.get('http_cache_path'), cache_size)
 
     def close(self):
         if self.downloader:
             self.downloader.close()
             self.downloader = None
 
-    def fetch(self, url, error_message, prefer_cached=False):
+    def has_connection(self):
+        """
+        :return:
+            If the downloader holds a kept-alive connection
+        """
+
+        handler = self.downloader.get_handler() if hasattr(self.downloader, 'get_handler') else None
+        return bool(handler and handler.connection)
+
+    def is_healthy(self):
+        """
+        :return:
+            False if the kept-alive connection was closed by the server, so
+            the manager should not be handed out again
+        """
+
+        handler = self.downloader.get_handler() if hasattr(self.downloader, 'get_handler') else None
+        if not handler or not hasattr(handler, 'is_alive'):
+            return True
+        return handler.is_alive()
+
+    def fetch(self, url, error_message, prefer_cached=False, max_age=None):
         """
         Downloads a URL and returns the contents
 
@@ -200,6 +398,10 @@ class DownloadManager(object):
         :param prefer_cached:
             If cached version of the URL content is preferred over a new request
 
+        :param max_age:
+            The number of seconds a cached copy is used without revalidating
+            it with the server, or None to always make a (conditional) request
+
         :raises:
             DownloaderException: if there was an error downloading the URL
 
@@ -207,6 +409,275 @@ class DownloadManager(object):
             The string contents of the URL
         """
 
+        url, hostname, timeout = self._prepare(url)
+
+        with timing.track(url) as request:
+            request.downloader = self.downloader.__class__.__name__
+
+            if max_age and self.settings.get('cache') and hasattr(self.downloader, 'retrieve_fresh'):
+                cached = self.downloader.retrieve_fresh(url, max_age)
+                if cached:
+                    request.cache = 'fresh'
+                    return cached
+
+            try:
+                return self.downloader.download(url, error_message, timeout, 3, prefer_cached)
+
+            except (RateLimitException) as e:
+                self._skip_rate_limited(hostname, e)
+                raise
+
+            except (WinDownloaderException) as e:
+                self._fallback_from_wininet(e)
+
+        # Try again with the new downloader, recorded as a request of its own
+        return self.fetch(url, error_message, prefer_cached, max_age)
+
+    def fetch_many(self, urls, error_message):
+        """
+        Downloads several URLs concurrently and returns their contents.
+        Downloaders that support it, such as the asyncio one, fetch them all
+        on one event loop. Others fetch them on threads, each over its own
+        pooled DownloadManager, which is how it works on Python 3.3.
+
+        :param urls:
+            A list of string URLs to download
+
+        :param error_message:
+            The error message to include if a download fails
+
+        :raises:
+            DownloaderException: the first error, once every URL was tried
+
+        :return:
+            A list of the string contents of the URLs, in the same order
+        """
+
+        if not urls:
+            return []
+
+        # Picks the downloader, which may turn out to support it
+        self._prepare(urls[0])
+
+        if hasattr(self.downloader, 'download_many'):
+            prepared = [self._prepare(url) for url in urls]
+            results = self.downloader.download_many(
+                [(url, timeout) for url, hostname, timeout in prepared], error_message, 3
+            )
+            for (url, hostname, timeout), result in zip(prepared, results):
+                if isinstance(result, RateLimitException):
+                    self._skip_rate_limited(hostname, result)
+
+        else:
+            results = [None] * len(urls)
+            pending = list(enumerate(urls))
+            lock = Lock()
+
+            def fetch_urls(manager):
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        i, url = pending.pop(0)
+                    try:
+                        results[i] = manager.fetch(url, error_message)
+                    except (DownloaderException) as e:
+                        results[i] = e
+
+            def fetch_pooled_urls():
+                try:
+                    with downloader(urls[0], self.settings) as manager:
+                        fetch_urls(manager)
+                except (DownloaderException):
+                    # No connection to spare, the other threads take its URLs
+                    pass
+
+            threads = []
+            for _ in range(min(self.settings.get('max_connections_per_host', MAX_PER_HOST), len(urls)) - 1):
+                thread = Thread(target=fetch_pooled_urls)
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+            # One share of the URLs goes over the connection this manager already has open
+            fetch_urls(self)
+            for thread in threads:
+                thread.join()
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+        return results
+
+    def download_to(self, url, file_path, error_message, hash_value=None, hash_name='sha256', connections=1):
+        """
+        Downloads a URL into a file. Downloaders that support it stream the
+        content to disk in chunks and resume interrupted transfers, so memory
+        use does not grow with the size of the file.
+
+        With more than one connection, and a server that honours Range
+        requests, the content is split into segments that are fetched in
+        parallel over pooled connections and written at their offsets.
+
+        :param url:
+            The string URL to download
+
+        :param file_path:
+            The path to write the content to, it is replaced atomically once
+            the download is complete and verified
+
+        :param error_message:
+            The error message to include if the download fails
+
+        :param hash_value:
+            The expected hex digest of the content, or None to skip the check
+
+        :param hash_name:
+            The hashlib algorithm name hash_value was computed with
+
+        :param connections:
+            The maximum int number of connections to download over
+
+        :raises:
+            DownloaderException: if there was an error downloading the URL
+
+        :return:
+            The int number of bytes written to file_path
+        """
+
+        url, hostname, timeout = self._prepare(url)
+
+        if not hasattr(self.downloader, 'download_to_file'):
+            # curl, wget and WinINet buffer the whole response anyway
+            content = self.fetch(url, error_message)
+            stream = ResumableDownloader()
+            with open(stream.part_path(file_path), 'wb') as f:
+                f.write(content)
+            stream.finish_part(url, file_path, len(content), hash_value, hash_name)
+            return len(content)
+
+        try:
+            if connections > 1 and hasattr(self.downloader, 'download_range_to_file'):
+                with timing.track(url) as request:
+                    request.downloader = self.downloader.__class__.__name__
+                    size = self.downloader.probe_range(url, error_message, timeout)
+                if size and size >= 2 * MIN_SEGMENT_SIZE:
+                    return self._download_segmented(url, file_path, error_message, size,
+                                                    connections, hash_value, hash_name)
+
+            with timing.track(url) as request:
+                request.downloader = self.downloader.__class__.__name__
+                return self.downloader.download_to_file(url, file_path, error_message, timeout, 3,
+                                                        hash_value, hash_name)
+
+        except (RateLimitException) as e:
+            self._skip_rate_limited(hostname, e)
+            raise
+
+    def _download_segmented(self, url, file_path, error_message, size, connections, hash_value, hash_name):
+        """
+        Splits a download into ranges that are fetched in parallel, each
+        over its own pooled DownloadManager, into a preallocated file.
+
+        Finished ranges are recorded next to the ".part" file. A range that
+        fails is queued again, and if it keeps failing the ".part" file is
+        kept so the next call only downloads the ranges that are missing.
+
+        :param size:
+            The int total length of the content
+
+        :param connections:
+            The maximum int number of connections to download over
+
+        :return:
+            The int number of bytes written to file_path
+        """
+
+        stream = self.downloader
+        part_path = stream.part_path(file_path)
+        done = stream.load_segments(url, file_path, size)
+        if done is None:
+            stream.discard_part(file_path)
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            done = []
+            stream.save_segments(url, file_path, size, done)
+
+        pending = _split_ranges(_missing_ranges(done, size), connections)
+        failures = {}
+        errors = []
+        lock = Lock()
+
+        def fetch_segments(manager):
+            while True:
+                with lock:
+                    if not pending or errors:
+                        return
+                    start, end = pending.pop(0)
+                try:
+                    segment_url, _, timeout = manager._prepare(url)
+                    with timing.track(u'%s [%d-%d]' % (segment_url, start, end - 1)) as request:
+                        request.downloader = manager.downloader.__class__.__name__
+                        manager.downloader.download_range_to_file(segment_url, part_path, start, end,
+                                                                  error_message, timeout, 3)
+                except (RateLimitException, FileWriteException) as e:
+                    with lock:
+                        errors.append(e)
+                    return
+                except (Exception) as e:
+                    with lock:
+                        failures[(start, end)] = failures.get((start, end), 0) + 1
+                        if failures[(start, end)] > SEGMENT_RETRIES:
+                            errors.append(e)
+                        else:
+                            pending.append((start, end))
+                else:
+                    with lock:
+                        done.append((start, end))
+                        done[:] = _merge_ranges(done)
+                        stream.save_segments(url, file_path, size, done)
+
+        def fetch_pooled_segments():
+            try:
+                with downloader(url, self.settings) as manager:
+                    fetch_segments(manager)
+            except (DownloaderException):
+                # No connection to spare, the other threads take its ranges
+                pass
+
+        threads = []
+        for _ in range(min(connections, len(pending)) - 1):
+            thread = Thread(target=fetch_pooled_segments)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        # One share of the ranges goes over the connection this manager already has open
+        fetch_segments(self)
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        stream.finish_part(url, file_path, size, hash_value, hash_name)
+        return size
+
+    def _prepare(self, url):
+        """
+        Picks a downloader for the URL and applies the URL fixes, debug
+        output and rate limit checks shared by all request types
+
+        :param url:
+            The string URL to download
+
+        :raises:
+            DownloaderException: if no downloader is usable or the domain is rate limited
+
+        :return:
+            A tuple of (updated url, lowercase hostname, timeout)
+        """
+
         is_ssl = re.search('^https://', url) is not None
 
         url = update_url(url, self.settings.get('debug'))
@@ -288,8 +759,6 @@ class DownloadManager(object):
             hostname = hostname.lower()
         timeout = self.settings.get('timeout', 3)
 
-        rate_limited_domains = get_cache('rate_limited_domains', [])
-
         if self.settings.get('debug'):
             try:
                 port = 443 if is_ssl else 80
@@ -326,7 +795,7 @@ class DownloadManager(object):
                     prefix=False
                 )
 
-        if hostname in rate_limited_domains:
+        if get_cache('rate_limited.' + str_cls(hostname)):
             error_string = u'Skipping due to hitting rate limit for %s' % hostname
             if self.settings.get('debug'):
                 console_write(
@@ -336,14 +805,21 @@ class DownloadManager(object):
                 )
             raise DownloaderException(error_string)
 
-        try:
-            return self.downloader.download(url, error_message, timeout, 3, prefer_cached)
+        return (url, hostname, timeout)
 
-        except (RateLimitException) as e:
+    def _skip_rate_limited(self, hostname, e):
+        """
+        Remembers that a domain hit its rate limit so further requests to it
+        are skipped
 
-            rate_limited_domains.append(hostname)
-            set_cache('rate_limited_domains', rate_limited_domains, self.settings.get('cache_length'))
+        :param hostname:
+            The lowercase hostname of the request
 
+        :param e:
+            The RateLimitException that was raised
+        """
+
+        def skip():
             console_write(
                 u'''
                 Hit rate limit of %s for %s. Skipping all futher download
@@ -351,42 +827,50 @@ class DownloadManager(object):
                 ''',
                 (e.limit, e.domain)
             )
-            raise
+            return True
 
-        except (WinDownloaderException) as e:
+        # A key per domain is set atomically, parallel requests that hit the
+        # limit together don't overwrite each other, and only one reports it
+        get_or_set_cache('rate_limited.' + str_cls(hostname), skip, self.settings.get('cache_length'))
 
-            console_write(
-                u'''
-                Attempting to use Urllib downloader due to WinINet error: %s
-                ''',
-                e
-            )
+    def _fallback_from_wininet(self, e):
+        """
+        Replaces a failing WinINet downloader with the urllib one
+
+        :param e:
+            The WinDownloaderException that was raised
+        """
+
+        console_write(
+            u'''
+            Attempting to use Urllib downloader due to WinINet error: %s
+            ''',
+            e
+        )
 
-            # Here we grab the proxy info extracted from WinInet to fill in
-            # the Package Control settings if those are not present. This should
-            # hopefully make a seamless fallback for users who run into weird
-            # windows errors related to network communication.
-            wininet_proxy = self.downloader.proxy or ''
-            wininet_proxy_username = self.downloader.proxy_username or ''
-            wininet_proxy_password = self.downloader.proxy_password or ''
-
-            http_proxy = self.settings.get('http_proxy', '')
-            https_proxy = self.settings.get('https_proxy', '')
-            proxy_username = self.settings.get('proxy_username', '')
-            proxy_password = self.settings.get('proxy_password', '')
-
-            settings = self.settings.copy()
-            if not http_proxy and wininet_proxy:
-                settings['http_proxy'] = wininet_proxy
-            if not https_proxy and wininet_proxy:
-                settings['https_proxy'] = wininet_proxy
-
-            has_proxy = settings.get('http_proxy') or settings.get('https_proxy')
-            if has_proxy and not proxy_username and wininet_proxy_username:
-                settings['proxy_username'] = wininet_proxy_username
-            if has_proxy and not proxy_password and wininet_proxy_password:
-                settings['proxy_password'] = wininet_proxy_password
-
-            self.downloader = UrlLibDownloader(settings)
-            # Try again with the new downloader!
-            return self.fetch(url, error_message, prefer_cached)
+        # Here we grab the proxy info extracted from WinInet to fill in
+        # the Package Control settings if those are not present. This should
+        # hopefully make a seamless fallback for users who run into weird
+        # windows errors related to network communication.
+        wininet_proxy = self.downloader.proxy or ''
+        wininet_proxy_username = self.downloader.proxy_username or ''
+        wininet_proxy_password = self.downloader.proxy_password or ''
+
+        http_proxy = self.settings.get('http_proxy', '')
+        https_proxy = self.settings.get('https_proxy', '')
+        proxy_username = self.settings.get('proxy_username', '')
+        proxy_password = self.settings.get('proxy_password', '')
+
+        settings = self.settings.copy()
+        if not http_proxy and wininet_proxy:
+            settings['http_proxy'] = wininet_proxy
+        if not https_proxy and wininet_proxy:
+            settings['https_proxy'] = wininet_proxy
+
+        has_proxy = settings.get('http_proxy') or settings.get('https_proxy')
+        if has_proxy and not proxy_username and wininet_proxy_username:
+            settings['proxy_username'] = wininet_proxy_username
+        if has_proxy and not proxy_password and wininet_proxy_password:
+            settings['proxy_password'] = wininet_proxy_password
+
+        self.downloader = UrlLibDownloader(settings)
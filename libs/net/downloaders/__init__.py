@@ -13,3 +13,10 @@ DOWNLOADERS = {
 if os.name == 'nt':
     from .wininet_downloader import WinINetDownloader
     DOWNLOADERS['wininet'] = WinINetDownloader
+
+try:
+    # Needs asyncio and async/await syntax, so Python 3.5+
+    from .asyncio_downloader import AsyncioDownloader
+    DOWNLOADERS['asyncio'] = AsyncioDownloader
+except (ImportError, SyntaxError):
+    pass
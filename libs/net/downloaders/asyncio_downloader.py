@@ -0,0 +1,531 @@
+import os
+import asyncio
+import threading
+
+try:
+    import ssl
+except (ImportError):
+    ssl = None
+
+from urllib.parse import urlparse, urljoin
+
+from ..console_write import console_write
+from .. import text
+from ..ca_certs import get_ca_bundle_path
+from .binary_not_found_error import BinaryNotFoundError
+from .downloader_exception import DownloaderException
+from .decoding_downloader import DecodingDownloader
+from .limiting_downloader import LimitingDownloader
+from .caching_downloader import CachingDownloader
+from .resumable_downloader import ResumableDownloader
+
+
+# The event loop shared by every AsyncioDownloader, run on a daemon thread
+_loop = None
+
+_loop_lock = threading.Lock()
+
+# Redirects followed before giving up on a URL
+MAX_REDIRECTS = 5
+
+
+def get_loop():
+    """
+    :return:
+        The shared event loop, started on first use
+    """
+
+    global _loop
+
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever)
+            thread.daemon = True
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+class HttpTimeout(Exception):
+
+    """If a step of a request did not complete within the timeout"""
+
+
+class AsyncioDownloader(DecodingDownloader, LimitingDownloader, CachingDownloader, ResumableDownloader):
+
+    """
+    A downloader that runs requests as coroutines on one shared event loop
+    thread, so many URLs can be fetched concurrently without a thread each.
+    Connections are kept alive per host, bodies are decoded as they arrive
+    and the blocking methods match the other downloaders.
+
+    :param settings:
+        A dict of the various Package Control settings. The Sublime Text
+        Settings API is not used because this code is run in a thread.
+
+    :raises:
+        BinaryNotFoundError: when a proxy is configured, which is not supported
+    """
+
+    def __init__(self, settings):
+        if settings.get('http_proxy') or settings.get('https_proxy'):
+            # Lets DownloadManager move on to the next downloader in the precedence
+            raise BinaryNotFoundError('The asyncio downloader does not support proxies')
+        self.settings = settings
+        self.debug = settings.get('debug')
+        # Only touched from the event loop thread
+        self._idle = {}
+        self._limits = {}
+        self._ssl_context = None
+
+    def supports_ssl(self):
+        """
+        Indicates if the object can handle HTTPS requests
+
+        :return:
+            If the object supports HTTPS requests
+        """
+
+        return ssl is not None
+
+    def close(self):
+        """
+        Closes any persistent/open connections
+        """
+
+        if _loop is None or _loop.is_closed() or not self._idle:
+            return
+        self.run(self._close_idle())
+
+    async def _close_idle(self):
+        for connections in self._idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self._idle = {}
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine on the shared event loop and waits for its result
+
+        :param coroutine:
+            The coroutine object to run
+
+        :return:
+            The result of the coroutine
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result()
+
+    def download(self, url, error_message, timeout, tries, prefer_cached=False):
+        """
+        Downloads a URL and returns the contents
+
+        :param url:
+            The URL to download
+
+        :param error_message:
+            A string to include in the console error that is printed
+            when an error occurs
+
+        :param timeout:
+            The int number of seconds to set the timeout to
+
+        :param tries:
+            The int number of times to try and download the URL in the case of
+            a timeout or HTTP 503 error
+
+        :param prefer_cached:
+            If a cached version should be returned instead of trying a new request
+
+        :raises:
+            RateLimitException: when a rate limit is hit
+            DownloaderException: when any other download error occurs
+
+        :return:
+            The string contents of the URL
+        """
+
+        if prefer_cached:
+            cached = self.retrieve_cached(url)
+            if cached:
+                return cached
+
+        return self.run(self.download_async(url, error_message, timeout, tries))
+
+    def download_many(self, requests, error_message, tries):
+        """
+        Downloads several URLs concurrently
+
+        :param requests:
+            A list of (url, timeout) tuples
+
+        :param error_message:
+            A string to include in the console error that is printed
+            when an error occurs
+
+        :param tries:
+            The int number of times to try each URL
+
+        :return:
+            A list with the contents of each URL, or the DownloaderException
+            raised while downloading it, in the order of requests
+        """
+
+        async def download_all():
+            return await asyncio.gather(
+                *[self.download_async(url, error_message, timeout, tries) for url, timeout in requests],
+                return_exceptions=True
+            )
+
+        return self.run(download_all())
+
+    def download_to_file(self, url, file_path, error_message, timeout, tries, hash_value=None, hash_name='sha256'):
+        """
+        Downloads a URL into a file, streaming the body to disk and resuming
+        a previous partial download with a Range request
+
+        :param url:
+            The URL to download
+
+        :param file_path:
+            The path the content is moved to once complete and verified
+
+        :param error_message:
+            A string to include in the console error that is printed
+            when an error occurs
+
+        :param timeout:
+            The int number of seconds to set the timeout to
+
+        :param tries:
+            The int number of times to try and download the URL
+
+        :param hash_value:
+            The expected hex digest of the content, or None
+
+        :param hash_name:
+            The hashlib algorithm name hash_value was computed with
+
+        :raises:
+            RateLimitException: when a rate limit is hit
+            FileWriteException: when the file can not be written, which is not retried
+            DownloaderException: when any other download error occurs
+
+        :return:
+            The int number of bytes written to file_path
+        """
+
+        return self.run(self.download_to_file_async(url, file_path, error_message, timeout, tries,
+                                                    hash_value, hash_name))
+
+    def request_headers(self, url):
+        headers = {}
+        user_agent = self.settings.get('user_agent')
+        if user_agent:
+            headers['User-Agent'] = user_agent
+        return headers
+
+    async def download_async(self, url, error_message, timeout, tries):
+        """
+        The coroutine behind download(), see it for the parameters
+        """
+
+        error_string = None
+        while tries > 0:
+            tries -= 1
+            headers = self.request_headers(url)
+            headers['Accept-Encoding'] = self.supported_encodings()
+            headers = self.add_conditional_headers(url, headers)
+
+            try:
+                body = []
+                status, response_headers = await self.request(url, headers, timeout, body.append)
+            except (HttpTimeout, OSError) as e:
+                error_string = text.format(
+                    u'''
+                    %s %s downloading %s.
+                    ''',
+                    (error_message, str(e) or e.__class__.__name__, url)
+                )
+                continue
+
+            self.handle_rate_limit(response_headers, url)
+
+            if status in (200, 304):
+                return self.cache_result('get', url, status, response_headers, b''.join(body))
+
+            # Bitbucket and Github return 503 a decent amount
+            if status == 503 and tries != 0:
+                if self.debug:
+                    console_write(
+                        u'''
+                        Downloading %s was rate limited, trying again
+                        ''',
+                        url
+                    )
+                continue
+
+            raise DownloaderException(text.format(
+                u'''
+                %s HTTP error %s downloading %s.
+                ''',
+                (error_message, status, url)
+            ))
+
+        raise DownloaderException(error_string)
+
+    async def download_to_file_async(self, url, file_path, error_message, timeout, tries,
+                                     hash_value=None, hash_name='sha256'):
+        """
+        The coroutine behind download_to_file(), see it for the parameters
+        """
+
+        part_path = self.part_path(file_path)
+        error_string = None
+        total = None
+        while tries > 0:
+            tries -= 1
+            offset = self.partial_size(file_path)
+            headers = self.request_headers(url)
+            # Ranges are byte offsets of the encoded body, so ask for none
+            headers['Accept-Encoding'] = 'identity'
+            if offset:
+                headers['Range'] = 'bytes=%d-' % offset
+
+            with self.open_part(part_path, 'ab' if offset else 'wb') as f:
+                def write(chunk):
+                    self.write_part(f, chunk)
+
+                def on_headers(status, response_headers):
+                    # The server ignored the Range, start from scratch
+                    if status == 200 and offset:
+                        f.seek(0)
+                        f.truncate()
+
+                try:
+                    status, response_headers = await self.request(url, headers, timeout, write, on_headers)
+                except (HttpTimeout, OSError) as e:
+                    error_string = text.format(
+                        u'''
+                        %s %s downloading %s.
+                        ''',
+                        (error_message, str(e) or e.__class__.__name__, url)
+                    )
+                    continue
+
+            self.handle_rate_limit(response_headers, url)
+
+            if status == 416:
+                self.discard_part(file_path)
+                continue
+            if status == 503 and tries != 0:
+                continue
+            if status not in (200, 206):
+                raise DownloaderException(text.format(
+                    u'''
+                    %s HTTP error %s downloading %s.
+                    ''',
+                    (error_message, status, url)
+                ))
+
+            if status == 206:
+                start, total = self.parse_content_range(response_headers.get('content-range'))
+            elif response_headers.get('content-length'):
+                total = int(response_headers['content-length'])
+            break
+
+        else:
+            raise DownloaderException(error_string or u'%s Unable to download %s.' % (error_message, url))
+
+        self.finish_part(url, file_path, total, hash_value, hash_name)
+        return os.path.getsize(file_path)
+
+    def _ssl(self):
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context(cafile=get_ca_bundle_path(self.settings))
+        return self._ssl_context
+
+    async def _wait(self, awaitable, timeout):
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except (asyncio.TimeoutError):
+            raise HttpTimeout(u'Timed out after %s seconds' % timeout)
+
+    async def _connect(self, key, timeout):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof():
+                return (reader, writer, True)
+            writer.close()
+
+        scheme, host, port = key
+        ssl_context = self._ssl() if scheme == 'https' else None
+        reader, writer = await self._wait(asyncio.open_connection(
+            host, port, ssl=ssl_context, server_hostname=host if ssl_context else None
+        ), timeout)
+        return (reader, writer, False)
+
+    async def request(self, url, headers, timeout, on_chunk, on_headers=None):
+        """
+        Makes a GET request, following redirects, and streams the decoded
+        body to on_chunk as it arrives. At most max_connections_per_host
+        requests run against a host at once.
+
+        :param url:
+            The URL to request
+
+        :param headers:
+            A dict of request headers
+
+        :param timeout:
+            The seconds to wait for connecting and each read
+
+        :param on_chunk:
+            A callable receiving each bytes chunk of the body
+
+        :param on_headers:
+            An optional callable receiving the status and headers before the body
+
+        :raises:
+            HttpTimeout: when a step of the request timed out
+            OSError: when the connection failed
+
+        :return:
+            A tuple of (int status, dict of lowercase headers)
+        """
+
+        for _ in range(MAX_REDIRECTS + 1):
+            parsed = urlparse(url)
+            scheme = parsed.scheme.lower()
+            port = parsed.port or (443 if scheme == 'https' else 80)
+            key = (scheme, parsed.hostname, port)
+
+            limit = self._limits.get(key)
+            if limit is None:
+                limit = asyncio.Semaphore(self.settings.get('max_connections_per_host', 4))
+                self._limits[key] = limit
+
+            async with limit:
+                status, response_headers = await self._request_once(
+                    key, parsed, headers, timeout, on_chunk, on_headers
+                )
+
+            location = response_headers.get('location')
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return (status, response_headers)
+
+        raise DownloaderException(u'Too many redirects for %s' % url)
+
+    async def _request_once(self, key, parsed, headers, timeout, on_chunk, on_headers):
+        scheme, host, port = key
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        host_header = host if port in (80, 443) else '%s:%s' % (host, port)
+
+        lines = ['GET %s HTTP/1.1' % path, 'Host: %s' % host_header, 'Connection: keep-alive']
+        lines.extend('%s: %s' % (name, value) for name, value in headers.items())
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1')
+
+        reader, writer, reused = await self._connect(key, timeout)
+        try:
+            writer.write(request)
+            await self._wait(writer.drain(), timeout)
+            status_line = await self._wait(reader.readline(), timeout)
+            if not status_line and reused:
+                # The server closed the kept-alive connection, retry on a fresh one
+                writer.close()
+                reader, writer, reused = await self._connect((scheme, host, port), timeout)
+                writer.write(request)
+                await self._wait(writer.drain(), timeout)
+                status_line = await self._wait(reader.readline(), timeout)
+
+            parts = status_line.decode('iso-8859-1').split(None, 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise OSError(u'Invalid HTTP status line %r' % status_line)
+            status = int(parts[1])
+
+            response_headers = {}
+            while True:
+                line = await self._wait(reader.readline(), timeout)
+                line = line.decode('iso-8859-1').rstrip('\r\n')
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+
+            if self.debug:
+                console_write(
+                    u'''
+                    Asyncio Debug Read
+                      %s %s
+                    ''',
+                    (status, parsed.geturl())
+                )
+
+            if on_headers:
+                on_headers(status, response_headers)
+
+            redirect = status in (301, 302, 303, 307, 308)
+            sink = (lambda chunk: None) if redirect or status >= 400 else on_chunk
+            decoder = self.decoder(response_headers.get('content-encoding'))
+            keep_alive = await self._read_body(reader, status, response_headers, timeout,
+                                               lambda chunk: sink(decoder.decompress(chunk)))
+            sink(decoder.flush())
+
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive and response_headers.get('connection', '').lower() != 'close':
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+        return (status, response_headers)
+
+    async def _read_body(self, reader, status, headers, timeout, on_chunk):
+        """
+        Reads a response body, returns if the connection can be re-used
+        """
+
+        if status in (204, 304) or 100 <= status < 200:
+            return True
+
+        chunk_size = self.chunk_size
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await self._wait(reader.readline(), timeout)
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip any trailers up to the final blank line
+                    while (await self._wait(reader.readline(), timeout)).strip():
+                        pass
+                    return True
+                while size > 0:
+                    chunk = await self._wait(reader.read(min(size, chunk_size)), timeout)
+                    if not chunk:
+                        raise OSError(u'Connection closed in the middle of a chunk')
+                    size -= len(chunk)
+                    on_chunk(chunk)
+                await self._wait(reader.readline(), timeout)
+
+        if 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                chunk = await self._wait(reader.read(min(remaining, chunk_size)), timeout)
+                if not chunk:
+                    raise OSError(u'Connection closed with %d bytes of the body missing' % remaining)
+                remaining -= len(chunk)
+                on_chunk(chunk)
+            return True
+
+        # No framing, the body ends when the server closes the connection
+        while True:
+            chunk = await self._wait(reader.read(chunk_size), timeout)
+            if not chunk:
+                return False
+            on_chunk(chunk)
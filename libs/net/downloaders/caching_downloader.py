@@ -1,8 +1,10 @@
 import re
 import json
+import time
 import hashlib
 
 from ..console_write import console_write
+from .. import timing
 
 try:
     # Python 2
@@ -34,14 +36,13 @@ class CachingDownloader(object):
         if not self.settings.get('cache'):
             return headers
 
-        info_key = self.generate_key(url, '.info')
-        info_json = self.settings['cache'].get(info_key)
+        key = self.generate_key(url)
+        info_json = self.settings['cache'].get_info(key)
 
         if not info_json:
             return headers
 
         # Make sure we have the cached content to use if we get a 304
-        key = self.generate_key(url)
         if not self.settings['cache'].has(key):
             return headers
 
@@ -88,6 +89,7 @@ class CachingDownloader(object):
         cache = self.settings.get('cache')
 
         if not cache:
+            timing.note(cache='none')
             if debug:
                 console_write(
                     u'''
@@ -122,6 +124,8 @@ class CachingDownloader(object):
         if status == 304:
             cached_content = cache.get(key)
             if cached_content:
+                timing.note(cache='revalidated')
+                self.touch_cached(url)
                 if debug:
                     console_write(
                         u'''
@@ -136,6 +140,7 @@ class CachingDownloader(object):
             return content
 
         # If we got here, the status is 200
+        timing.note(cache='miss')
 
         # Respect some basic cache control headers
         cache_control = headers.get('cache-control', '')
@@ -161,10 +166,9 @@ class CachingDownloader(object):
         if not etag and not last_modified:
             return content
 
-        struct = {'etag': etag, 'last-modified': last_modified}
+        struct = {'etag': etag, 'last-modified': last_modified, 'time': time.time()}
         struct_json = json.dumps(struct, indent=4)
 
-        info_key = self.generate_key(url, '.info')
         if debug:
             console_write(
                 u'''
@@ -173,8 +177,9 @@ class CachingDownloader(object):
                 (url, cache.path(key))
             )
 
-        cache.set(info_key, struct_json.encode('utf-8'))
         cache.set(key, content)
+        cache.set_info(key, struct_json.encode('utf-8'))
+        timing.note(cache='stored')
 
         return content
 
@@ -215,6 +220,7 @@ class CachingDownloader(object):
         if not cache.has(key):
             return False
 
+        timing.note(cache='hit')
         if self.settings.get('debug'):
             console_write(
                 u'''
@@ -224,3 +230,63 @@ class CachingDownloader(object):
             )
 
         return cache.get(key)
+
+    def cached_info(self, url):
+        """
+        Loads the info stored alongside the cached content for a URL
+
+        :param url:
+            The URL to get the cache info for
+
+        :return:
+            A dict with the keys "etag", "last-modified" and "time", or None
+        """
+
+        info_json = self.settings['cache'].get_info(self.generate_key(url))
+        if not info_json:
+            return None
+
+        try:
+            return json.loads(info_json.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def touch_cached(self, url):
+        """
+        Marks the cached content for a URL as just validated with the server
+
+        :param url:
+            The URL whose cached content was confirmed by a 304 response
+        """
+
+        info = self.cached_info(url)
+        if info is None:
+            return
+
+        info['time'] = time.time()
+        key = self.generate_key(url)
+        self.settings['cache'].set_info(key, json.dumps(info, indent=4).encode('utf-8'))
+
+    def retrieve_fresh(self, url, max_age):
+        """
+        Returns the cached content for a URL if it was fetched or revalidated
+        within the last max_age seconds, so no request is needed at all
+
+        :param url:
+            The URL to get the cached content for
+
+        :param max_age:
+            The number of seconds cached content stays fresh
+
+        :return:
+            The cached content, or False
+        """
+
+        info = self.cached_info(url)
+        if not info or not info.get('time'):
+            return False
+
+        if time.time() - info['time'] > max_age:
+            return False
+
+        return self.retrieve_cached(url)
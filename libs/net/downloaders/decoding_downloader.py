@@ -1,19 +1,75 @@
-import gzip
 import zlib
 
-try:
-    # Python 3
-    from io import BytesIO as StringIO
-except (ImportError):
-    # Python 2
-    from StringIO import StringIO
-
 try:
     import bz2
 except (ImportError):
     bz2 = None
 
 from .downloader_exception import DownloaderException
+from .. import timing
+
+
+class ZlibDecoder(object):
+
+    """
+    Incrementally decodes a gzip or deflate response body. A deflate body is
+    checked for a zlib header on the first chunk, since some servers send raw
+    deflate data instead. Concatenated gzip members are decoded in turn.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self._decompressor = None
+        if encoding == 'gzip':
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, chunk):
+        if self._decompressor is None:
+            # RFC 1950 header: deflate method and a header checksum divisible by 31
+            zlib_header = len(chunk) >= 2 and bytearray(chunk[0:1])[0] & 0x0F == 8 and \
+                (bytearray(chunk[0:1])[0] * 256 + bytearray(chunk[1:2])[0]) % 31 == 0
+            self._decompressor = zlib.decompressobj(zlib.MAX_WBITS if zlib_header else -zlib.MAX_WBITS)
+
+        output = [self._decompressor.decompress(chunk)]
+        while self.encoding == 'gzip' and self._decompressor.unused_data:
+            rest = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            output.append(self._decompressor.decompress(rest))
+        return b''.join(output)
+
+    def flush(self):
+        if self._decompressor is None:
+            return b''
+        return self._decompressor.flush()
+
+
+class Bzip2Decoder(object):
+
+    """
+    Incrementally decodes a bzip2 response body
+    """
+
+    def __init__(self):
+        self._decompressor = bz2.BZ2Decompressor()
+
+    def decompress(self, chunk):
+        return self._decompressor.decompress(chunk)
+
+    def flush(self):
+        return b''
+
+
+class IdentityDecoder(object):
+
+    """
+    Passes a response body without a content encoding through
+    """
+
+    def decompress(self, chunk):
+        return chunk
+
+    def flush(self):
+        return b''
 
 
 class DecodingDownloader(object):
@@ -36,6 +92,28 @@ class DecodingDownloader(object):
             encodings = 'bzip2,' + encodings
         return encodings
 
+    def decoder(self, encoding):
+        """
+        Creates an incremental decoder for a response body, so chunks can be
+        decoded as they are received instead of after the whole body is read
+
+        :param encoding:
+            The value of the Content-Encoding HTTP header
+
+        :return:
+            An object with decompress(chunk) and flush() methods, both
+            returning decoded bytes
+        """
+
+        if encoding == 'bzip2':
+            if bz2:
+                return Bzip2Decoder()
+            else:
+                raise DownloaderException(u'Received bzip2 file contents, but was unable to import the bz2 module')
+        elif encoding in ('gzip', 'deflate'):
+            return ZlibDecoder(encoding)
+        return IdentityDecoder()
+
     def decode_response(self, encoding, response):
         """
         Decodes the raw response from the web server based on the
@@ -51,14 +129,36 @@ class DecodingDownloader(object):
             The decoded response
         """
 
-        if encoding == 'bzip2':
-            if bz2:
-                return bz2.decompress(response)
-            else:
-                raise DownloaderException(u'Received bzip2 file contents, but was unable to import the bz2 module')
-        elif encoding == 'gzip':
-            return gzip.GzipFile(fileobj=StringIO(response)).read()
-        elif encoding == 'deflate':
-            decompresser = zlib.decompressobj(-zlib.MAX_WBITS)
-            return decompresser.decompress(response) + decompresser.flush()
-        return response
+        if not response:
+            return response
+        decoder = self.decoder(encoding)
+        return decoder.decompress(response) + decoder.flush()
+
+    def read_decoded(self, response, encoding, chunk_size=64 * 1024):
+        """
+        Reads a response body chunk by chunk, decoding each one as it arrives
+
+        :param response:
+            A file-like object with a read(size) method
+
+        :param encoding:
+            The value of the Content-Encoding HTTP header
+
+        :param chunk_size:
+            The number of raw bytes to read at a time
+
+        :return:
+            The decoded response
+        """
+
+        decoder = self.decoder(encoding)
+        output = []
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            output.append(decoder.decompress(chunk))
+            timing.count(len(chunk), len(output[-1]))
+        output.append(decoder.flush())
+        timing.count(0, len(output[-1]))
+        return b''.join(output)
@@ -0,0 +1,16 @@
+from ..unicode import unicode_from_os
+from .downloader_exception import DownloaderException
+
+
+class FileWriteException(DownloaderException):
+
+    """
+    An exception for when a download could not be written to disk, so it is
+    not retried like a dropped connection would be.
+    """
+
+    def __init__(self, path, error):
+        self.path = path
+        self.error = error
+        message = u'Unable to write %s: %s' % (path, unicode_from_os(error))
+        super(FileWriteException, self).__init__(message)
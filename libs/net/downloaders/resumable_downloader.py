@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import hashlib
+
+from .downloader_exception import DownloaderException
+from .file_write_exception import FileWriteException
+
+
+class ResumableDownloader(object):
+
+    """
+    A base for downloaders that stream a URL straight into a file. Data is
+    written to a ".part" file next to the destination, so an interrupted
+    download can be resumed with an HTTP Range request, and the destination
+    only appears once the length and hash have been verified.
+    """
+
+    # Bytes read from the response and written to disk at a time
+    chunk_size = 64 * 1024
+
+    def part_path(self, file_path):
+        """
+        :param file_path:
+            The final destination of the download
+
+        :return:
+            The path of the partial download for file_path
+        """
+
+        return file_path + '.part'
+
+    def partial_size(self, file_path):
+        """
+        :param file_path:
+            The final destination of the download
+
+        :return:
+            The number of bytes already downloaded to the ".part" file
+        """
+
+        if os.path.exists(self.segments_path(file_path)):
+            # A preallocated segmented download has holes, it can only be
+            # resumed range by range
+            self.discard_part(file_path)
+            return 0
+
+        part_path = self.part_path(file_path)
+        if not os.path.exists(part_path):
+            return 0
+        return os.path.getsize(part_path)
+
+    def open_part(self, part_path, mode):
+        """
+        Opens a ".part" file for writing, unbuffered so a full disk shows up
+        as a failed write_part() and not when the file is closed
+
+        :param part_path:
+            The path of the ".part" file
+
+        :param mode:
+            The string file mode, e.g. "ab" to resume or "wb" to start over
+
+        :raises:
+            FileWriteException: when the file can not be opened
+
+        :return:
+            The file object
+        """
+
+        try:
+            return open(part_path, mode, 0)
+        except (IOError, OSError) as e:
+            raise FileWriteException(part_path, e)
+
+    def write_part(self, f, chunk):
+        """
+        Writes a chunk of the body to a file from open_part(). A failed write
+        raises FileWriteException, which the download loops let through
+        instead of retrying it as a dropped connection.
+
+        :param f:
+            The file object from open_part()
+
+        :param chunk:
+            A byte string of the body
+        """
+
+        try:
+            f.write(chunk)
+        except (IOError, OSError) as e:
+            raise FileWriteException(f.name, e)
+
+    def discard_part(self, file_path):
+        """
+        Removes the partial download of file_path, if any
+        """
+
+        for path in (self.part_path(file_path), self.segments_path(file_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def segments_path(self, file_path):
+        """
+        :param file_path:
+            The final destination of the download
+
+        :return:
+            The path of the file listing the ranges of a segmented download
+            that are already in the ".part" file
+        """
+
+        return self.part_path(file_path) + '.segments'
+
+    def load_segments(self, url, file_path, size):
+        """
+        Reads the ranges of an interrupted segmented download of the same
+        URL and length
+
+        :param url:
+            The URL being downloaded
+
+        :param file_path:
+            The final destination of the download
+
+        :param size:
+            The int total length of the content
+
+        :return:
+            A list of [start, end) int pairs already downloaded, or None if
+            there is nothing to resume
+        """
+
+        part_path = self.part_path(file_path)
+        segments_path = self.segments_path(file_path)
+        if not os.path.exists(part_path) or not os.path.exists(segments_path):
+            return None
+        try:
+            with open(segments_path, 'r') as f:
+                info = json.load(f)
+        except (ValueError, IOError, OSError):
+            return None
+        if info.get('url') != url or info.get('size') != size or os.path.getsize(part_path) != size:
+            return None
+        return [(int(start), int(end)) for start, end in info.get('done', [])]
+
+    def save_segments(self, url, file_path, size, done):
+        """
+        Records the ranges of a segmented download that are in the ".part"
+        file, so a later attempt only fetches the rest
+
+        :param url:
+            The URL being downloaded
+
+        :param file_path:
+            The final destination of the download
+
+        :param size:
+            The int total length of the content
+
+        :param done:
+            A list of [start, end) int pairs already downloaded
+        """
+
+        segments_path = self.segments_path(file_path)
+        temp_path = segments_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'url': url, 'size': size, 'done': [list(r) for r in done]}, f)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, segments_path)
+        else:
+            if os.path.exists(segments_path):
+                os.remove(segments_path)
+            os.rename(temp_path, segments_path)
+
+    def parse_content_range(self, content_range):
+        """
+        Parses a Content-Range response header
+
+        :param content_range:
+            The header value, e.g. "bytes 100-199/1000"
+
+        :return:
+            A tuple of (int first byte, int total length or None), or
+            (None, None) if the header could not be parsed
+        """
+
+        match = re.match(r'^\s*bytes\s+(\d+)-\d+/(\d+|\*)\s*$', content_range or '')
+        if not match:
+            return (None, None)
+        total = match.group(2)
+        return (int(match.group(1)), None if total == '*' else int(total))
+
+    def finish_part(self, url, file_path, expected_size=None, hash_value=None, hash_name='sha256'):
+        """
+        Verifies a completed ".part" file and atomically moves it into place
+
+        :param url:
+            The URL that was downloaded, for error messages
+
+        :param file_path:
+            The final destination of the download
+
+        :param expected_size:
+            The int number of bytes the server announced, or None
+
+        :param hash_value:
+            The expected hex digest of the content, or None
+
+        :param hash_name:
+            The hashlib algorithm name hash_value was computed with
+
+        :raises:
+            DownloaderException: when the length or hash does not match
+            FileWriteException: when the file can not be moved into place
+        """
+
+        part_path = self.part_path(file_path)
+        size = os.path.getsize(part_path)
+        if expected_size is not None and size != expected_size:
+            raise DownloaderException(
+                u'Downloaded %d bytes of %s, expected %d' % (size, url, expected_size)
+            )
+
+        if hash_value:
+            hasher = hashlib.new(hash_name)
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                    hasher.update(chunk)
+            if hasher.hexdigest().lower() != hash_value.lower():
+                # A corrupt file can't be resumed into a good one, start over next time
+                self.discard_part(file_path)
+                raise DownloaderException(
+                    u'The %s hash of %s does not match %s' % (hash_name, url, hash_value)
+                )
+
+        try:
+            segments_path = self.segments_path(file_path)
+            if os.path.exists(segments_path):
+                os.remove(segments_path)
+
+            if hasattr(os, 'replace'):
+                os.replace(part_path, file_path)
+            else:
+                # Python 2 has no atomic rename over an existing file on Windows
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                os.rename(part_path, file_path)
+        except (IOError, OSError) as e:
+            raise FileWriteException(file_path, e)
@@ -1,8 +1,10 @@
 import re
 import sys
+import socket
 
 # Monkey patches various Python 2 issues with urllib2
 from .. import http  # noqa
+from .. import timing
 
 try:
     # Python 3
@@ -47,10 +49,15 @@ from ..ca_certs import get_ca_bundle_path
 from .decoding_downloader import DecodingDownloader
 from .limiting_downloader import LimitingDownloader
 from .caching_downloader import CachingDownloader
+from .resumable_downloader import ResumableDownloader
 from .. import text
 
 
-class UrlLibDownloader(DecodingDownloader, LimitingDownloader, CachingDownloader):
+# Phases that happen inside opener.open() when a new connection is made
+CONNECTION_PHASES = ('dns', 'connect', 'tls')
+
+
+class UrlLibDownloader(DecodingDownloader, LimitingDownloader, CachingDownloader, ResumableDownloader):
 
     """
     A downloader that uses the Python urllib module
@@ -136,16 +143,18 @@ class UrlLibDownloader(DecodingDownloader, LimitingDownloader, CachingDownloader
 
                 request_headers = self.add_conditional_headers(url, request_headers)
                 request = Request(url, headers=request_headers)
-                http_file = self.opener.open(request, timeout=timeout)
+                with timing.measure('ttfb', CONNECTION_PHASES):
+                    http_file = self.opener.open(request, timeout=timeout)
+                timing.note(status=http_file.getcode())
                 self.handle_rate_limit(http_file.headers, url)
 
-                result = http_file.read()
+                # Decode while receiving, so the compressed body is never held in full
+                encoding = http_file.headers.get('content-encoding')
+                with timing.measure('transfer'):
+                    result = self.read_decoded(http_file, encoding, self.chunk_size)
                 # Make sure the response is closed so we can re-use the connection
                 http_file.close()
 
-                encoding = http_file.headers.get('content-encoding')
-                result = self.decode_response(encoding, result)
-
                 return self.cache_result('get', url, http_file.getcode(), http_file.headers, result)
 
             except (HTTPException) as e:
@@ -242,6 +251,396 @@ class UrlLibDownloader(DecodingDownloader, LimitingDownloader, CachingDownloader
 
         raise DownloaderException(error_string)
 
+    def download_to_file(self, url, file_path, error_message, timeout, tries, hash_value=None, hash_name='sha256'):
+        """
+        Streams a URL into a file without holding the content in memory.
+        After a dropped connection the download is resumed with a Range
+        request from the bytes already on disk instead of starting over.
+
+        :param url:
+            The URL to download
+
+        :param file_path:
+            The path to write the content to, it is only created once the
+            download is complete and verified
+
+        :param error_message:
+            A string to include in the console error that is printed
+            when an error occurs
+
+        :param timeout:
+            The int number of seconds to set the timeout to
+
+        :param tries:
+            The int number of times to try the download in the case of a
+            timeout or HTTP 503 error. Attempts that received data don't count.
+
+        :param hash_value:
+            The expected hex digest of the content, or None to skip the check
+
+        :param hash_name:
+            The hashlib algorithm name hash_value was computed with
+
+        :raises:
+            RateLimitException: when a rate limit is hit
+            FileWriteException: when the file can not be written, which is not retried
+            DownloaderException: when any other download error occurs
+
+        :return:
+            The int number of bytes in the downloaded file
+        """
+
+        self.setup_opener(url, timeout)
+
+        debug = self.settings.get('debug')
+        tried = tries
+        error_string = None
+        while tries > 0:
+            tries -= 1
+            offset = self.partial_size(file_path)
+            received = 0
+            try:
+                request_headers = {
+                    # The content goes to disk as it arrives, so it has to
+                    # come unencoded for Range offsets to line up
+                    "Accept-Encoding": "identity"
+                }
+                user_agent = self.settings.get('user_agent')
+                if user_agent:
+                    request_headers["User-Agent"] = user_agent
+                if offset:
+                    request_headers["Range"] = "bytes=%d-" % offset
+
+                request = Request(url, headers=request_headers)
+                with timing.measure('ttfb', CONNECTION_PHASES):
+                    http_file = self.opener.open(request, timeout=timeout)
+                timing.note(status=http_file.getcode())
+                self.handle_rate_limit(http_file.headers, url)
+
+                expected_size = None
+                if offset and http_file.getcode() == 206:
+                    start, expected_size = self.parse_content_range(http_file.headers.get('content-range'))
+                    if start != offset:
+                        http_file.close()
+                        self.discard_part(file_path)
+                        tries += 1
+                        continue
+                else:
+                    # Either a fresh download, or the server ignored the Range header
+                    offset = 0
+                    content_length = http_file.headers.get('content-length')
+                    if content_length:
+                        expected_size = int(content_length)
+
+                with self.open_part(self.part_path(file_path), 'ab' if offset else 'wb') as f, \
+                        timing.measure('transfer'):
+                    while True:
+                        chunk = http_file.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        self.write_part(f, chunk)
+                        received += len(chunk)
+                        timing.count(len(chunk))
+                # Make sure the response is closed so we can re-use the connection
+                http_file.close()
+
+                if expected_size is not None and offset + received < expected_size:
+                    if debug:
+                        console_write(
+                            u'''
+                            Download of %s stopped at %d of %d bytes, resuming
+                            ''',
+                            (url, offset + received, expected_size)
+                        )
+                    self.close()
+                    self.setup_opener(url, timeout)
+                    if received:
+                        tries += 1
+                    continue
+
+                self.finish_part(url, file_path, expected_size, hash_value, hash_name)
+                return offset + received
+
+            except (HTTPException) as e:
+                # Since we use keep-alives, it is possible the other end closed
+                # the connection, and we may just need to re-open
+                if isinstance(e, BadStatusLine):
+                    handler = self.get_handler()
+                    if handler and handler.use_count > 1:
+                        self.close()
+                        self.setup_opener(url, timeout)
+                        tries += 1
+                        continue
+
+                exception_type = e.__class__.__name__
+                error_string = text.format(
+                    u'''
+                    %s HTTP exception %s (%s) downloading %s.
+                    ''',
+                    (error_message, exception_type, unicode_from_os(e), url)
+                )
+
+            except (HTTPError) as e:
+                # Make sure the response is closed so we can re-use the connection
+                e.read()
+                e.close()
+
+                # Make sure we obey Github's rate limiting headers
+                self.handle_rate_limit(e.headers, url)
+
+                # The partial file is not a prefix of what the server has now
+                if unicode_from_os(e.code) == '416' and offset:
+                    self.discard_part(file_path)
+                    tries += 1
+                    continue
+
+                if unicode_from_os(e.code) == '503' and tries != 0:
+                    if tries and debug:
+                        console_write(
+                            u'''
+                            Downloading %s was rate limited, trying again
+                            ''',
+                            url
+                        )
+                    continue
+
+                error_string = text.format(
+                    u'''
+                    %s HTTP error %s downloading %s.
+                    ''',
+                    (error_message, unicode_from_os(e.code), url)
+                )
+
+            except (URLError) as e:
+
+                if unicode_from_os(e.reason) == 'The read operation timed out' \
+                        or unicode_from_os(e.reason) == 'timed out':
+                    if tries and debug:
+                        console_write(
+                            u'''
+                            Downloading %s timed out, trying again
+                            ''',
+                            url
+                        )
+                    continue
+
+                error_string = text.format(
+                    u'''
+                    %s URL error %s downloading %s.
+                    ''',
+                    (error_message, unicode_from_os(e.reason), url)
+                )
+
+            except (socket.timeout, ConnectionError, OSError):
+                # The connection dropped or timed out mid-body, what was
+                # received is on disk and the next attempt resumes from there.
+                # A stalled read raises socket.timeout, which is not a
+                # ConnectionError on Python 3. Disk errors are not caught here,
+                # write_part() raises them as FileWriteException.
+                if debug:
+                    console_write(
+                        u'''
+                        Connection went away while downloading %s after %d bytes, trying again
+                        ''',
+                        (url, offset + received)
+                    )
+
+                self.close()
+                self.setup_opener(url, timeout)
+                if received:
+                    tries += 1
+
+                continue
+
+            break
+
+        if error_string is None:
+            plural = u's' if tried > 1 else u''
+            error_string = u'Unable to download %s after %d attempt%s' % (url, tried, plural)
+
+        raise DownloaderException(error_string)
+
+    def probe_range(self, url, error_message, timeout):
+        """
+        Checks if the server honours Range requests for a URL by asking for
+        the first byte of it
+
+        :param url:
+            The URL to check
+
+        :param error_message:
+            A string to include in the console error that is printed
+            when an error occurs
+
+        :param timeout:
+            The int number of seconds to set the timeout to
+
+        :raises:
+            RateLimitException: when a rate limit is hit
+
+        :return:
+            The int total length of the content, or None if the server does
+            not support Range requests for it
+        """
+
+        self.setup_opener(url, timeout)
+
+        request_headers = {
+            "Accept-Encoding": "identity",
+            "Range": "bytes=0-0"
+        }
+        user_agent = self.settings.get('user_agent')
+        if user_agent:
+            request_headers["User-Agent"] = user_agent
+
+        try:
+            http_file = self.opener.open(Request(url, headers=request_headers), timeout=timeout)
+            self.handle_rate_limit(http_file.headers, url)
+            if http_file.getcode() != 206:
+                # Don't read a full body we have no use for, drop the connection instead
+                self.close()
+                return None
+            http_file.read()
+            http_file.close()
+
+        except (HTTPError) as e:
+            e.close()
+            self.handle_rate_limit(e.headers, url)
+            self.close()
+            return None
+
+        except (HTTPException, URLError, socket.timeout, ConnectionError, OSError):
+            # A server that stalls on the probe gets a single stream instead
+            self.close()
+            return None
+
+        start, total = self.parse_content_range(http_file.headers.get('content-range'))
+        if start != 0:
+            return None
+        return total
+
+    def download_range_to_file(self, url, part_path, start, end, error_message, timeout, tries):
+        """
+        Downloads the bytes [start, end) of a URL into an existing file at
+        the same offset, resuming within the range after a dropped
+        connection. Used by segmented parallel downloads.
+
+        :param url:
+            The URL to download
+
+        :param part_path:
+            The path of the preallocated file to write into
+
+        :param start:
+            The int offset of the first byte to download
+
+        :param end:
+            The int offset one past the last byte to download
+
+        :param error_message:
+            A string to include in the console error that is printed
+            when an error occurs
+
+        :param timeout:
+            The int number of seconds to set the timeout to
+
+        :param tries:
+            The int number of times to try the range in the case of an error.
+            Attempts that received data don't count.
+
+        :raises:
+            RateLimitException: when a rate limit is hit
+            FileWriteException: when the file can not be written, which is not retried
+            DownloaderException: when any other download error occurs
+        """
+
+        self.setup_opener(url, timeout)
+
+        debug = self.settings.get('debug')
+        tried = tries
+        error_string = None
+        position = start
+        with self.open_part(part_path, 'r+b') as f:
+            while tries > 0 and position < end:
+                tries -= 1
+                received = 0
+                try:
+                    request_headers = {
+                        "Accept-Encoding": "identity",
+                        "Range": "bytes=%d-%d" % (position, end - 1)
+                    }
+                    user_agent = self.settings.get('user_agent')
+                    if user_agent:
+                        request_headers["User-Agent"] = user_agent
+
+                    with timing.measure('ttfb', CONNECTION_PHASES):
+                        http_file = self.opener.open(Request(url, headers=request_headers), timeout=timeout)
+                    timing.note(status=http_file.getcode())
+                    self.handle_rate_limit(http_file.headers, url)
+
+                    content_start, _ = self.parse_content_range(http_file.headers.get('content-range'))
+                    if http_file.getcode() != 206 or content_start != position:
+                        self.close()
+                        raise DownloaderException(
+                            u'%s The server did not honour the Range request for %s.' % (error_message, url)
+                        )
+
+                    f.seek(position)
+                    with timing.measure('transfer'):
+                        while position < end:
+                            chunk = http_file.read(min(self.chunk_size, end - position))
+                            if not chunk:
+                                break
+                            self.write_part(f, chunk)
+                            position += len(chunk)
+                            received += len(chunk)
+                            timing.count(len(chunk))
+                    # Make sure the response is closed so we can re-use the connection
+                    http_file.close()
+
+                except (HTTPError) as e:
+                    e.read()
+                    e.close()
+                    self.handle_rate_limit(e.headers, url)
+
+                    error_string = text.format(
+                        u'''
+                        %s HTTP error %s downloading %s.
+                        ''',
+                        (error_message, unicode_from_os(e.code), url)
+                    )
+                    if unicode_from_os(e.code) != '503':
+                        break
+
+                except (HTTPException, URLError, socket.timeout, ConnectionError, OSError) as e:
+                    # A stalled read raises socket.timeout, the bytes up to
+                    # position are written and the next attempt resumes there.
+                    # Disk errors come from write_part() as FileWriteException.
+                    if debug:
+                        console_write(
+                            u'''
+                            Connection went away while downloading bytes %d-%d of %s, trying again
+                            ''',
+                            (position, end - 1, url)
+                        )
+                    error_string = text.format(
+                        u'''
+                        %s %s (%s) downloading %s.
+                        ''',
+                        (error_message, e.__class__.__name__, unicode_from_os(e), url)
+                    )
+                    self.close()
+                    self.setup_opener(url, timeout)
+
+                if received:
+                    tries += 1
+
+        if position < end:
+            if error_string is None:
+                plural = u's' if tried > 1 else u''
+                error_string = u'Unable to download %s after %d attempt%s' % (url, tried, plural)
+            raise DownloaderException(error_string)
+
     def get_handler(self):
         """
         Get the HTTPHandler object for the current connection
@@ -617,20 +617,25 @@ class WinINetDownloader(DecodingDownloader, LimitingDownloader, CachingDownloade
                             (self.scheme.upper(), indented_headers)
                         )
 
+                general, headers = self.parse_headers(headers)
+
                 buffer_length = 65536
                 output_buffer = ctypes.create_string_buffer(buffer_length)
                 bytes_read = wintypes.DWORD()
 
-                result = b''
+                # The headers are known before the body, so decode while reading
+                decoder = self.decoder(headers.get('content-encoding'))
+                result = []
                 try_again = True
                 while try_again:
                     try_again = False
                     wininet.InternetReadFile(http_connection, output_buffer, buffer_length, ctypes.byref(bytes_read))
                     if bytes_read.value > 0:
-                        result += output_buffer.raw[:bytes_read.value]
+                        result.append(decoder.decompress(output_buffer.raw[:bytes_read.value]))
                         try_again = True
+                result.append(decoder.flush())
+                result = b''.join(result)
 
-                general, headers = self.parse_headers(headers)
                 self.handle_rate_limit(headers, url)
 
                 if general['status'] == 503 and tries != 0:
@@ -644,9 +649,6 @@ class WinINetDownloader(DecodingDownloader, LimitingDownloader, CachingDownloade
                         )
                     continue
 
-                encoding = headers.get('content-encoding')
-                result = self.decode_response(encoding, result)
-
                 result = self.cache_result('get', url, general['status'], headers, result)
 
                 if general['status'] not in [200, 304]:
@@ -8,6 +8,7 @@ except (ImportError):
     from httplib import HTTPConnection
 
 from ..console_write import console_write
+from .. import timing
 from .debuggable_http_response import DebuggableHTTPResponse
 
 
@@ -34,6 +35,10 @@ class DebuggableHTTPConnection(HTTPConnection):
 
         HTTPConnection.__init__(self, host, port=port, timeout=timeout)
 
+        # Python 3.4+ opens the socket through this attribute, which lets the
+        # name lookup and TCP connect be timed separately
+        self._create_connection = timing.create_connection
+
     def connect(self):
         if self.debuglevel == -1:
             console_write(
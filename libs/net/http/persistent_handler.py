@@ -1,5 +1,6 @@
 import sys
 import socket
+import select
 
 try:
     # Python 3
@@ -37,6 +38,26 @@ class PersistentHandler:
             self.connection = None
             self.use_count = 0
 
+    def is_alive(self):
+        """
+        Checks if the kept-alive connection can be used for another request
+
+        :return:
+            False if the server closed the socket or sent unexpected data,
+            True otherwise, including when there is no open connection
+        """
+
+        sock = getattr(self.connection, 'sock', None)
+        if sock is None:
+            return True
+        try:
+            # An idle HTTP connection has nothing to read, a readable socket
+            # means the server hung up (EOF) or the connection is out of sync
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
     def do_open(self, http_class, req):
         # Large portions from Python 3.3 Lib/urllib/request.py and
         # Python 2.6 Lib/urllib2.py
@@ -4,6 +4,8 @@ import base64
 import hashlib
 import os
 import sys
+import threading
+from collections import OrderedDict
 
 try:
     # Python 3
@@ -17,17 +19,118 @@ except (ImportError):
     from ..deps.asn1crypto import x509
 
 from ..console_write import console_write
+from .. import timing
 from .debuggable_https_response import DebuggableHTTPSResponse
 from .debuggable_http_connection import DebuggableHTTPConnection
 from .invalid_certificate_exception import InvalidCertificateException
 
 
+# Number of hosts whose last TLS session is kept for resumption
+SESSION_CACHE_SIZE = 64
+
+_tls_lock = threading.Lock()
+
+# Counters reported by tls_stats()
+_tls_stats = {
+    'contexts_created': 0,
+    'context_hits': 0,
+    'full_handshakes': 0,
+    'resumed_handshakes': 0,
+    'full_handshake_time': 0.0,
+    'resumed_handshake_time': 0.0
+}
+
+
+def tls_stats():
+    """
+    :return:
+        A dict with the number of SSL contexts created and re-used, and the
+        count and total seconds of full and resumed TLS handshakes
+    """
+
+    with _tls_lock:
+        return dict(_tls_stats)
+
+
 # The following code is wrapped in a try because the Linux versions of Sublime
 # Text do not include the ssl module due to the fact that different distros
 # have different versions
 try:
     import ssl
 
+    # PROTOCOL_TLS_CLIENT/PROTOCOL_TLS negotiate the highest version both ends
+    # support, older Pythons call the same thing PROTOCOL_SSLv23
+    _PROTOCOL = getattr(ssl, 'PROTOCOL_TLS_CLIENT', getattr(ssl, 'PROTOCOL_TLS', ssl.PROTOCOL_SSLv23))
+
+    # SSLContext objects by (CA bundle path, CA bundle mtime, cert_reqs), so
+    # the bundle is only parsed again once it has been regenerated
+    _contexts = {}
+
+    # The last (SSLContext, ssl.SSLSession) per (host, port), Python 3.6+
+    _sessions = OrderedDict()
+
+    def get_context(ca_certs, cert_reqs):
+        """
+        Returns a shared client SSLContext that trusts the CA certs in a file
+
+        :param ca_certs:
+            The path to the CA bundle, or None
+
+        :param cert_reqs:
+            ssl.CERT_REQUIRED or ssl.CERT_NONE
+
+        :return:
+            An ssl.SSLContext object
+        """
+
+        try:
+            mtime = os.path.getmtime(ca_certs) if ca_certs else None
+        except (OSError):
+            mtime = None
+        key = (ca_certs, mtime, cert_reqs)
+
+        with _tls_lock:
+            ctx = _contexts.get(key)
+            if ctx is not None:
+                _tls_stats['context_hits'] += 1
+                return ctx
+
+        ctx = ssl.SSLContext(_PROTOCOL)
+        # Hostnames are validated by ValidatingHTTPSConnection itself
+        ctx.check_hostname = False
+        ctx.verify_mode = cert_reqs
+        for option in ('OP_NO_SSLv2', 'OP_NO_SSLv3', 'OP_NO_COMPRESSION'):
+            ctx.options |= getattr(ssl, option, 0)
+        if ca_certs:
+            ctx.load_verify_locations(ca_certs)
+
+        with _tls_lock:
+            # A regenerated bundle replaces the context for the old one
+            for old_key in [k for k in _contexts if k[0] == ca_certs and k[2] == cert_reqs]:
+                del _contexts[old_key]
+            _contexts[key] = ctx
+            _tls_stats['contexts_created'] += 1
+        return ctx
+
+    def _get_session(address, ctx):
+        with _tls_lock:
+            saved_ctx, session = _sessions.get(address, (None, None))
+        # A session can only be resumed through the context that created it
+        return session if saved_ctx is ctx else None
+
+    def _save_session(address, ctx, session):
+        with _tls_lock:
+            _sessions.pop(address, None)
+            _sessions[address] = (ctx, session)
+            while len(_sessions) > SESSION_CACHE_SIZE:
+                _sessions.popitem(last=False)
+
+    def _record_handshake(resumed, seconds):
+        kind = 'resumed' if resumed else 'full'
+        with _tls_lock:
+            _tls_stats[kind + '_handshakes'] += 1
+            _tls_stats[kind + '_handshake_time'] += seconds
+
     class ValidatingHTTPSConnection(DebuggableHTTPConnection):
 
         """
@@ -276,6 +379,38 @@ try:
 
             return ', '.join([u"%s=\"%s\"" % (field, response_fields[field]) for field in response_fields])
 
+        def _session_key(self):
+            # Through a proxy the TLS session belongs to the tunnelled host,
+            # not to the proxy the socket is connected to
+            if self._tunnel_host:
+                return (self._tunnel_host, self._tunnel_port or self.default_port)
+            return (self.host, self.port)
+
+        def _save_session(self):
+            # TLS 1.2 servers often resume by session ID and never send a
+            # ticket, so any session is cached. TLS 1.3 servers send the
+            # ticket after the handshake, so the session is saved again when
+            # the connection is closed.
+            session = getattr(self.sock, 'session', None)
+            if session is None:
+                return
+            if not getattr(session, 'has_ticket', True) and self.sock.version() == 'TLSv1.3':
+                # The ticket is still on its way, keep the cached session until then
+                return
+            key = self._session_key()
+            if getattr(self.sock, 'session_reused', False) and session == _get_session(key, self.ctx):
+                # Resumed from the cache, there is nothing new to keep
+                return
+            _save_session(key, self.ctx, session)
+
+        def close(self):
+            if self.sock is not None and isinstance(self.sock, ssl.SSLSocket):
+                try:
+                    self._save_session()
+                except (ValueError, ssl.SSLError):
+                    pass
+            DebuggableHTTPConnection.close(self)
+
         def connect(self):
             """
             Adds debugging and SSL certification validation
@@ -290,7 +425,7 @@ try:
                     (self.host, self.port)
                 )
 
-            self.sock = socket.create_connection((self.host, self.port), self.timeout)
+            self.sock = timing.create_connection((self.host, self.port), self.timeout)
             if self._tunnel_host:
                 self._tunnel()
 
@@ -307,9 +442,7 @@ try:
 
             # Python 3 supports SNI when using an SSLContext
             if sys.version_info >= (3,):
-                self.ctx = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
-                self.ctx.verify_mode = self.cert_reqs
-                self.ctx.load_verify_locations(self.ca_certs)
+                self.ctx = get_context(self.ca_certs, self.cert_reqs)
                 # We don't call load_cert_chain() with self.key_file and self.cert_file
                 # since that is for servers, and this code only supports client mode
                 if self.debuglevel == -1:
@@ -321,20 +454,30 @@ try:
                         indent='  ',
                         prefix=False
                     )
-                self.sock = self.ctx.wrap_socket(
-                    self.sock,
-                    server_hostname=hostname
-                )
+                wrap_args = {'server_hostname': hostname}
+                session = _get_session(self._session_key(), self.ctx)
+                if session is not None:
+                    wrap_args['session'] = session
+                start = timing.clock()
+                with timing.measure('tls'):
+                    self.sock = self.ctx.wrap_socket(self.sock, **wrap_args)
+                resumed = getattr(self.sock, 'session_reused', False)
+                _record_handshake(resumed, timing.clock() - start)
+                timing.note(tls_resumed=resumed)
+                self._save_session()
 
             else:
-                self.sock = ssl.wrap_socket(
-                    self.sock,
-                    keyfile=self.key_file,
-                    certfile=self.cert_file,
-                    cert_reqs=self.cert_reqs,
-                    ca_certs=self.ca_certs,
-                    ssl_version=ssl.PROTOCOL_TLSv1
-                )
+                start = timing.clock()
+                with timing.measure('tls'):
+                    self.sock = ssl.wrap_socket(
+                        self.sock,
+                        keyfile=self.key_file,
+                        certfile=self.cert_file,
+                        cert_reqs=self.cert_reqs,
+                        ca_certs=self.ca_certs,
+                        ssl_version=ssl.PROTOCOL_TLSv1
+                    )
+                _record_handshake(False, timing.clock() - start)
 
             if self.debuglevel == -1:
                 cipher_info = self.sock.cipher()
@@ -1,22 +1,75 @@
 import os
 import time
+import threading
 
 import sublime
 
 from .open_compat import open_compat, read_compat
 
+try:
+    import sqlite3
+except (ImportError):
+    # Some builds of Sublime Text ship a Python without the sqlite3 module
+    sqlite3 = None
+
+
+# Stores shared by every HttpCache using the same path, so the database is
+# opened and the expiry thread started once per process
+_stores = {}
+
+_stores_lock = threading.Lock()
+
+# Seconds cache hits keep their access times in memory before a hit writes
+# them out, if no set() or flush() has done so already
+ATIME_FLUSH_INTERVAL = 300
+
+
+def flush_stores():
+    """
+    Writes out what the cache stores hold in memory, such as the access
+    times of recent hits, e.g. before the plugin is unloaded
+    """
+
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush()
+
 
 class HttpCache(object):
 
     """
     A data store for caching HTTP response data.
+
+    Entries live in a single SQLite database with the response body and its
+    header info in one row, so a lookup is a primary key query and opening
+    the cache never scans the disk. The total size of the bodies is bounded,
+    least recently used entries are evicted first, and entries older than the
+    TTL are removed by a background thread. Without the sqlite3 module the
+    cache falls back to a file per body and per info.
     """
 
-    def __init__(self, ttl):
-        self.base_path = os.path.join(sublime.packages_path(), 'User', 'Package Control.cache')
+    def __init__(self, ttl, base_path=None, max_size=32 * 1024 * 1024):
+        if not base_path:
+            base_path = os.path.join(sublime.packages_path(), 'User', 'Package Control.cache')
+        self.base_path = base_path
         if not os.path.exists(self.base_path):
-            os.mkdir(self.base_path)
-        self.clear(int(ttl))
+            os.makedirs(self.base_path)
+
+        with _stores_lock:
+            store = _stores.get(self.base_path)
+            if store is None:
+                if sqlite3:
+                    store = SqliteCacheStore(os.path.join(self.base_path, 'cache.sqlite3'))
+                else:
+                    store = FileCacheStore(self.base_path)
+                _stores[self.base_path] = store
+                # Expired entries are dropped in the background, not while opening
+                expiry = threading.Thread(target=store.clear, args=(int(ttl),))
+                expiry.daemon = True
+                expiry.start()
+        store.max_size = max_size
+        self._store = store
 
     def clear(self, ttl):
         """
@@ -26,17 +79,7 @@ class HttpCache(object):
             The number of seconds a cache entry should be valid for
         """
 
-        ttl = int(ttl)
-
-        for filename in os.listdir(self.base_path):
-            path = os.path.join(self.base_path, filename)
-            # There should not be any folders in the cache dir, but we
-            # ignore to prevent an exception
-            if os.path.isdir(path):
-                continue
-            mtime = os.stat(path).st_mtime
-            if mtime < time.time() - ttl:
-                os.unlink(path)
+        self._store.clear(int(ttl))
 
     def get(self, key):
         """
@@ -49,16 +92,23 @@ class HttpCache(object):
             The (binary) cached value, or False
         """
 
-        cache_file = os.path.join(self.base_path, key)
-        if not os.path.exists(cache_file):
-            return False
-
-        with open_compat(cache_file, 'rb') as f:
-            return read_compat(f)
+        return self._store.get(key)
 
     def has(self, key):
-        cache_file = os.path.join(self.base_path, key)
-        return os.path.exists(cache_file)
+        return self._store.has(key)
+
+    def get_info(self, key):
+        """
+        Returns the info stored with a cached value
+
+        :param key:
+            The key the value was cached under
+
+        :return:
+            The (binary) info, or False
+        """
+
+        return self._store.get_info(key)
 
     def path(self, key):
         """
@@ -71,7 +121,7 @@ class HttpCache(object):
             The absolute filesystem path to the cache file
         """
 
-        return os.path.join(self.base_path, key)
+        return self._store.path(key)
 
     def set(self, key, content):
         """
@@ -84,6 +134,197 @@ class HttpCache(object):
             The (binary) content to cache
         """
 
-        cache_file = os.path.join(self.base_path, key)
-        with open_compat(cache_file, 'wb') as f:
+        self._store.set(key, content)
+
+    def set_info(self, key, info):
+        """
+        Saves the info, such as the response headers, of a cached value
+
+        :param key:
+            The key the value is cached under
+
+        :param info:
+            The (binary) info to store alongside the value
+        """
+
+        self._store.set_info(key, info)
+
+
+class SqliteCacheStore(object):
+
+    """
+    An HttpCache backend keeping every entry as a row of one SQLite database
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.max_size = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, body BLOB, info BLOB, '
+            'size INTEGER NOT NULL DEFAULT 0, mtime REAL NOT NULL, atime REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_mtime ON entries (mtime)')
+        self._conn.commit()
+        self._size = self._total_size()
+        # Access times of cache hits not yet written, so a hit is not a commit
+        self._atimes = {}
+        self._flushed = time.time()
+
+    def _total_size(self):
+        return self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _write_atimes(self):
+        """
+        Adds the access times of cache hits to the open transaction, must be
+        called with _lock held
+        """
+
+        if self._atimes:
+            self._conn.executemany(
+                'UPDATE entries SET atime = ? WHERE key = ?',
+                [(atime, key) for key, atime in self._atimes.items()]
+            )
+            self._atimes = {}
+        self._flushed = time.time()
+
+    def clear(self, ttl):
+        with self._lock:
+            self._write_atimes()
+            self._conn.execute('DELETE FROM entries WHERE mtime < ?', (time.time() - ttl,))
+            self._conn.commit()
+            self._size = self._total_size()
+
+    def flush(self):
+        with self._lock:
+            self._write_atimes()
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM entries WHERE key = ?', (key,)).fetchone()
+            if not row or row[0] is None:
+                return False
+            now = time.time()
+            self._atimes[key] = now
+            if now - self._flushed > ATIME_FLUSH_INTERVAL:
+                self._write_atimes()
+                self._conn.commit()
+        return bytes(row[0])
+
+    def has(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT body IS NOT NULL FROM entries WHERE key = ?', (key,)).fetchone()
+        return bool(row and row[0])
+
+    def get_info(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT info FROM entries WHERE key = ?', (key,)).fetchone()
+        if not row or row[0] is None:
+            return False
+        return bytes(row[0])
+
+    def path(self, key):
+        return u'%s#%s' % (self.db_path, key)
+
+    def _upsert(self, key, column, value, size):
+        now = time.time()
+        row = self._conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        if row:
+            old_size = row[0]
+            if size is None:
+                size = old_size
+            self._conn.execute(
+                'UPDATE entries SET %s = ?, size = ?, mtime = ?, atime = ? WHERE key = ?' % column,
+                (value, size, now, now, key)
+            )
+        else:
+            old_size = 0
+            if size is None:
+                size = 0
+            self._conn.execute(
+                'INSERT INTO entries (key, %s, size, mtime, atime) VALUES (?, ?, ?, ?, ?)' % column,
+                (key, value, size, now, now)
+            )
+        self._size += size - old_size
+
+    def _evict(self):
+        while self.max_size and self._size > self.max_size:
+            rows = self._conn.execute('SELECT key, size FROM entries ORDER BY atime LIMIT 16').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self._size -= size
+                if self._size <= self.max_size:
+                    break
+
+    def set(self, key, content):
+        content = bytes(content)
+        with self._lock:
+            # Eviction goes by access time, so the pending ones go in first
+            self._write_atimes()
+            self._upsert(key, 'body', sqlite3.Binary(content), len(content))
+            self._evict()
+            self._conn.commit()
+
+    def set_info(self, key, info):
+        with self._lock:
+            self._write_atimes()
+            self._upsert(key, 'info', sqlite3.Binary(bytes(info)), None)
+            self._conn.commit()
+
+
+class FileCacheStore(object):
+
+    """
+    An HttpCache backend keeping every body and info in its own file
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.max_size = None
+
+    def flush(self):
+        pass
+
+    def clear(self, ttl):
+        for filename in os.listdir(self.base_path):
+            path = os.path.join(self.base_path, filename)
+            # There should not be any folders in the cache dir, but we
+            # ignore to prevent an exception
+            if os.path.isdir(path):
+                continue
+            try:
+                if os.stat(path).st_mtime < time.time() - ttl:
+                    os.unlink(path)
+            except (OSError):
+                # Removed or replaced while we were looking at it
+                pass
+
+    def get(self, key):
+        cache_file = self.path(key)
+        if not os.path.exists(cache_file):
+            return False
+
+        with open_compat(cache_file, 'rb') as f:
+            return read_compat(f)
+
+    def has(self, key):
+        return os.path.exists(self.path(key))
+
+    def get_info(self, key):
+        return self.get(key + '.info')
+
+    def path(self, key):
+        return os.path.join(self.base_path, key)
+
+    def set(self, key, content):
+        with open_compat(self.path(key), 'wb') as f:
             f.write(content)
+
+    def set_info(self, key, info):
+        self.set(key + '.info', info)
@@ -0,0 +1,304 @@
+"""
+Tests DownloadManager.download_to() against a local http.server stand-in
+that honours Range requests, caps the bandwidth of each connection and can
+drop or stall responses part way through the body.
+
+Run outside Sublime Text with:
+
+    python libs/net/test_download.py
+"""
+
+import os
+import re
+import sys
+import time
+import types
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# net/http would shadow the standard library package, net is imported from libs
+sys.path = [path for path in sys.path if os.path.abspath(path or '.') != HERE]
+sys.path.insert(0, os.path.dirname(HERE))
+
+from http.server import BaseHTTPRequestHandler, HTTPServer  # noqa
+from socketserver import ThreadingMixIn  # noqa
+
+TEMP_DIR = tempfile.mkdtemp()
+
+try:
+    import sublime  # noqa
+except (ImportError):
+    # The cache and CA bundle live under the packages path
+    sublime = types.ModuleType('sublime')
+    sublime.packages_path = lambda: TEMP_DIR
+    sublime.error_message = lambda message: None
+    sublime.set_timeout = lambda callback, delay: None
+    sys.modules['sublime'] = sublime
+    os.makedirs(os.path.join(TEMP_DIR, 'User'))
+
+from net import download_manager  # noqa
+from net.download_manager import downloader  # noqa
+from net.downloaders import DOWNLOADERS  # noqa
+from net.downloaders.downloader_exception import DownloaderException  # noqa
+from net.downloaders.file_write_exception import FileWriteException  # noqa
+
+CONTENT = os.urandom(3 * 1024 * 1024 + 123)
+CONTENT_HASH = hashlib.sha256(CONTENT).hexdigest()
+
+
+class Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.reset()
+
+    def reset(self):
+        # Honour Range headers
+        self.ranges = True
+        # Bytes per second sent over each connection, None for no cap
+        self.rate = None
+        # Number of responses to cut off after a third of the body
+        self.drops = 0
+        # Number of responses to stall after a third of the body
+        self.stalls = 0
+        # Range starts that are always cut off before the body
+        self.broken = set()
+        # Hold the one byte Range probe past the client timeout
+        self.stall_probe = False
+        # Range header of each request, None when there was none
+        self.requests = []
+        # Seconds each /page/ request takes, and the most served at once
+        self.delay = 0.5
+        self.pages = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith('/page/'):
+            return self.send_page()
+
+        range_header = self.headers.get('Range')
+        server.requests.append(range_header)
+        if range_header == 'bytes=0-0' and server.stall_probe:
+            time.sleep(2)
+            return
+
+        start, end = 0, len(CONTENT) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', range_header or '')
+        if match and server.ranges:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(end, int(match.group(2)))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(CONTENT)))
+        else:
+            self.send_response(200)
+        body = CONTENT[start:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        if start in server.broken:
+            self.close_connection = True
+            return
+
+        # The one byte Range probe always goes through
+        if (server.drops or server.stalls) and len(body) > 1:
+            self.wfile.write(body[:len(body) // 3])
+            self.wfile.flush()
+            if server.stalls:
+                server.stalls -= 1
+                time.sleep(2)
+            else:
+                server.drops -= 1
+            self.close_connection = True
+            return
+
+        if not server.rate:
+            self.wfile.write(body)
+            return
+        chunk_size = 16 * 1024
+        for i in range(0, len(body), chunk_size):
+            self.wfile.write(body[i:i + chunk_size])
+            time.sleep(chunk_size / float(server.rate))
+
+    def send_page(self):
+        server = self.server
+        with server.lock:
+            server.pages.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        body = self.path.encode('ascii')
+        self.send_response(404 if self.path.endswith('/missing') else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class DownloadToTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server()
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.url = 'http://127.0.0.1:%d/firmware.zip' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        download_manager.close_all_connections()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.server.reset()
+        self.path = os.path.join(TEMP_DIR, 'firmware.zip')
+        for path in (self.path, self.path + '.part', self.path + '.part.segments'):
+            if os.path.lexists(path):
+                os.remove(path)
+
+    def download(self, connections=1, timeout=None):
+        settings = {'timeout': timeout} if timeout else {}
+        with downloader(self.url, settings) as manager:
+            size = manager.download_to(self.url, self.path, 'Error downloading firmware.',
+                                       CONTENT_HASH, connections=connections)
+        self.assertEqual(size, len(CONTENT))
+        with open(self.path, 'rb') as f:
+            self.assertTrue(f.read() == CONTENT)
+
+    def timed_download(self, connections):
+        start = time.time()
+        self.download(connections)
+        return time.time() - start
+
+    def test_single_stream(self):
+        self.download()
+        self.assertEqual(self.server.requests, [None])
+
+    def test_segments_beat_bandwidth_cap(self):
+        self.server.rate = 2 * 1024 * 1024
+        single = self.timed_download(1)
+        self.setUp()
+        self.server.rate = 2 * 1024 * 1024
+        segmented = self.timed_download(4)
+        ranges = [r for r in self.server.requests if r and r != 'bytes=0-0']
+        self.assertEqual(len(ranges), 4)
+        self.assertLess(segmented, single * 0.6)
+
+    def test_no_range_support_falls_back(self):
+        self.server.ranges = False
+        self.download(4)
+        # The probe and then a single stream
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_stalled_probe_falls_back(self):
+        self.server.stall_probe = True
+        self.download(4, timeout=1)
+        self.assertEqual(self.server.requests, ['bytes=0-0', None])
+
+    def test_dropped_segment_is_retried_alone(self):
+        self.server.drops = 1
+        self.download(4)
+        # The probe, four segments and the rest of the one that dropped
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_failed_segments_resume_on_next_call(self):
+        # The second of two ranges fails every time it is tried
+        half = len(CONTENT) // 2
+        self.server.broken = set([half])
+        self.assertRaises(DownloaderException, self.download, 2)
+        self.assertTrue(os.path.exists(self.path + '.part.segments'))
+
+        self.server.broken = set()
+        self.server.requests = []
+        self.download(2)
+        self.assertFalse(os.path.exists(self.path + '.part.segments'))
+        # Only the range that failed is downloaded again, split over both connections
+        fetched = sorted(tuple(map(int, r[6:].split('-'))) for r in self.server.requests[1:])
+        self.assertEqual(fetched[0][0], half)
+        self.assertEqual(fetched[-1][1], len(CONTENT) - 1)
+        self.assertEqual(sum(end + 1 - start for start, end in fetched), len(CONTENT) - half)
+
+    @unittest.skipUnless(os.path.exists('/dev/full'), 'needs /dev/full')
+    def test_disk_full_is_not_retried(self):
+        # Every write to /dev/full fails with ENOSPC
+        os.symlink('/dev/full', self.path + '.part')
+        self.assertRaises(FileWriteException, self.download)
+        self.assertEqual(self.server.requests, [None])
+
+    def test_stalled_body_resumes(self):
+        self.server.stalls = 1
+        self.download(timeout=1)
+        self.assertEqual(self.server.requests[0], None)
+        self.assertTrue(self.server.requests[1].startswith('bytes=%d-' % (len(CONTENT) // 3)))
+
+
+class FetchManyTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server()
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.urls = ['http://127.0.0.1:%d/page/%d' % (cls.server.server_port, i) for i in range(4)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        download_manager.close_all_connections()
+
+    def fetch_many(self, name):
+        self.server.reset()
+        settings = {'downloader_precedence': {'windows': [name], 'osx': [name], 'linux': [name]}}
+        start = time.time()
+        with downloader(self.urls[0], settings) as manager:
+            contents = manager.fetch_many(self.urls, 'Error downloading pages.')
+            self.assertEqual(manager.downloader.__class__, DOWNLOADERS[name])
+        elapsed = time.time() - start
+        download_manager.close_all_connections()
+
+        self.assertEqual(contents, [('/page/%d' % i).encode('ascii') for i in range(4)])
+        # One after another would take four delays
+        self.assertEqual(self.server.max_active, 4)
+        self.assertLess(elapsed, 2 * self.server.delay)
+
+    def test_threads(self):
+        self.fetch_many('urllib')
+
+    @unittest.skipUnless('asyncio' in DOWNLOADERS, 'needs asyncio')
+    def test_asyncio(self):
+        self.fetch_many('asyncio')
+
+    def test_errors_are_raised_after_all_urls(self):
+        self.server.reset()
+        urls = [self.urls[0].replace('/0', '/missing')] + self.urls[1:]
+        with downloader(urls[0], {}) as manager:
+            self.assertRaises(DownloaderException, manager.fetch_many, urls, 'Error downloading pages.')
+        self.assertEqual(sorted(self.server.pages), sorted(url[url.index('/page/'):] for url in urls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import json
+import time
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+# Number of requests kept, older ones are dropped as new ones are recorded
+RING_SIZE = 256
+
+_ring = deque(maxlen=RING_SIZE)
+
+_lock = threading.Lock()
+
+# The RequestTiming being recorded by the current thread, if any
+_local = threading.local()
+
+# A monotonic clock where available, for measuring durations
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class RequestTiming(object):
+
+    """
+    The timings and outcome of one request made through DownloadManager.
+
+    Phases are seconds spent in "dns", "connect", "tls", "ttfb" (waiting for
+    the response headers once connected) and "transfer" (reading the body).
+    A phase is only present if it happened, a re-used connection has no
+    "dns", "connect" or "tls".
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.started = time.time()
+        self.downloader = None
+        self.phases = {}
+        self.bytes = 0
+        self.decoded_bytes = 0
+        self.cache = None
+        self.status = None
+        self.tls_resumed = None
+        self.error = None
+        self.total = None
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            'url': self.url,
+            'started': self.started,
+            'downloader': self.downloader,
+            'phases': dict((name, round(seconds, 6)) for name, seconds in self.phases.items()),
+            'bytes': self.bytes,
+            'decoded_bytes': self.decoded_bytes,
+            'cache': self.cache,
+            'status': self.status,
+            'tls_resumed': self.tls_resumed,
+            'error': self.error,
+            'total': round(self.total, 6) if self.total is not None else None
+        }
+
+
+@contextmanager
+def track(url):
+    """
+    Records a request into the ring. Code running on the same thread while
+    the request is tracked reports into it through current().
+
+    :param url:
+        The URL being requested
+
+    :return:
+        A context manager yielding the RequestTiming
+    """
+
+    timing = RequestTiming(url)
+    previous = getattr(_local, 'timing', None)
+    _local.timing = timing
+    start = clock()
+    try:
+        yield timing
+    except (Exception) as e:
+        timing.error = u'%s' % e
+        raise
+    finally:
+        timing.total = clock() - start
+        _local.timing = previous
+        with _lock:
+            _ring.append(timing)
+
+
+def current():
+    """
+    :return:
+        The RequestTiming being recorded on this thread, or None
+    """
+
+    return getattr(_local, 'timing', None)
+
+
+@contextmanager
+def measure(phase, exclude=()):
+    """
+    Adds the time spent in the with block to a phase of the current request
+
+    :param phase:
+        The name of the phase
+
+    :param exclude:
+        Names of phases that may be recorded inside the block, their time is
+        not counted twice
+    """
+
+    timing = current()
+    start = clock()
+    nested = sum(timing.phases.get(name, 0.0) for name in exclude) if timing else 0.0
+    try:
+        yield
+    finally:
+        if timing:
+            nested = sum(timing.phases.get(name, 0.0) for name in exclude) - nested
+            timing.add_phase(phase, clock() - start - nested)
+
+
+def count(raw, decoded=None):
+    """
+    Adds to the bytes received by the current request
+
+    :param raw:
+        The int number of bytes read from the connection
+
+    :param decoded:
+        The int number of bytes after content decoding, defaults to raw
+    """
+
+    timing = current()
+    if timing:
+        timing.bytes += raw
+        timing.decoded_bytes += raw if decoded is None else decoded
+
+
+def note(**fields):
+    """
+    Sets fields, such as cache or status, of the current request
+    """
+
+    timing = current()
+    if timing:
+        for name, value in fields.items():
+            setattr(timing, name, value)
+
+
+def create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    socket.create_connection() that reports the name lookup and the TCP
+    connect as separate "dns" and "connect" phases
+    """
+
+    host, port = address
+    with measure('dns'):
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    error = None
+    with measure('connect'):
+        for family, socktype, proto, canonname, sockaddr in infos:
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except (socket.error) as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+
+    if error is not None:
+        raise error
+    raise socket.error('getaddrinfo returns an empty list')
+
+
+def recent():
+    """
+    :return:
+        A list of dicts of the recorded requests, oldest first
+    """
+
+    with _lock:
+        timings = list(_ring)
+    return [timing.as_dict() for timing in timings]
+
+
+def dump_json(**stats):
+    """
+    :param stats:
+        Dicts of counters to report next to the requests, by name
+
+    :return:
+        The recorded requests as a JSON string, an object with the requests
+        under "requests" when stats are given
+    """
+
+    if not stats:
+        return json.dumps(recent(), indent=4, sort_keys=True)
+    stats['requests'] = recent()
+    return json.dumps(stats, indent=4, sort_keys=True)
+
+
+def clear():
+    with _lock:
+        _ring.clear()
+
+
+def summary(entry):
+    """
+    Formats a recorded request as one line
+
+    :param entry:
+        A dict from recent()
+
+    :return:
+        A unicode string such as
+        "https://... 1228.8 kB in 3.40s [dns 0.02s, ...] UrlLibDownloader, cache miss"
+    """
+
+    phases = entry['phases']
+    ordered = [name for name in ('dns', 'connect', 'tls', 'ttfb', 'transfer') if name in phases]
+    line = u'%s %.1f kB in %.2fs' % (entry['url'], entry['bytes'] / 1024.0, entry['total'] or 0.0)
+    if entry['decoded_bytes'] != entry['bytes']:
+        line += u' (%.1f kB decoded)' % (entry['decoded_bytes'] / 1024.0)
+    if ordered:
+        line += u' [%s]' % u', '.join(u'%s %.2fs' % (name, phases[name]) for name in ordered)
+    if entry['downloader']:
+        line += u' %s' % entry['downloader']
+    if entry['tls_resumed']:
+        line += u', tls resumed'
+    if entry['cache']:
+        line += u', cache %s' % entry['cache']
+    if entry['error']:
+        line += u', failed: %s' % entry['error']
+    return line
@@ -0,0 +1,148 @@
+"""
+Benchmarks the incoming data path of rfc2217.PortManager over a local
+socket pair: the filter() generator against feed() and handle(), for plain
+data and for data dense with escaped IAC bytes. Before timing, both are
+checked to decode the same random stream of data and Telnet commands,
+split at random, into the same bytes and replies.
+
+    python libs/serial/bench_rfc2217.py [libs directory]
+
+Give the libs directory of another checkout to measure its PortManager
+instead, e.g. one from before feed() was added.
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import hashlib
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# serial is imported as a package from libs, not module by module from here
+sys.path = [path for path in sys.path if os.path.abspath(path or '.') != HERE]
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(HERE))
+
+from serial import rfc2217, serial_for_url  # noqa
+
+# Bytes sent through the socket pair for each measurement
+TOTAL = 16 * 1024 * 1024
+
+# Bytes per send(), the server side reads up to RECV_SIZE at once
+SEND_SIZE = 4096
+RECV_SIZE = 65536
+
+HAS_FEED = hasattr(rfc2217.PortManager, 'feed')
+
+
+class Connection(object):
+    """Collects what the PortManager sends back to the client"""
+
+    def __init__(self):
+        self.sent = bytearray()
+
+    def write(self, data):
+        self.sent += data
+
+
+def port_manager():
+    connection = Connection()
+    return rfc2217.PortManager(serial_for_url('loop://'), connection), connection
+
+
+def random_stream(seed=1):
+    """Escaped data runs mixed with negotiation, subnegotiation and commands"""
+    rng = random.Random(seed)
+    stream = bytearray()
+    for _ in range(3000):
+        r = rng.random()
+        if r < 0.7:
+            run = bytearray(rng.getrandbits(8) for _ in range(rng.randint(1, 20)))
+            stream += bytes(run).replace(b'\xff', b'\xff\xff')
+        elif r < 0.8:
+            stream += b'\xff\xfb\x2c'                          # WILL COM-PORT-OPTION
+        elif r < 0.9:
+            stream += b'\xff\xfa\x2c\x01\x00\x00\x25\x80\xff\xf0'  # SB SET-BAUDRATE SE
+        else:
+            stream += b'\xff\xf1'                              # NOP
+    return bytes(stream)
+
+
+def decode_filter(manager, data):
+    return b''.join(manager.filter(data))
+
+
+def decode_feed(manager, data):
+    out = []
+    for kind, value in manager.feed(data):
+        if kind == rfc2217.F_DATA:
+            out.append(value)
+        else:
+            manager.handle(kind, value)
+    return b''.join(out)
+
+
+def check(decode):
+    """Decodes random_stream() split into random chunks, returns the md5 of
+    the data and of the replies"""
+    stream = random_stream()
+    rng = random.Random(2)
+    manager, connection = port_manager()
+    out = bytearray()
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(1, 50)
+        out += decode(manager, stream[pos:pos + size])
+        pos += size
+    return hashlib.md5(bytes(out)).hexdigest(), hashlib.md5(bytes(connection.sent)).hexdigest()
+
+
+def throughput(decode, payload):
+    """Returns the MB/s decoded of TOTAL bytes of payload sent over a socket pair"""
+    manager, _ = port_manager()
+    client, server = socket.socketpair()
+
+    def send():
+        sent = 0
+        while sent < TOTAL:
+            client.sendall(payload)
+            sent += len(payload)
+        client.close()
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    received = 0
+    start = time.time()
+    while True:
+        data = server.recv(RECV_SIZE)
+        if not data:
+            break
+        received += len(decode(manager, data))
+    seconds = time.time() - start
+    thread.join()
+    server.close()
+    return received / seconds / 1e6
+
+
+def main():
+    decoders = [('filter()', decode_filter)]
+    digests = check(decode_filter)
+    if HAS_FEED:
+        decoders.append(('feed() + handle()', decode_feed))
+        assert check(decode_feed) == digests, 'filter() and feed() decode differently'
+    # the same for every checkout that decodes the stream correctly
+    print('random stream: data md5 %s, replies md5 %s' % digests)
+
+    data = bytes(bytearray(range(256))) * (SEND_SIZE // 256)
+    payloads = [
+        ('plain data', data.replace(b'\xff', b'\xfe')),
+        ('1/256 IAC', data.replace(b'\xff', b'\xff\xff')[:SEND_SIZE]),
+    ]
+    for payload_name, payload in payloads:
+        for name, decode in decoders:
+            print('%-12s %-18s %8.1f MB/s' % (payload_name, name, throughput(decode, payload)))
+
+
+if __name__ == '__main__':
+    main()
@@ -60,6 +60,7 @@
 
 import logging
 import socket
+from contextlib import contextmanager
 import struct
 import threading
 import time
@@ -67,14 +68,9 @@ try:
     import urlparse
 except ImportError:
     import urllib.parse as urlparse
-try:
-    import Queue
-except ImportError:
-    import queue as Queue
-
 import serial
 from serial.serialutil import SerialBase, SerialException, to_bytes, \
-    iterbytes, portNotOpenError, Timeout
+    iterbytes, portNotOpenError, Timeout, create_connection
 
 # port string is expected to be something like this:
 # rfc2217://host:port
@@ -225,6 +221,12 @@ M_NORMAL = 0
 M_IAC_SEEN = 1
 M_NEGOTIATE = 2
 
+# Kinds of the (kind, value) items returned by PortManager.feed()
+F_DATA = 0              # value: a run of data bytes
+F_COMMAND = 1           # value: the command byte
+F_NEGOTIATE = 2         # value: (DO/DONT/WILL/WONT, option)
+F_SUBNEGOTIATION = 3    # value: the bytes between IAC SB and IAC SE
+
 # TelnetOption and TelnetSubnegotiation states
 REQUESTED = 'REQUESTED'
 ACTIVE = 'ACTIVE'
@@ -353,9 +355,11 @@ class TelnetSubnegotiation(object):
         """
         timeout_timer = Timeout(timeout)
         while not timeout_timer.expired():
-            time.sleep(0.05)    # prevent 100% CPU load
+            # check before sleeping, on a fast link the answer is often
+            # there already and every control line change waits for one
             if self.is_ready():
                 break
+            time.sleep(0.005)   # prevent 100% CPU load
         else:
             raise SerialException("timeout while waiting for option {!r}".format(self.name))
 
@@ -379,6 +383,10 @@ class Serial(SerialBase):
     BAUDRATES = (50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800,
                  9600, 19200, 38400, 57600, 115200)
 
+    # bytes of socket send and receive buffer, set before connecting, also
+    # through the "buffer_size" URL option. None leaves them to the kernel.
+    socket_buffer_size = None
+
     def __init__(self, *args, **kwargs):
         self._thread = None
         self._socket = None
@@ -395,6 +403,8 @@ class Serial(SerialBase):
         self._rfc2217_port_settings = None
         self._rfc2217_options = None
         self._read_buffer = None
+        self._read_cond = None
+        self._tx_batch = None
         super(Serial, self).__init__(*args, **kwargs)  # must be last call in case of auto-open
 
     def open(self):
@@ -411,15 +421,17 @@ class Serial(SerialBase):
         if self.is_open:
             raise SerialException("Port is already open.")
         try:
-            self._socket = socket.create_connection(self.from_url(self.portstr), timeout=5)  # XXX good value?
+            address = self.from_url(self.portstr)
+            self._socket = create_connection(address, 5, self.socket_buffer_size)  # XXX good value?
             self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         except Exception as msg:
             self._socket = None
             raise SerialException("Could not open port {}: {}".format(self.portstr, msg))
 
-        # use a thread save queue as buffer. it also simplifies implementing
-        # the read timeout
-        self._read_buffer = Queue.Queue()
+        # received data is appended in whole runs by the reader thread and
+        # drained in bulk by read(), the condition wakes up waiting readers
+        self._read_buffer = bytearray()
+        self._read_cond = threading.Condition()
         # to ensure that user writes does not interfere with internal
         # telnet/rfc2217 options establish a lock
         self._write_lock = threading.Lock()
@@ -466,9 +478,10 @@ class Serial(SerialBase):
 
         try:    # must clean-up if open fails
             # negotiate Telnet/RFC 2217 -> send initial requests
-            for option in self._telnet_options:
-                if option.state is REQUESTED:
-                    self.telnet_send_option(option.send_yes, option.option)
+            with self._coalesced_writes():
+                for option in self._telnet_options:
+                    if option.state is REQUESTED:
+                        self.telnet_send_option(option.send_yes, option.option)
             # now wait until important options are negotiated
             timeout = Timeout(self._network_timeout)
             while not timeout.expired():
@@ -510,10 +523,11 @@ class Serial(SerialBase):
         # to get good performance, all parameter changes are sent first...
         if not 0 < self._baudrate < 2 ** 32:
             raise ValueError("invalid baudrate: {!r}".format(self._baudrate))
-        self._rfc2217_port_settings['baudrate'].set(struct.pack(b'!I', self._baudrate))
-        self._rfc2217_port_settings['datasize'].set(struct.pack(b'!B', self._bytesize))
-        self._rfc2217_port_settings['parity'].set(struct.pack(b'!B', RFC2217_PARITY_MAP[self._parity]))
-        self._rfc2217_port_settings['stopsize'].set(struct.pack(b'!B', RFC2217_STOPBIT_MAP[self._stopbits]))
+        with self._coalesced_writes():
+            self._rfc2217_port_settings['baudrate'].set(struct.pack(b'!I', self._baudrate))
+            self._rfc2217_port_settings['datasize'].set(struct.pack(b'!B', self._bytesize))
+            self._rfc2217_port_settings['parity'].set(struct.pack(b'!B', RFC2217_PARITY_MAP[self._parity]))
+            self._rfc2217_port_settings['stopsize'].set(struct.pack(b'!B', RFC2217_STOPBIT_MAP[self._stopbits]))
 
         # and now wait until parameters are active
         items = self._rfc2217_port_settings.values()
@@ -580,6 +594,8 @@ class Serial(SerialBase):
                     self._poll_modem_state = True
                 elif option == 'timeout':
                     self._network_timeout = float(values[0])
+                elif option == 'buffer_size':
+                    self.socket_buffer_size = int(values[0])
                 else:
                     raise ValueError('unknown option: {!r}'.format(option))
             if not 0 <= parts.port < 65536:
@@ -597,7 +613,7 @@ class Serial(SerialBase):
         """Return the number of bytes currently in the input buffer."""
         if not self.is_open:
             raise portNotOpenError
-        return self._read_buffer.qsize()
+        return len(self._read_buffer)
 
     def read(self, size=1):
         """\
@@ -607,18 +623,17 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise portNotOpenError
-        data = bytearray()
-        try:
-            timeout = Timeout(self._timeout)
-            while len(data) < size:
+        timeout = Timeout(self._timeout)
+        with self._read_cond:
+            while len(self._read_buffer) < size:
                 if self._thread is None:
                     raise SerialException('connection failed (reader thread died)')
-                data += self._read_buffer.get(True, timeout.time_left())
                 if timeout.expired():
                     break
-        except Queue.Empty:  # -> timeout
-            pass
-        return bytes(data)
+                self._read_cond.wait(timeout.time_left())
+            data = bytes(self._read_buffer[:size])
+            del self._read_buffer[:size]
+        return data
 
     def write(self, data):
         """\
@@ -630,7 +645,7 @@ class Serial(SerialBase):
             raise portNotOpenError
         with self._write_lock:
             try:
-                self._socket.sendall(to_bytes(data).replace(IAC, IAC_DOUBLED))
+                self._send(to_bytes(data).replace(IAC, IAC_DOUBLED))
             except socket.error as e:
                 raise SerialException("connection failed (socket error): {}".format(e))
         return len(data)
@@ -641,8 +656,8 @@ class Serial(SerialBase):
             raise portNotOpenError
         self.rfc2217_send_purge(PURGE_RECEIVE_BUFFER)
         # empty read buffer
-        while self._read_buffer.qsize():
-            self._read_buffer.get(False)
+        with self._read_cond:
+            del self._read_buffer[:]
 
     def reset_output_buffer(self):
         """\
@@ -726,10 +741,11 @@ class Serial(SerialBase):
         """Read loop for the socket."""
         mode = M_NORMAL
         suboption = None
+        telnet_command = None
         try:
             while self.is_open:
                 try:
-                    data = self._socket.recv(1024)
+                    data = self._socket.recv(4096)
                 except socket.timeout:
                     # just need to get out of recv form time to time to check if
                     # still alive
@@ -741,26 +757,35 @@ class Serial(SerialBase):
                     break
                 if not data:
                     break  # lost connection
-                for byte in iterbytes(data):
+                received = bytearray()
+                pos = 0
+                length = len(data)
+                while pos < length:
                     if mode == M_NORMAL:
-                        # interpret as command or as data
-                        if byte == IAC:
-                            mode = M_IAC_SEEN
+                        # everything up to the next IAC is plain data, copy it
+                        # as a whole to the read buffer or sub option buffer
+                        # depending on state
+                        iac = data.find(IAC, pos)
+                        end = length if iac == -1 else iac
+                        if suboption is not None:
+                            suboption += data[pos:end]
                         else:
-                            # store data in read buffer or sub option buffer
-                            # depending on state
-                            if suboption is not None:
-                                suboption += byte
-                            else:
-                                self._read_buffer.put(byte)
-                    elif mode == M_IAC_SEEN:
+                            received += data[pos:end]
+                        if iac == -1:
+                            break
+                        mode = M_IAC_SEEN
+                        pos = iac + 1
+                        continue
+                    byte = data[pos:pos + 1]
+                    pos += 1
+                    if mode == M_IAC_SEEN:
                         if byte == IAC:
                             # interpret as command doubled -> insert character
                             # itself
                             if suboption is not None:
                                 suboption += IAC
                             else:
-                                self._read_buffer.put(IAC)
+                                received += IAC
                             mode = M_NORMAL
                         elif byte == SB:
                             # sub option start
@@ -782,8 +807,15 @@ class Serial(SerialBase):
                     elif mode == M_NEGOTIATE:  # DO, DONT, WILL, WONT was received, option now following
                         self._telnet_negotiate_option(telnet_command, byte)
                         mode = M_NORMAL
+                if received:
+                    with self._read_cond:
+                        self._read_buffer += received
+                        self._read_cond.notify_all()
         finally:
             self._thread = None
+            # wake up readers so they notice the connection is gone
+            with self._read_cond:
+                self._read_cond.notify_all()
             if self.logger:
                 self.logger.debug("read thread terminated")
 
@@ -846,10 +878,34 @@ class Serial(SerialBase):
 
     # - outgoing telnet commands and options
 
+    def _send(self, data):
+        """send or queue data, the write lock must be held."""
+        if self._tx_batch is not None:
+            self._tx_batch.append(data)
+        else:
+            self._socket.sendall(data)
+
+    @contextmanager
+    def _coalesced_writes(self):
+        """\
+        Collect everything written in the with block and send it at once
+        when it ends. With TCP_NODELAY every request would otherwise go out
+        as a packet of its own.
+        """
+        with self._write_lock:
+            self._tx_batch = []
+        try:
+            yield
+        finally:
+            with self._write_lock:
+                batch, self._tx_batch = self._tx_batch, None
+                if batch:
+                    self._socket.sendall(b''.join(batch))
+
     def _internal_raw_write(self, data):
         """internal socket write with no data escaping. used to send telnet stuff."""
         with self._write_lock:
-            self._socket.sendall(data)
+            self._send(data)
 
     def telnet_send_option(self, action, option):
         """Send DO, DONT, WILL, WONT."""
@@ -1042,62 +1098,75 @@ class PortManager(object):
         """\
         This generator function is for the user. All outgoing data has to be
         properly escaped, so that no IAC character in the data stream messes up
-        the Telnet state machine in the server.
+        the Telnet state machine in the server. The whole escaped chunk is
+        yielded at once.
 
-        socket.sendall(escape(data))
+        socket.sendall(b''.join(escape(data)))
         """
-        for byte in iterbytes(data):
-            if byte == IAC:
-                yield IAC
-                yield IAC
-            else:
-                yield byte
+        yield to_bytes(data).replace(IAC, IAC_DOUBLED)
 
     # - incoming data filter
 
-    def filter(self, data):
+    def feed(self, data):
         """\
-        Handle a bunch of incoming bytes. This is a generator. It will yield
-        all characters not of interest for Telnet/RFC 2217.
-
-        The idea is that the reader thread pushes data from the socket through
-        this filter:
-
-        for byte in filter(socket.recv(1024)):
-            # do things like CR/LF conversion/whatever
-            # and write data to the serial port
-            serial.write(byte)
-
-        (socket error handling code left as exercise for the reader)
+        Handle a bunch of incoming bytes at once. Returns a list of (kind,
+        value) items in stream order: F_DATA items with runs of bytes not of
+        interest for Telnet/RFC 2217, and the Telnet commands that were
+        decoded, which the caller passes to handle() in order. A chunk
+        without IAC is returned as a single run after one find().
+
+        for kind, value in manager.feed(socket.recv(4096)):
+            if kind == F_DATA:
+                serial.write(value)
+            else:
+                manager.handle(kind, value)
         """
-        for byte in iterbytes(data):
+        data = to_bytes(data)
+        items = []
+        length = len(data)
+        pos = 0
+        if self.mode == M_NORMAL and self.suboption is None and data.find(IAC) == -1:
+            if length:
+                items.append((F_DATA, data))
+            return items
+        run = bytearray()
+        while pos < length:
             if self.mode == M_NORMAL:
-                # interpret as command or as data
-                if byte == IAC:
-                    self.mode = M_IAC_SEEN
+                # everything up to the next IAC is plain data, store it in
+                # the sub option buffer or pass it to our consumer depending
+                # on state
+                iac = data.find(IAC, pos)
+                end = length if iac == -1 else iac
+                if self.suboption is not None:
+                    self.suboption += data[pos:end]
                 else:
-                    # store data in sub option buffer or pass it to our
-                    # consumer depending on state
-                    if self.suboption is not None:
-                        self.suboption += byte
-                    else:
-                        yield byte
-            elif self.mode == M_IAC_SEEN:
+                    run += data[pos:end]
+                if iac == -1:
+                    break
+                self.mode = M_IAC_SEEN
+                pos = iac + 1
+                continue
+            byte = data[pos:pos + 1]
+            pos += 1
+            if self.mode == M_IAC_SEEN:
                 if byte == IAC:
                     # interpret as command doubled -> insert character
                     # itself
                     if self.suboption is not None:
                         self.suboption += byte
                     else:
-                        yield byte
+                        run += byte
                     self.mode = M_NORMAL
                 elif byte == SB:
                     # sub option start
                     self.suboption = bytearray()
                     self.mode = M_NORMAL
                 elif byte == SE:
-                    # sub option end -> process it now
-                    self._telnet_process_subnegotiation(bytes(self.suboption))
+                    # sub option end
+                    if run:
+                        items.append((F_DATA, bytes(run)))
+                        run = bytearray()
+                    items.append((F_SUBNEGOTIATION, bytes(self.suboption)))
                     self.suboption = None
                     self.mode = M_NORMAL
                 elif byte in (DO, DONT, WILL, WONT):
@@ -1106,11 +1175,54 @@ class PortManager(object):
                     self.mode = M_NEGOTIATE
                 else:
                     # other telnet commands
-                    self._telnet_process_command(byte)
+                    if run:
+                        items.append((F_DATA, bytes(run)))
+                        run = bytearray()
+                    items.append((F_COMMAND, byte))
                     self.mode = M_NORMAL
             elif self.mode == M_NEGOTIATE:  # DO, DONT, WILL, WONT was received, option now following
-                self._telnet_negotiate_option(self.telnet_command, byte)
+                if run:
+                    items.append((F_DATA, bytes(run)))
+                    run = bytearray()
+                items.append((F_NEGOTIATE, (self.telnet_command, byte)))
                 self.mode = M_NORMAL
+        if run:
+            items.append((F_DATA, bytes(run)))
+        return items
+
+    def handle(self, kind, value):
+        """Process a Telnet command returned by feed()."""
+        if kind == F_COMMAND:
+            self._telnet_process_command(value)
+        elif kind == F_NEGOTIATE:
+            self._telnet_negotiate_option(*value)
+        elif kind == F_SUBNEGOTIATION:
+            self._telnet_process_subnegotiation(value)
+
+    def filter(self, data):
+        """\
+        Handle a bunch of incoming bytes. This is a generator. It will yield
+        all characters not of interest for Telnet/RFC 2217.
+
+        The idea is that the reader thread pushes data from the socket through
+        this filter:
+
+        for byte in filter(socket.recv(1024)):
+            # do things like CR/LF conversion/whatever
+            # and write data to the serial port
+            serial.write(byte)
+
+        (socket error handling code left as exercise for the reader)
+
+        This is a compatibility wrapper around feed(), which is much faster
+        as it hands out whole runs of data.
+        """
+        for kind, value in self.feed(data):
+            if kind == F_DATA:
+                for byte in iterbytes(value):
+                    yield byte
+            else:
+                self.handle(kind, value)
 
     # - incoming telnet commands and options
 
@@ -29,6 +29,7 @@
 # pylint: disable=abstract-method
 import errno
 import fcntl
+import math
 import os
 import select
 import struct
@@ -244,6 +245,22 @@ TIOCSBRK = getattr(termios, 'TIOCSBRK', 0x5427)
 TIOCCBRK = getattr(termios, 'TIOCCBRK', 0x5428)
 
 
+# poll() does not work with tty devices on every platform, e.g. macOS, so
+# it is only used on Linux. Elsewhere read() keeps using select().
+_USE_POLL = plat[:5] == 'linux' and hasattr(select, 'poll')
+
+if hasattr(os, 'readv'):
+    def _read_fd_into(fd, view):
+        """read from fd straight into the writable buffer view"""
+        return os.readv(fd, [view])
+else:
+    def _read_fd_into(fd, view):
+        """read from fd into the writable buffer view (no os.readv on Python 2)"""
+        data = os.read(fd, len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
 class Serial(SerialBase, PlatformSpecific):
     """\
     Serial port class POSIX implementation. Serial port configuration is
@@ -297,6 +314,14 @@ class Serial(SerialBase, PlatformSpecific):
         self.pipe_abort_write_r, self.pipe_abort_write_w = os.pipe()
         fcntl.fcntl(self.pipe_abort_read_r, fcntl.F_SETFL, os.O_NONBLOCK)
         fcntl.fcntl(self.pipe_abort_write_r, fcntl.F_SETFL, os.O_NONBLOCK)
+        # the port and the abort pipe are registered once for the lifetime of
+        # the port, instead of building a select() call on every read
+        if _USE_POLL:
+            self._read_poll = select.poll()
+            self._read_poll.register(self.fd, select.POLLIN | select.POLLERR | select.POLLHUP | select.POLLNVAL)
+            self._read_poll.register(self.pipe_abort_read_r, select.POLLIN)
+        else:
+            self._read_poll = None
 
     def _reconfigure_port(self, force_update=False):
         """Set communication parameters on opened port."""
@@ -456,6 +481,7 @@ class Serial(SerialBase, PlatformSpecific):
                 os.close(self.pipe_abort_write_r)
                 self.pipe_abort_read_r, self.pipe_abort_read_w = None, None
                 self.pipe_abort_write_r, self.pipe_abort_write_w = None, None
+                self._read_poll = None
             self.is_open = False
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
@@ -467,20 +493,45 @@ class Serial(SerialBase, PlatformSpecific):
         s = fcntl.ioctl(self.fd, TIOCINQ, TIOCM_zero_str)
         return struct.unpack('I', s)[0]
 
-    # select based implementation, proved to work on many systems
+    def _wait_readable(self, timeout):
+        """\
+        Wait until the port or the abort pipe can be read. Returns the list
+        of ready file descriptors, empty on timeout.
+        """
+        if self._read_poll is None:
+            ready, _, _ = select.select([self.fd, self.pipe_abort_read_r], [], [], timeout)
+            return ready
+        # poll() takes milliseconds, round up so a short timeout still waits
+        events = self._read_poll.poll(None if timeout is None else int(math.ceil(timeout * 1000)))
+        return [fd for fd, event in events]
+
     def read(self, size=1):
         """\
         Read size bytes from the serial port. If a timeout is set it may
         return less characters as requested. With no timeout it will block
         until the requested number of bytes is read.
         """
+        read = bytearray(size)
+        del read[self.readinto(read):]
+        return bytes(read)
+
+    # select/poll based implementation, proved to work on many systems
+    def readinto(self, b):
+        """\
+        Read up to len(b) bytes from the serial port into the writable buffer
+        b, such as a bytearray or a memoryview slice of one, without
+        intermediate copies. Timeouts work as in read(). Returns the number
+        of bytes read.
+        """
         if not self.is_open:
             raise portNotOpenError
-        read = bytearray()
+        view = memoryview(b)
+        size = len(view)
+        count = 0
         timeout = Timeout(self._timeout)
-        while len(read) < size:
+        while count < size:
             try:
-                ready, _, _ = select.select([self.fd, self.pipe_abort_read_r], [], [], timeout.time_left())
+                ready = self._wait_readable(timeout.time_left())
                 if self.pipe_abort_read_r in ready:
                     os.read(self.pipe_abort_read_r, 1000)
                     break
@@ -490,17 +541,17 @@ class Serial(SerialBase, PlatformSpecific):
                 # there is nothing to read.
                 if not ready:
                     break   # timeout
-                buf = os.read(self.fd, size - len(read))
+                n = _read_fd_into(self.fd, view[count:])
                 # read should always return some data as select reported it was
                 # ready to read when we get to this point.
-                if not buf:
+                if not n:
                     # Disconnected devices, at least on Linux, show the
                     # behavior that they are always ready to read immediately
                     # but reading returns nothing.
                     raise SerialException(
                         'device reports readiness to read but returned no data '
                         '(device disconnected or multiple access on port?)')
-                read.extend(buf)
+                count += n
             except OSError as e:
                 # this is for Python 3.x where select.error is a subclass of
                 # OSError ignore BlockingIOErrors and EINTR. other errors are shown
@@ -515,7 +566,7 @@ class Serial(SerialBase, PlatformSpecific):
                     raise SerialException('read failed: {}'.format(e))
             if timeout.expired():
                 break
-        return bytes(read)
+        return count
 
     def cancel_read(self):
         if self.is_open:
@@ -724,6 +775,9 @@ class PosixPollSerial(Serial):
     disconnecting while it's in use (e.g. USB-serial unplugged).
     """
 
+    # goes through read() below
+    readinto = SerialBase.readinto
+
     def read(self, size=1):
         """\
         Read size bytes from the serial port. If a timeout is set it may
@@ -761,6 +815,9 @@ class VTIMESerial(Serial):
     Overall timeout is disabled when inter-character timeout is used.
     """
 
+    # goes through read() below, the port is in blocking mode
+    readinto = SerialBase.readinto
+
     def _reconfigure_port(self, force_update=True):
         """Set communication parameters on opened port."""
         super(VTIMESerial, self)._reconfigure_port()
@@ -8,6 +8,7 @@
 # SPDX-License-Identifier:    BSD-3-Clause
 
 import io
+import socket
 import time
 
 # ``memoryview`` was introduced in Python 2.7 and ``bytes(some_memoryview)``
@@ -66,6 +67,36 @@ def to_bytes(seq):
         return bytes(bytearray(seq))
 
 
+def create_connection(address, timeout=None, buffer_size=None):
+    """\
+    Like socket.create_connection(), but sizes the socket send and receive
+    buffers before connecting, when buffer_size is given. The receive window
+    is negotiated during the handshake, a buffer set later can not widen it.
+    Without buffer_size the buffers are left to the kernel, which grows them
+    as needed on Linux.
+    """
+    if not buffer_size:
+        return socket.create_connection(address, timeout)
+    host, port = address
+    error = None
+    for family, socktype, proto, _, sockaddr in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+            sock.settimeout(timeout)
+            sock.connect(sockaddr)
+            return sock
+        except socket.error as e:
+            error = e
+            if sock is not None:
+                sock.close()
+    if error is None:
+        error = socket.error('getaddrinfo returned an empty list')
+    raise error
+
+
 # create control bytes
 XON = to_bytes([17])
 XOFF = to_bytes([19])
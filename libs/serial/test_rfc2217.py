@@ -0,0 +1,201 @@
+"""
+Tests the rfc2217:// and socket:// clients against local servers: an RFC
+2217 server built on PortManager.feed() in front of a loop:// port, and a
+TCP echo server standing in for a raw serial bridge.
+
+Run with:
+
+    python libs/serial/test_rfc2217.py
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# serial is imported as a package from libs, not module by module from here
+sys.path = [path for path in sys.path if os.path.abspath(path or '.') != HERE]
+sys.path.insert(0, os.path.dirname(HERE))
+
+import serial  # noqa
+from serial import rfc2217  # noqa
+
+
+class Server(object):
+    """Accepts clients one after another on a local port, handing each
+    connection to serve()"""
+
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except socket.error:
+                return
+            self.serve(connection)
+
+    def close(self):
+        self.listener.close()
+
+
+class EchoServer(Server):
+
+    def serve(self, connection):
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                break
+            connection.sendall(data)
+        connection.close()
+
+
+class RFC2217Server(Server):
+    """Shares a loop:// port the way a device sharing gateway would"""
+
+    def serve(self, connection):
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.serial = serial.serial_for_url('loop://', timeout=0.05)
+
+        class Connection(object):
+            def write(self, data):
+                connection.sendall(data)
+
+        manager = rfc2217.PortManager(self.serial, Connection())
+        alive = [True]
+
+        def reader():
+            while alive[0]:
+                data = self.serial.read(self.serial.in_waiting or 1)
+                if data:
+                    connection.sendall(b''.join(manager.escape(data)))
+                manager.check_modem_lines()
+
+        thread = threading.Thread(target=reader)
+        thread.daemon = True
+        thread.start()
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                break
+            for kind, value in manager.feed(data):
+                if kind == rfc2217.F_DATA:
+                    self.serial.write(value)
+                else:
+                    manager.handle(kind, value)
+        alive[0] = False
+        thread.join()
+        connection.close()
+
+
+def default_rcvbuf():
+    sock = socket.socket()
+    try:
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    finally:
+        sock.close()
+
+
+def read_exactly(port, size, timeout=2):
+    data = b''
+    deadline = time.time() + timeout
+    while len(data) < size and time.time() < deadline:
+        data += port.read(size - len(data))
+    return data
+
+
+class RFC2217Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = RFC2217Server()
+        self.url = 'rfc2217://127.0.0.1:%d' % self.server.port
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_round_trip(self):
+        port = serial.serial_for_url(self.url, timeout=0.5)
+        try:
+            # IAC bytes in the data are escaped and unescaped on both sides
+            data = bytes(bytearray(range(256))) * 64
+            port.write(data)
+            self.assertEqual(read_exactly(port, len(data)), data)
+        finally:
+            port.close()
+
+    def test_settings_reach_the_server(self):
+        port = serial.serial_for_url(self.url, timeout=0.5)
+        try:
+            port.baudrate = 921600
+            port.rts = True
+            port.dtr = False
+            self.assertEqual(self.server.serial.baudrate, 921600)
+            self.assertTrue(self.server.serial.rts)
+            self.assertFalse(self.server.serial.dtr)
+        finally:
+            port.close()
+
+    def test_socket_options(self):
+        port = serial.serial_for_url(self.url)
+        try:
+            sock = port._socket
+            self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertIsNone(port.socket_buffer_size)
+            # left for the kernel to autotune
+            self.assertEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), default_rcvbuf())
+        finally:
+            port.close()
+
+    def test_buffer_size_option(self):
+        port = serial.serial_for_url(self.url + '?buffer_size=262144')
+        try:
+            self.assertEqual(port.socket_buffer_size, 262144)
+            # Linux reports twice the size asked for, for its bookkeeping
+            self.assertGreaterEqual(port._socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), 262144)
+        finally:
+            port.close()
+
+
+class SocketTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EchoServer()
+        self.url = 'socket://127.0.0.1:%d' % self.server.port
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_round_trip(self):
+        port = serial.serial_for_url(self.url + '?buffer_size=262144', timeout=0.5)
+        try:
+            self.assertTrue(port._socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertGreaterEqual(port._socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), 262144)
+            port.write(b'print("hello")\r\n')
+            self.assertEqual(read_exactly(port, 16), b'print("hello")\r\n')
+        finally:
+            port.close()
+
+    def test_bad_buffer_size(self):
+        self.assertRaises(serial.SerialException, serial.serial_for_url, self.url + '?buffer_size=big')
+
+    def test_unknown_option(self):
+        try:
+            serial.serial_for_url(self.url + '?bogus=1')
+        except serial.SerialException as e:
+            message = str(e)
+        self.assertIn('logging={debug|info|warning|error}', message)
+        self.assertIn("unknown option: 'bogus'", message)
+
+
+if __name__ == '__main__':
+    unittest.main()
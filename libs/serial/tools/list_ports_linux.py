@@ -8,6 +8,7 @@
 #
 # SPDX-License-Identifier:    BSD-3-Clause
 
+import fnmatch
 import glob
 import os
 from serial.tools import list_ports_common
@@ -87,13 +88,26 @@ class SysFS(list_ports_common.ListPortInfo):
             return None
 
 
+# names of the serial devices in /dev
+DEVICE_PATTERNS = (
+    'ttyS*',        # built-in serial ports
+    'ttyUSB*',      # usb-serial with own driver
+    'ttyACM*',      # usb-serial with CDC-ACM profile
+    'ttyAMA*',      # ARM internal port (raspi)
+    'rfcomm*',      # BT serial devices
+    'ttyAP*',       # Advantech multi-port serial controllers
+)
+
+
+def is_port_name(name):
+    """True if the /dev entry name is one comports() would list"""
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in DEVICE_PATTERNS)
+
+
 def comports(include_links=False):
-    devices = glob.glob('/dev/ttyS*')           # built-in serial ports
-    devices.extend(glob.glob('/dev/ttyUSB*'))   # usb-serial with own driver
-    devices.extend(glob.glob('/dev/ttyACM*'))   # usb-serial with CDC-ACM profile
-    devices.extend(glob.glob('/dev/ttyAMA*'))   # ARM internal port (raspi)
-    devices.extend(glob.glob('/dev/rfcomm*'))   # BT serial devices
-    devices.extend(glob.glob('/dev/ttyAP*'))    # Advantech multi-port serial controllers
+    devices = []
+    for pattern in DEVICE_PATTERNS:
+        devices.extend(glob.glob(os.path.join('/dev', pattern)))
     if include_links:
         devices.extend(list_ports_common.list_links(devices))
     return [info
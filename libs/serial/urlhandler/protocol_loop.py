@@ -10,22 +10,24 @@
 #
 # SPDX-License-Identifier:    BSD-3-Clause
 #
-# URL format:    loop://[option[/option...]]
+# URL format:    loop://[?option[&option...]]
 # options:
-# - "debug" print diagnostic messages
+# - "logging=debug" print diagnostic messages
+# - "emulate_baudrate" deliver the data no faster than the configured
+#   baudrate, bytesize, parity and stopbits would allow
+# - "latency=<seconds>" delay before written data starts to arrive
 import logging
 import numbers
+import threading
 import time
+from collections import deque
 try:
     import urlparse
 except ImportError:
     import urllib.parse as urlparse
-try:
-    import queue
-except ImportError:
-    import Queue as queue
 
-from serial.serialutil import SerialBase, SerialException, to_bytes, iterbytes, writeTimeoutError, portNotOpenError
+from serial.serialutil import SerialBase, SerialException, to_bytes, writeTimeoutError, \
+    portNotOpenError, Timeout, PARITY_NONE
 
 # map log level names to constants. used in from_url()
 LOGGER_LEVELS = {
@@ -44,9 +46,22 @@ class Serial(SerialBase):
 
     def __init__(self, *args, **kwargs):
         self.buffer_size = 4096
-        self.queue = None
         self.logger = None
         self._cancel_write = False
+        self._cancel_read = False
+        self._emulate_baudrate = False
+        self._latency = 0
+        # ring buffer: _count bytes starting at _head, of which the first
+        # _visible can be read, the rest is still "on the wire"
+        self._buffer = None
+        self._head = 0
+        self._count = 0
+        self._visible = 0
+        # [start time, length, bytes delivered] of writes on the wire
+        self._in_flight = deque()
+        # time at which the emulated line is free for the next write
+        self._line_free = 0
+        self._cond = threading.Condition()
         super(Serial, self).__init__(*args, **kwargs)
 
     def open(self):
@@ -57,7 +72,7 @@ class Serial(SerialBase):
         if self.is_open:
             raise SerialException("Port is already open.")
         self.logger = None
-        self.queue = queue.Queue(self.buffer_size)
+        self._buffer = bytearray(self.buffer_size)
 
         if self._port is None:
             raise SerialException("Port must be configured before it can be used.")
@@ -79,10 +94,9 @@ class Serial(SerialBase):
     def close(self):
         if self.is_open:
             self.is_open = False
-            try:
-                self.queue.put_nowait(None)
-            except queue.Full:
-                pass
+            # wake up blocked readers and writers
+            with self._cond:
+                self._cond.notify_all()
         super(Serial, self).close()
 
     def _reconfigure_port(self):
@@ -102,8 +116,8 @@ class Serial(SerialBase):
         if parts.scheme != "loop":
             raise SerialException(
                 'expected a string in the form '
-                '"loop://[?logging={debug|info|warning|error}]": not starting '
-                'with loop:// ({!r})'.format(parts.scheme))
+                '"loop://[?logging={{debug|info|warning|error}}][&emulate_baudrate][&latency=<seconds>]": '
+                'not starting with loop:// ({!r})'.format(parts.scheme))
         try:
             # process options now, directly altering self
             for option, values in urlparse.parse_qs(parts.query, True).items():
@@ -112,25 +126,125 @@ class Serial(SerialBase):
                     self.logger = logging.getLogger('pySerial.loop')
                     self.logger.setLevel(LOGGER_LEVELS[values[0]])
                     self.logger.debug('enabled logging')
+                elif option == 'emulate_baudrate':
+                    self._emulate_baudrate = True
+                elif option == 'latency':
+                    self._latency = float(values[0])
+                    if not self._latency >= 0:
+                        raise ValueError('latency must not be negative: {!r}'.format(values[0]))
                 else:
                     raise ValueError('unknown option: {!r}'.format(option))
         except ValueError as e:
             raise SerialException(
                 'expected a string in the form '
-                '"loop://[?logging={debug|info|warning|error}]": {}'.format(e))
+                '"loop://[?logging={{debug|info|warning|error}}][&emulate_baudrate][&latency=<seconds>]": '
+                '{}'.format(e))
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
+    def _byte_time(self):
+        """seconds it takes to send one byte, 0 if the baudrate is not emulated"""
+        if not self._emulate_baudrate:
+            return 0
+        bits = 1 + self._bytesize + (self._parity != PARITY_NONE) + self._stopbits
+        return float(bits) / self._baudrate
+
+    def _deliver(self):
+        """\
+        Make the bytes that arrived by now readable. Returns the number of
+        seconds until the next byte arrives, None if nothing is in flight.
+        The condition must be held.
+        """
+        byte_time = self._byte_time()
+        now = Timeout.TIME()
+        while self._in_flight:
+            entry = self._in_flight[0]
+            start, length, delivered = entry
+            elapsed = now - start - self._latency
+            if elapsed < 0:
+                arrived = 0
+            elif byte_time:
+                arrived = min(length, int(elapsed / byte_time))
+            else:
+                arrived = length
+            self._visible += arrived - delivered
+            if arrived < length:
+                entry[2] = arrived
+                return start + self._latency + (arrived + 1) * byte_time - now
+            self._in_flight.popleft()
+        return None
+
+    def _put(self, data):
+        """\
+        Copy as much of data into the ring as fits and put it on the wire.
+        Returns the number of bytes taken. The condition must be held.
+        """
+        size = len(self._buffer)
+        length = min(len(data), size - self._count)
+        if not length:
+            return 0
+        tail = (self._head + self._count) % size
+        first = min(length, size - tail)
+        self._buffer[tail:tail + first] = data[:first]
+        self._buffer[:length - first] = data[first:length]
+        self._count += length
+        if self._emulate_baudrate or self._latency:
+            start = max(Timeout.TIME(), self._line_free)
+            self._line_free = start + length * self._byte_time()
+            self._in_flight.append([start, length, 0])
+        else:
+            self._visible += length
+        self._cond.notify_all()
+        return length
+
+    def _take(self, size):
+        """\
+        Remove up to size readable bytes from the ring and return them.
+        The condition must be held.
+        """
+        length = min(size, self._visible)
+        end = self._head + length
+        if end <= len(self._buffer):
+            data = bytes(self._buffer[self._head:end])
+        else:
+            data = bytes(self._buffer[self._head:] + self._buffer[:end - len(self._buffer)])
+        self._head = end % len(self._buffer)
+        self._count -= length
+        self._visible -= length
+        if length:
+            # there is room for blocked writers now
+            self._cond.notify_all()
+        return data
+
+    def _clear(self):
+        with self._cond:
+            self._head = self._count = self._visible = 0
+            self._in_flight.clear()
+            self._line_free = 0
+            self._cond.notify_all()
+
     @property
     def in_waiting(self):
         """Return the number of bytes currently in the input buffer."""
         if not self.is_open:
             raise portNotOpenError
+        with self._cond:
+            self._deliver()
+            waiting = self._visible
         if self.logger:
             # attention the logged value can differ from return value in
             # threaded environments...
-            self.logger.debug('in_waiting -> {:d}'.format(self.queue.qsize()))
-        return self.queue.qsize()
+            self.logger.debug('in_waiting -> {:d}'.format(waiting))
+        return waiting
+
+    @property
+    def out_waiting(self):
+        """Return how many bytes are still on their way to the input buffer."""
+        if not self.is_open:
+            raise portNotOpenError
+        with self._cond:
+            self._deliver()
+            return self._count - self._visible
 
     def read(self, size=1):
         """\
@@ -140,36 +254,34 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise portNotOpenError
-        if self._timeout is not None and self._timeout != 0:
-            timeout = time.time() + self._timeout
-        else:
-            timeout = None
+        timeout = Timeout(self._timeout)
         data = bytearray()
-        while size > 0 and self.is_open:
-            try:
-                b = self.queue.get(timeout=self._timeout)  # XXX inter char timeout
-            except queue.Empty:
-                if self._timeout == 0:
+        with self._cond:
+            while len(data) < size and self.is_open:
+                next_byte = self._deliver()
+                data += self._take(size - len(data))
+                if len(data) >= size or timeout.expired():
                     break
-            else:
-                if b is not None:
-                    data += b
-                    size -= 1
-                else:
+                if self._cancel_read:
                     break
-            # check for timeout now, after data has been read.
-            # useful for timeout = 0 (non blocking) read
-            if timeout and time.time() > timeout:
-                if self.logger:
-                    self.logger.info('read timeout')
-                break
+                wait = timeout.time_left()
+                if next_byte is not None and (wait is None or next_byte < wait):
+                    wait = next_byte
+                self._cond.wait(wait)
+            self._cancel_read = False
+        if self.logger and len(data) < size:
+            self.logger.info('read timeout')
         return bytes(data)
 
     def cancel_read(self):
-        self.queue.put_nowait(None)
+        with self._cond:
+            self._cancel_read = True
+            self._cond.notify_all()
 
     def cancel_write(self):
-        self._cancel_write = True
+        with self._cond:
+            self._cancel_write = True
+            self._cond.notify_all()
 
     def write(self, data):
         """\
@@ -194,9 +306,22 @@ class Serial(SerialBase):
             if self._cancel_write:
                 return 0  # XXX
             raise writeTimeoutError
-        for byte in iterbytes(data):
-            self.queue.put(byte, timeout=self._write_timeout)
-        return len(data)
+        timeout = Timeout(self._write_timeout)
+        written = 0
+        with self._cond:
+            while written < len(data):
+                written += self._put(data[written:])
+                if written == len(data):
+                    break
+                # the ring is full, wait for the reader to make room
+                if not self.is_open:
+                    raise portNotOpenError
+                if self._cancel_write:
+                    return written
+                if timeout.expired():
+                    raise writeTimeoutError
+                self._cond.wait(timeout.time_left())
+        return written
 
     def reset_input_buffer(self):
         """Clear input buffer, discarding all that is in the buffer."""
@@ -204,11 +329,7 @@ class Serial(SerialBase):
             raise portNotOpenError
         if self.logger:
             self.logger.info('reset_input_buffer()')
-        try:
-            while self.queue.qsize():
-                self.queue.get_nowait()
-        except queue.Empty:
-            pass
+        self._clear()
 
     def reset_output_buffer(self):
         """\
@@ -219,11 +340,7 @@ class Serial(SerialBase):
             raise portNotOpenError
         if self.logger:
             self.logger.info('reset_output_buffer()')
-        try:
-            while self.queue.qsize():
-                self.queue.get_nowait()
-        except queue.Empty:
-            pass
+        self._clear()
 
     def _update_break_state(self):
         """\
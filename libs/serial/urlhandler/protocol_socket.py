@@ -15,6 +15,7 @@
 # URL format:    socket://<host>:<port>[/option[/option...]]
 # options:
 # - "debug" print diagnostic messages
+# - "buffer_size=<bytes>" size the socket buffers before connecting
 
 import errno
 import logging
@@ -27,7 +28,7 @@ except ImportError:
     import urllib.parse as urlparse
 
 from serial.serialutil import SerialBase, SerialException, to_bytes, \
-    portNotOpenError, writeTimeoutError, Timeout
+    portNotOpenError, writeTimeoutError, Timeout, create_connection
 
 # map log level names to constants. used in from_url()
 LOGGER_LEVELS = {
@@ -46,6 +47,10 @@ class Serial(SerialBase):
     BAUDRATES = (50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800,
                  9600, 19200, 38400, 57600, 115200)
 
+    # bytes of socket send and receive buffer, set before connecting, also
+    # through the "buffer_size" URL option. None leaves them to the kernel.
+    socket_buffer_size = None
+
     def open(self):
         """\
         Open port with current settings. This may throw a SerialException
@@ -58,7 +63,10 @@ class Serial(SerialBase):
             raise SerialException("Port is already open.")
         try:
             # timeout is used for write timeout support :/ and to get an initial connection timeout
-            self._socket = socket.create_connection(self.from_url(self.portstr), timeout=POLL_TIMEOUT)
+            address = self.from_url(self.portstr)
+            self._socket = create_connection(address, POLL_TIMEOUT, self.socket_buffer_size)
+            # small writes, like a line typed into a REPL, go out right away
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         except Exception as msg:
             self._socket = None
             raise SerialException("Could not open port {}: {}".format(self.portstr, msg))
@@ -107,7 +115,7 @@ class Serial(SerialBase):
         if parts.scheme != "socket":
             raise SerialException(
                 'expected a string in the form '
-                '"socket://<host>:<port>[?logging={debug|info|warning|error}]": '
+                '"socket://<host>:<port>[?logging={{debug|info|warning|error}}][&buffer_size=<bytes>]": '
                 'not starting with socket:// ({!r})'.format(parts.scheme))
         try:
             # process options now, directly altering self
@@ -117,6 +125,8 @@ class Serial(SerialBase):
                     self.logger = logging.getLogger('pySerial.socket')
                     self.logger.setLevel(LOGGER_LEVELS[values[0]])
                     self.logger.debug('enabled logging')
+                elif option == 'buffer_size':
+                    self.socket_buffer_size = int(values[0])
                 else:
                     raise ValueError('unknown option: {!r}'.format(option))
             if not 0 <= parts.port < 65536:
@@ -124,7 +134,7 @@ class Serial(SerialBase):
         except ValueError as e:
             raise SerialException(
                 'expected a string in the form '
-                '"socket://<host>:<port>[?logging={debug|info|warning|error}]": {}'.format(e))
+                '"socket://<host>:<port>[?logging={{debug|info|warning|error}}][&buffer_size=<bytes>]": {}'.format(e))
 
         return (parts.hostname, parts.port)
 
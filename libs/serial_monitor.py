@@ -26,6 +26,27 @@ def _is_echo(a,b):
             return False
     return True
 
+def is_url(port):
+    """True for ports like rfc2217://host:port or socket://host:port, which
+    are opened with serial_for_url instead of as a local device"""
+    return bool(port) and '://' in port
+
+def new_serial(port):
+    """Returns an unopened Serial of the right kind for port"""
+    if is_url(port):
+        return serial.serial_for_url(port, do_not_open=True)
+    ser = serial.Serial()
+    ser.port = port
+    return ser
+
+def with_buffer_size(port, buffer_size):
+    """Adds the buffer_size option to an rfc2217:// or socket:// port, so its
+    socket buffers are sized before it connects. Other ports, or no
+    buffer_size, are returned as is and the kernel sizes the buffers."""
+    if not buffer_size or not port.lower().startswith(('rfc2217://', 'socket://')):
+        return port
+    return '%s%sbuffer_size=%d' % (port, '&' if '?' in port else '?', buffer_size)
+
 class SerialMonitor:
     """."""
     TERMINATOR = b'\r\n'
@@ -37,6 +58,9 @@ class SerialMonitor:
         self._upload_queue = task_queue.TaskQueue(self._upload_task)
         self._port = None
         self._baudrate = 115200
+        self.buffer_size = 0
+        # reused for every read, the port reads straight into it
+        self._rx_view = memoryview(bytearray(4096))
         self._ser_init()
         self.support_excmds={
             'ls':self._ls,
@@ -77,7 +101,8 @@ class SerialMonitor:
     def port(self,p):
         if p != self._port:
             self.stop()
-            self.ser.port=p
+            # a URL may need a different Serial class than the last port
+            self._ser_init(p)
             self.start()
 
     @property
@@ -91,13 +116,22 @@ class SerialMonitor:
             self.ser.baudrate=baud
             self.start()
 
-    def _ser_init(self):
-        self.ser = serial.Serial()
+    def _ser_init(self, port=None):
+        self.ser = new_serial(port or self._port)
         self.ser.setDTR(False)
         self.ser.setRTS(False)
-        self.ser.port = self._port
         self.ser.baudrate = self._baudrate
         self.ser.timeout=0.3
+        if hasattr(self.ser, 'socket_buffer_size'):
+            # sized before connecting, None leaves it to the kernel
+            self.ser.socket_buffer_size = self.buffer_size or None
+
+    def _read_available(self):
+        """Reads what the port has buffered, waiting for at least one byte
+        until the timeout. Returns a memoryview of the bytes read, valid
+        until the next call."""
+        size = min(self.ser.in_waiting, len(self._rx_view)) or 1
+        return self._rx_view[:self.ser.readinto(self._rx_view[:size])]
 
     def reset_dev(self):
         self._msg_queue.put('Reset dev ...\n')
@@ -164,7 +198,7 @@ class SerialMonitor:
     def _run(self):
         while self._is_thread_alive:
             try:
-                data = self.ser.read( self.ser.in_waiting or 1)
+                data = self._read_available()
             except serial.SerialException as e:
                 self._is_thread_alive=False
                 self._is_ready=False
@@ -173,7 +207,7 @@ class SerialMonitor:
                 break
             else:
                 if data:
-                    self._msg_queue.put(self.data2str(data))
+                    self._msg_queue.put(self.data2str(data.tobytes()))
             if not self._is_thread_alive:
                 break
             time.sleep(0.01)
@@ -214,8 +248,8 @@ class SerialMonitor:
         buf=bytearray()
         packet=''
         for _ in range(1000):
-            data=ser.read(ser.in_waiting or 1)
-            buf.extend(data)
+            data=self._read_available()
+            buf+=data
             if not data or (b'\n> ' in buf):
                 packet=self.data2str(buf)
                 del buf
@@ -24,3 +24,7 @@ def gm_firmware_dir():
 def gm_version_url():
     gm_settings = sublime.load_settings('gamemcu.sublime-settings')
     return gm_settings.get('version_url')
+
+def gm_setting(key, default=None):
+    gm_settings = sublime.load_settings('gamemcu.sublime-settings')
+    return gm_settings.get(key, default)